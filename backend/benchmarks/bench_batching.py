@@ -0,0 +1,83 @@
+"""
+Compare fixed-size batching (batch_size=32, padded to max_seq_length) with length-bucketed
+dynamic batching for the relevance and ideology predictors on the saved CSVs in data/.
+
+Usage (from backend/benchmarks):
+    python bench_batching.py [--model relevance|ideology] [--limit 2000] [--max-tokens 4096]
+"""
+import argparse
+import glob
+import json
+import os
+import sys
+import time
+import pandas as pd
+
+SERVER_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'server'))
+DATA_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', 'data'))
+sys.path.append(SERVER_DIR)
+
+import batching
+import predict_pipeline
+from model_registry import registry
+from preprocess import normalize_tweet
+
+def load_texts(limit):
+    texts = []
+    for path in sorted(glob.glob(os.path.join(DATA_DIR, '*.csv'))):
+        df = pd.read_csv(path, usecols=['Content'])
+        texts.extend(normalize_tweet(str(text)) for text in df['Content'].dropna())
+    return texts[:limit] if limit else texts
+
+def run(model, texts, max_tokens):
+    with registry.use(model) as predictor:
+        max_length = predict_pipeline.predictor_max_seq_length(predictor)
+        if model == predict_pipeline.RELEVANCE_MODEL:
+            indicator = None
+            def predict_batch(batch, batch_size):
+                predictor.predict(batch, batch_size=batch_size)
+                return [None] * len(batch)
+            lengths = batching.token_lengths(predictor.tokenizer, texts, max_length)
+        else:
+            indicator = predict_pipeline.load_indicators()[0]
+            def predict_batch(batch, batch_size):
+                predictor.predict_batch(batch, indicators=[indicator], batch_size=batch_size)
+                return [None] * len(batch)
+            lengths = batching.token_lengths(predictor.tokenizer, [indicator] * len(texts), max_length, text_pairs=texts)
+
+        start = time.perf_counter()
+        predict_batch(texts, predict_pipeline.FIXED_BATCH_SIZE)
+        fixed_seconds = time.perf_counter() - start
+
+        batching.MAX_BATCH_TOKENS = max_tokens
+        start = time.perf_counter()
+        predict_pipeline.predict_in_batches(predictor, texts, predict_batch, indicator=indicator)
+        bucketed_seconds = time.perf_counter() - start
+
+    plan = batching.plan_batches(lengths, max_tokens=max_tokens)
+    return {
+        'model': model,
+        'tweets': len(texts),
+        'max_seq_length': max_length,
+        'mean_tokens': sum(lengths) / len(lengths) if lengths else 0,
+        'fixed': {
+            'seconds': round(fixed_seconds, 3),
+            'tweets_per_sec': round(len(texts) / fixed_seconds, 1),
+            'padding_efficiency': round(batching.padding_efficiency(lengths, None, fixed_length=max_length), 3),
+        },
+        'bucketed': {
+            'seconds': round(bucketed_seconds, 3),
+            'tweets_per_sec': round(len(texts) / bucketed_seconds, 1),
+            'batches': len(plan),
+            'padding_efficiency': round(batching.padding_efficiency(lengths, plan), 3),
+        },
+        'speedup': round(fixed_seconds / bucketed_seconds, 2),
+    }
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Benchmark fixed vs length-bucketed batching.")
+    parser.add_argument('--model', choices=[predict_pipeline.RELEVANCE_MODEL, predict_pipeline.IDEOLOGY_MODEL], default=predict_pipeline.RELEVANCE_MODEL)
+    parser.add_argument('--limit', type=int, default=2000, help="Number of tweets to use (0 for all)")
+    parser.add_argument('--max-tokens', type=int, default=batching.MAX_BATCH_TOKENS, help="Padded token budget per batch")
+    args = parser.parse_args()
+    print(json.dumps(run(args.model, load_texts(args.limit), args.max_tokens), indent=2))
@@ -0,0 +1,304 @@
+"""
+Offline end-to-end benchmark of the bias pipeline: replays the saved tweet datasets (data/*.csv and
+backend/scraper/tweets/*.csv) through every stage without scraping, and reports p50/p95 latency,
+tweets/sec and peak RSS per stage as JSON, optionally compared against a stored baseline.
+
+Stages: dedupe, normalize, relevance (run_relevance_prediction), ideology (run_ideology_prediction),
+mongo_write (insert_tweets), stats (refresh_topic_stats), export (Parquet, when pyarrow is
+installed) and summarize (summarize_groups per leaning, as batch_summarize_tweets does per group).
+
+Model checkpoints that are not on disk are replaced by the random-weight stand-ins in standins.py
+(see the "models" section of the report), and MongoDB is mongomock unless --mongo-uri is given;
+a real server is written to in the throwaway database "tweets_benchmark". mongomock checks unique
+indexes in pure Python (quadratic in the topic size), so its mongo_write numbers only compare runs
+with each other; use --mongo-uri for representative Mongo timings. Prediction, normalization
+and tokenization caches are cleared before every repeat unless --warm is given.
+
+Usage (from backend/benchmarks):
+    python bench_pipeline.py [--limit 500] [--repeat 3] [--output results.json]
+    python bench_pipeline.py --save-baseline baselines/pipeline.json
+    python bench_pipeline.py --baseline baselines/pipeline.json [--tolerance 0.2] [--fail-on-regression]
+"""
+import argparse
+import ast
+import glob
+import json
+import logging
+import os
+import platform
+import sys
+import tempfile
+import time
+from datetime import datetime
+import numpy as np
+import pandas as pd
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+BACKEND_DIR = os.path.abspath(os.path.join(BENCH_DIR, '..'))
+SERVER_DIR = os.path.join(BACKEND_DIR, 'server')
+DATASET_GLOBS = [
+    os.path.join(BACKEND_DIR, '..', 'data', '*.csv'),
+    os.path.join(BACKEND_DIR, 'scraper', 'tweets', '*.csv'),
+]
+# Scraped fields; prediction columns saved alongside them in the CSVs are dropped before replay
+RAW_COLUMNS = ['Name', 'Handle', 'Timestamp', 'Verified', 'Content', 'Comments', 'Retweets', 'Likes',
+               'Analytics', 'Tags', 'Mentions', 'Emojis', 'Profile Image', 'Tweet Link', 'Tweet ID']
+LIST_COLUMNS = ('Tags', 'Mentions', 'Emojis')
+STAGES = ['dedupe', 'normalize', 'relevance', 'ideology', 'mongo_write', 'stats', 'export', 'summarize']
+BENCHMARK_DB = 'tweets_benchmark'
+
+sys.path.append(BENCH_DIR)
+sys.path.append(SERVER_DIR)
+
+
+def _as_list(value):
+    if isinstance(value, str) and value.startswith('['):
+        try:
+            return list(ast.literal_eval(value))
+        except (ValueError, SyntaxError):
+            return []
+    return value if isinstance(value, list) else []
+
+
+def load_datasets(patterns, limit):
+    datasets = []
+    for pattern in patterns:
+        for path in sorted(glob.glob(pattern)):
+            df = pd.read_csv(path, dtype={'Tweet ID': str})
+            df = df[[column for column in RAW_COLUMNS if column in df]].dropna(subset=['Content'])
+            for column in LIST_COLUMNS:
+                if column in df:
+                    df[column] = df[column].map(_as_list)
+            if limit:
+                df = df.head(limit)
+            name = os.path.basename(path).rsplit('.', 1)[0]
+            datasets.append((name, df.reset_index(drop=True)))
+    return datasets
+
+
+def setup(args, workdir):
+    """Point caches and stores at workdir, pick Mongo and install stand-ins; returns the report's environment section."""
+    os.environ['PREDICTION_CACHE_PATH'] = os.path.join(workdir, 'predictions.sqlite')
+    os.environ['TOPIC_INDEX_DIR'] = os.path.join(workdir, 'topic_index')
+    os.environ.setdefault('TOPIC_EMBEDDING_MODEL', 'hashing')
+
+    import standins
+    try:
+        import tools.MITweet.predict_relevence  # noqa: F401
+        import tools.MITweet.predict_ideology  # noqa: F401
+        mitweet = 'tools.MITweet'
+    except ImportError:
+        standins.install_mitweet_modules()
+        mitweet = 'stand-in'
+
+    import pymongo
+    if args.mongo_uri:
+        mongo = args.mongo_uri
+    else:
+        import mongomock
+        pymongo.MongoClient = mongomock.MongoClient
+        mongo = 'mongomock'
+    import db
+    if args.mongo_uri:
+        db.client = pymongo.MongoClient(args.mongo_uri)
+        db.client.drop_database(BENCHMARK_DB)
+        db.db = db.client[BENCHMARK_DB]
+        db.topics_collection = db.db['topics']
+        db.tweets_collection = db.db['topic_tweets']
+
+    import predict_pipeline as pp
+    from model_registry import registry
+    models = {}
+    for name, path, standin in (
+        (pp.RELEVANCE_MODEL, pp.RELEVANCE_MODEL_PATH, standins.StandInRelevancePredictor),
+        (pp.IDEOLOGY_MODEL, pp.IDEOLOGY_MODEL_PATH, standins.StandInIdeologyPredictor),
+    ):
+        if args.standins or mitweet == 'stand-in' or not os.path.exists(path):
+            registry.register(name, standin)
+            models[name] = 'stand-in'
+        else:
+            models[name] = path
+    if not os.path.exists(pp.INDICATORS_PATH):
+        pp.INDICATORS_PATH = os.path.join(workdir, 'Indicators.txt')
+        with open(pp.INDICATORS_PATH, 'w', encoding='utf-8') as indicators_file:
+            indicators_file.write('\n'.join(f'indicator {i} policy stance' for i in range(pp.NUM_INDICATORS)))
+    if args.summarizer_model:
+        from transformers import pipeline
+        summarizer = pipeline('summarization', model=args.summarizer_model, device='cpu')
+        models['summarizer'] = args.summarizer_model
+    else:
+        summarizer = standins.StandInSummarizer()
+        models['summarizer'] = 'stand-in'
+    return {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+        'mongo': mongo,
+        'mitweet': mitweet,
+        'models': models,
+    }, summarizer
+
+
+def clear_caches():
+    from prediction_cache import get_prediction_cache
+    from preprocess import normalize_tweet, token_cache
+    get_prediction_cache().clear()
+    normalize_tweet.cache_clear()
+    token_cache.clear()
+
+
+def run_dataset(name, raw, summarizer, workdir, repeat_index):
+    """Replay one dataset through every stage; the stage spans end up in the current trace."""
+    from metrics import span
+    from dedup import collapse_near_duplicates, expand_duplicates
+    from preprocess import normalize_contents
+    from predict_pipeline import run_relevance_prediction, run_ideology_prediction
+    import db
+    from db import insert_tweets
+    from topic_stats import refresh_topic_stats
+    from summarization import summarize_groups
+
+    # Normalized up front (recording its own 'normalize' span) so 'dedupe' times only the grouping;
+    # collapse_near_duplicates skips frames already flagged as normalized
+    df = normalize_contents(raw.copy())
+    with span('dedupe', items=len(df)):
+        df, representatives = collapse_near_duplicates(df)
+    with span('relevance', items=len(representatives)):
+        df_relevance = run_relevance_prediction(representatives)
+    with span('ideology', items=len(representatives)):
+        df_ideology = run_ideology_prediction(df_relevance)
+    df_final = expand_duplicates(df, df_ideology)
+    records = df_final.drop(columns=['_dup_group'], errors='ignore').to_dict(orient='records')
+    with span('mongo_write', items=len(records)):
+        query_id = insert_tweets(f'bench_{name}_{repeat_index}', records)
+    with span('stats', items=len(records)):
+        refresh_topic_stats(query_id)
+    try:
+        from columnar_store import write_topic
+        import pyarrow  # noqa: F401
+    except ImportError:
+        write_topic = None
+    if write_topic is not None:
+        with span('export', items=len(df_final)):
+            write_topic(f'bench_{name}', df_final, job_id=f'bench-{repeat_index}', root=os.path.join(workdir, 'store'))
+    leanings = df_final['leaning'].fillna('').str.lower()
+    groups = {leaning: df_final.loc[leanings == leaning, 'Content'].tolist() for leaning in ('left', 'centre', 'right')}
+    with span('summarize', items=len(df_final)):
+        summarize_groups(groups, summarizer)
+    # Untimed cleanup, so every replay writes into an equally sized collection
+    db.tweets_collection.delete_many({'query_id': db._to_object_id(query_id)})
+    db.topics_collection.delete_one({'_id': db._to_object_id(query_id)})
+
+
+def summarize_spans(spans):
+    report = {}
+    for stage in STAGES:
+        runs = [record for record in spans if record['stage'] == stage]
+        if not runs:
+            continue
+        seconds = [record['seconds'] for record in runs]
+        items = sum(record['items'] or 0 for record in runs)
+        total = sum(seconds)
+        report[stage] = {
+            'runs': len(runs),
+            'p50_seconds': round(float(np.percentile(seconds, 50)), 4),
+            'p95_seconds': round(float(np.percentile(seconds, 95)), 4),
+            'tweets': items,
+            'tweets_per_sec': round(items / total, 1) if total else None,
+            'peak_rss_mb': round(max(record['peak_rss_bytes'] for record in runs) / 2**20, 1),
+        }
+    return report
+
+
+def compare(stages, baseline_stages, tolerance):
+    """Per-stage change against the baseline; a stage regressed when p50 latency grew or throughput fell by more than tolerance."""
+    comparison = {}
+    for stage, current in stages.items():
+        previous = baseline_stages.get(stage)
+        if not previous:
+            continue
+        latency_change = current['p50_seconds'] / previous['p50_seconds'] - 1 if previous['p50_seconds'] else None
+        throughput_change = (current['tweets_per_sec'] / previous['tweets_per_sec'] - 1
+                             if current['tweets_per_sec'] and previous.get('tweets_per_sec') else None)
+        comparison[stage] = {
+            'p50_seconds_change': round(latency_change, 3) if latency_change is not None else None,
+            'tweets_per_sec_change': round(throughput_change, 3) if throughput_change is not None else None,
+            'peak_rss_mb_change': round(current['peak_rss_mb'] - previous['peak_rss_mb'], 1),
+            'regressed': bool((latency_change is not None and latency_change > tolerance) or
+                              (throughput_change is not None and throughput_change < -tolerance)),
+        }
+    return comparison
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline benchmark of the bias pipeline on saved datasets.")
+    parser.add_argument('--datasets', nargs='+', default=DATASET_GLOBS, help='CSV files or globs to replay')
+    parser.add_argument('--limit', type=int, default=200, help='Tweets per dataset (0 for all)')
+    parser.add_argument('--repeat', type=int, default=3, help='Replays of every dataset')
+    parser.add_argument('--warm', action='store_true', help='Keep prediction/normalization caches between repeats')
+    parser.add_argument('--standins', action='store_true', help='Use the stand-in models even if checkpoints exist')
+    parser.add_argument('--summarizer-model', default=None, help='Hugging Face summarization model instead of the stand-in')
+    parser.add_argument('--mongo-uri', default=None, help='Local MongoDB instead of mongomock')
+    parser.add_argument('--output', default=None, help='Write the JSON report here as well as to stdout')
+    parser.add_argument('--save-baseline', default=None, help='Store this run as the baseline')
+    parser.add_argument('--baseline', default=None, help='Baseline report to compare against')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='Relative change counted as a regression')
+    parser.add_argument('--fail-on-regression', action='store_true', help='Exit with status 1 if a stage regressed')
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.WARNING)
+
+    with tempfile.TemporaryDirectory(prefix='bench_pipeline_') as workdir:
+        environment, summarizer = setup(args, workdir)
+        datasets = load_datasets(args.datasets, args.limit)
+        if not datasets:
+            parser.error('No datasets found')
+        from metrics import trace
+        start = time.perf_counter()
+        with trace() as current:
+            for repeat_index in range(args.repeat):
+                if not args.warm:
+                    clear_caches()
+                for name, raw in datasets:
+                    run_dataset(name, raw, summarizer, workdir, repeat_index)
+        elapsed = time.perf_counter() - start
+        if args.mongo_uri:
+            import db
+            db.client.drop_database(BENCHMARK_DB)
+
+    report = {
+        'created_at': datetime.utcnow().isoformat(),
+        'environment': environment,
+        'datasets': {name: len(raw) for name, raw in datasets},
+        'repeat': args.repeat,
+        'warm': args.warm,
+        'total_seconds': round(elapsed, 3),
+        'stages': summarize_spans(current.to_list()),
+    }
+    regressed = []
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as baseline_file:
+            baseline = json.load(baseline_file)
+        comparable = baseline.get('datasets') == report['datasets'] and baseline.get('warm') == args.warm
+        report['baseline'] = {
+            'path': args.baseline, 'created_at': baseline.get('created_at'), 'tolerance': args.tolerance,
+            'comparable': comparable, 'environment': baseline.get('environment')
+        }
+        if not comparable:
+            print("Baseline was run on other datasets or cache settings; changes reflect the workload too", file=sys.stderr)
+        report['comparison'] = compare(report['stages'], baseline.get('stages', {}), args.tolerance)
+        regressed = [stage for stage, change in report['comparison'].items() if change['regressed']]
+    output = json.dumps(report, indent=2)
+    print(output)
+    for path in (args.output, args.save_baseline):
+        if path:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            with open(path, 'w', encoding='utf-8') as output_file:
+                output_file.write(output + '\n')
+    if regressed:
+        print(f"Regressed stages: {', '.join(regressed)}", file=sys.stderr)
+        if args.fail_on_regression:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
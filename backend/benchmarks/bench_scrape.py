@@ -0,0 +1,51 @@
+"""
+Scrape several queries through ScrapeScheduler and report throughput, e.g. against the local
+fixture server (fixture_server.py) to compare parallelism and request budgets.
+
+Usage (from backend/benchmarks, with fixture_server.py running):
+    TWITTER_BASE_URL=http://localhost:8765 python bench_scrape.py "q1" "q2" "q3" [--max-tweets 200] [--parallel 3]
+"""
+import argparse
+import logging
+import os
+import sys
+import time
+
+SERVER_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'server'))
+sys.path.append(SERVER_DIR)
+
+from browser_pool import get_browser_pool, close_browser_pools
+from scrape_scheduler import ScrapeScheduler, ScrapeTask
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('queries', nargs='+')
+    parser.add_argument('--max-tweets', type=int, default=200)
+    parser.add_argument('--parallel', type=int, default=2)
+    parser.add_argument('--username', default='fixture')
+    parser.add_argument('--password', default='fixture')
+    args = parser.parse_args()
+
+    get_browser_pool(args.username, args.password).size = args.parallel
+    scheduler = ScrapeScheduler(args.username, args.password, max_parallel=args.parallel)
+    tasks = [ScrapeTask(query, args.max_tweets) for query in args.queries]
+    start = time.perf_counter()
+    first_result = None
+    try:
+        def on_result(task, tweets):
+            nonlocal first_result
+            if first_result is None:
+                first_result = time.perf_counter() - start
+            print(f"{task.query}: {len(tweets)} tweets after {time.perf_counter() - start:.1f}s")
+        tweets = scheduler.run(tasks, on_result=on_result)
+    finally:
+        close_browser_pools()
+    elapsed = time.perf_counter() - start
+    print(f"\n{len(tweets)} unique tweets from {len(tasks)} queries in {elapsed:.1f}s "
+          f"({len(tweets) / elapsed:.1f} tweets/s, first result after {first_result or 0:.1f}s)")
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    main()
@@ -0,0 +1,179 @@
+"""
+Local stand-in for twitter.com that serves timelines of tweet cards with the same
+`article[data-testid="tweet"]` markup the scraper parses, so scraping can be exercised and
+benchmarked without a Twitter account or network access.
+
+Pages:
+    /i/flow/login       username/password inputs; submitting sets the auth_token cookie
+    /home, /search?q=   a timeline that loads more cards on every scroll to the bottom
+    /api/cards          JSON page of card HTML used by the timeline's scroll handler
+
+Tweet content is taken from the CSVs in data/. Use --rate-limit to make /api/cards return
+empty pages once more than N pages per minute are requested, like Twitter does when throttling.
+
+Usage (from backend/benchmarks):
+    python fixture_server.py [--port 8765] [--tweets 500] [--page-size 20] [--rate-limit 0]
+    TWITTER_BASE_URL=http://localhost:8765 python bench_scrape.py ...
+"""
+import argparse
+import glob
+import hashlib
+import html
+import json
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+import pandas as pd
+
+DATA_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', 'data'))
+
+LOGIN_PAGE = """<!DOCTYPE html>
+<html><body>
+<input autocomplete="username" onkeydown="if (event.key === 'Enter') document.getElementById('pw').style.display = 'block';">
+<div id="pw" style="display:none">
+<input autocomplete="current-password" onkeydown="if (event.key === 'Enter') { document.cookie = 'auth_token=fixture; path=/'; location.href = '/home'; }">
+</div>
+</body></html>"""
+
+TIMELINE_PAGE = """<!DOCTYPE html>
+<html><body>
+<div id="timeline">%(cards)s</div>
+<script>
+let offset = %(offset)d, loading = false, done = false;
+window.addEventListener('scroll', () => {
+  if (loading || done || window.innerHeight + window.pageYOffset < document.body.scrollHeight - 50) return;
+  loading = true;
+  fetch('/api/cards?q=' + encodeURIComponent(%(query)s) + '&offset=' + offset)
+    .then(r => r.json())
+    .then(page => {
+      document.getElementById('timeline').insertAdjacentHTML('beforeend', page.html);
+      offset += page.count;
+      done = page.done;
+      loading = false;
+    });
+});
+</script>
+</body></html>"""
+
+CARD = """<div><div><div><article data-testid="tweet">
+<div data-testid="Tweet-User-Avatar"><img src="https://example.invalid/avatar/{handle}.png"></div>
+<div data-testid="User-Name"><a href="/{handle}"><span>{name}</span></a><span>@{handle}</span></div>
+<a href="/{handle}/status/{tweet_id}"><time datetime="{timestamp}">{timestamp}</time></a>
+{verified}
+<div data-testid="tweetText"><span>{content}</span>{tags}</div>
+<div data-testid="reply"><span>{comments}</span></div>
+<div data-testid="retweet"><span>{retweets}</span></div>
+<div data-testid="like"><span>{likes}</span></div>
+<a href="/{handle}/status/{tweet_id}/analytics"><span>{analytics}</span></a>
+</article></div></div></div>"""
+
+VERIFIED = '<svg data-testid="icon-verified"></svg>'
+
+
+def load_contents():
+    contents = []
+    for path in sorted(glob.glob(os.path.join(DATA_DIR, '*.csv'))):
+        df = pd.read_csv(path, usecols=['Content'])
+        contents.extend(str(text) for text in df['Content'].dropna())
+    return contents or ["Fixture tweet #%d about the news" % i for i in range(100)]
+
+
+class Fixture:
+    def __init__(self, tweets_per_query, page_size, rate_limit):
+        self.contents = load_contents()
+        self.tweets_per_query = tweets_per_query
+        self.page_size = page_size
+        self.rate_limit = rate_limit
+        self.requests = []
+        self.lock = threading.Lock()
+
+    def throttled(self):
+        if not self.rate_limit:
+            return False
+        now = time.time()
+        with self.lock:
+            self.requests = [t for t in self.requests if now - t < 60]
+            self.requests.append(now)
+            return len(self.requests) > self.rate_limit
+
+    def card(self, query, i):
+        seed = int(hashlib.sha256(f"{query}:{i}".encode('utf-8')).hexdigest()[:12], 16)
+        handle = f"user{seed % 997}"
+        content = self.contents[seed % len(self.contents)]
+        timestamp = (datetime(2025, 1, 1) + timedelta(minutes=self.tweets_per_query - i)).strftime('%Y-%m-%dT%H:%M:%S.000Z')
+        return CARD.format(
+            name=f"User {seed % 997}",
+            handle=handle,
+            tweet_id=str(10 ** 18 + seed),
+            timestamp=timestamp,
+            verified=VERIFIED if seed % 5 == 0 else '',
+            content=html.escape(content),
+            tags=f'<a href="/hashtag/fixture?src=hashtag_click">#fixture</a>' if seed % 7 == 0 else '',
+            comments=seed % 50,
+            retweets=seed % 300,
+            likes=f"{seed % 90}K" if seed % 11 == 0 else seed % 900,
+            analytics=seed % 5000,
+        )
+
+    def page(self, query, offset):
+        end = min(offset + self.page_size, self.tweets_per_query)
+        cards = [self.card(query, i) for i in range(offset, end)]
+        return ''.join(cards), len(cards), end >= self.tweets_per_query
+
+
+def make_handler(fixture):
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, format, *args):
+            pass
+
+        def _send(self, body, content_type='text/html; charset=utf-8', status=200):
+            data = body.encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', content_type)
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_GET(self):
+            url = urlparse(self.path)
+            params = parse_qs(url.query)
+            query = params.get('q', ['home'])[0]
+            if url.path == '/i/flow/login':
+                self._send(LOGIN_PAGE)
+            elif url.path == '/api/cards':
+                if fixture.throttled():
+                    self._send(json.dumps({'html': '', 'count': 0, 'done': False}), 'application/json')
+                    return
+                cards, count, done = fixture.page(query, int(params.get('offset', ['0'])[0]))
+                self._send(json.dumps({'html': cards, 'count': count, 'done': done}), 'application/json')
+            elif url.path in ('/', '/home', '/search') or url.path.startswith('/hashtag/'):
+                cards, count, _ = fixture.page(query, 0)
+                self._send(TIMELINE_PAGE % {'cards': cards, 'offset': count, 'query': json.dumps(query)})
+            else:
+                self._send(TIMELINE_PAGE % {'cards': '', 'offset': 0, 'query': json.dumps(query)})
+
+    return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--host', default='localhost')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--tweets', type=int, default=500, help='Tweets available per query')
+    parser.add_argument('--page-size', type=int, default=20, help='Cards loaded per scroll')
+    parser.add_argument('--rate-limit', type=int, default=0, help='Card pages per minute before returning empty pages (0 = unlimited)')
+    args = parser.parse_args()
+    fixture = Fixture(args.tweets, args.page_size, args.rate_limit)
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(fixture))
+    print(f"Serving fixture timelines on http://{args.host}:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,108 @@
+"""
+Accuracy-parity and latency check of an inference backend against the saved reference outputs
+predictions_output_RELEVENCE.csv (relevance labels R1-1-1 .. R12-5-3) and
+predictions_output_IDEOLOGY.csv (ideology classes I0 .. I11).
+
+Usage (from backend/benchmarks):
+    python parity_check.py --backend torch-int8 [--limit 500] [--min-agreement 0.97]
+"""
+import argparse
+import json
+import os
+import sys
+import time
+import numpy as np
+import pandas as pd
+
+BACKEND_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+RELEVANCE_REFERENCE = os.path.join(BACKEND_DIR, 'predictions_output_RELEVENCE.csv')
+IDEOLOGY_REFERENCE = os.path.join(BACKEND_DIR, 'predictions_output_IDEOLOGY.csv')
+RELEVANCE_COLUMNS = ['R1-1-1', 'R2-1-2', 'R3-2-1', 'R4-2-2', 'R5-3-1', 'R6-3-2',
+                     'R7-3-3', 'R8-4-1', 'R9-4-2', 'R10-5-1', 'R11-5-2', 'R12-5-3']
+IDEOLOGY_COLUMNS = [f'I{i}' for i in range(12)]
+
+def timed(predict_batch, latencies):
+    def wrapper(batch, batch_size):
+        start = time.perf_counter()
+        result = predict_batch(batch, batch_size)
+        latencies.append((time.perf_counter() - start) / max(len(batch), 1) * 1000)
+        return result
+    return wrapper
+
+def latency_report(latencies, count, seconds):
+    return {
+        'tweets': count,
+        'seconds': round(seconds, 3),
+        'tweets_per_sec': round(count / seconds, 1) if seconds else None,
+        'p50_ms_per_tweet': round(float(np.percentile(latencies, 50)), 3) if latencies else None,
+        'p95_ms_per_tweet': round(float(np.percentile(latencies, 95)), 3) if latencies else None,
+    }
+
+def check_relevance(pp, registry, limit):
+    reference = pd.read_csv(RELEVANCE_REFERENCE).head(limit)
+    from preprocess import normalize_tweet
+    texts = [normalize_tweet(str(text)) for text in reference['Content'].fillna('')]
+    latencies = []
+    def predict_batch(batch, batch_size):
+        predictions, _, _ = predictor.predict(batch, batch_size=batch_size)
+        return [list(row) for row in predictions]
+    start = time.perf_counter()
+    with registry.use(pp.RELEVANCE_MODEL) as predictor:
+        labels = np.array(pp.predict_in_batches(predictor, texts, timed(predict_batch, latencies)), dtype=int)
+    seconds = time.perf_counter() - start
+    expected = reference[RELEVANCE_COLUMNS].to_numpy(dtype=int)
+    per_label = (labels == expected).mean(axis=0)
+    return {
+        'agreement': float((labels == expected).mean()),
+        'exact_match': float((labels == expected).all(axis=1).mean()),
+        'per_label': {column: round(float(value), 4) for column, value in zip(RELEVANCE_COLUMNS, per_label)},
+        'latency': latency_report(latencies, len(texts), seconds),
+    }
+
+def check_ideology(pp, registry, limit):
+    reference = pd.read_csv(IDEOLOGY_REFERENCE).head(limit)
+    from preprocess import normalize_tweet
+    texts = [normalize_tweet(str(text)) for text in reference['Content'].fillna('')]
+    indicators = pp.load_indicators()
+    latencies = []
+    agreement = {}
+    start = time.perf_counter()
+    with registry.use(pp.IDEOLOGY_MODEL) as predictor:
+        for idx, column in enumerate(IDEOLOGY_COLUMNS):
+            def predict_batch(batch, batch_size):
+                predictions, _, _ = predictor.predict_batch(batch, indicators=[indicators[idx]], batch_size=batch_size)
+                return [int(p) for p in predictions[0]]
+            predicted = np.array(pp.predict_in_batches(predictor, texts, timed(predict_batch, latencies), indicator=indicators[idx]))
+            agreement[column] = round(float((predicted == reference[column].to_numpy(dtype=int)).mean()), 4)
+    seconds = time.perf_counter() - start
+    return {
+        'agreement': float(np.mean(list(agreement.values()))),
+        'per_indicator': agreement,
+        'latency': latency_report(latencies, len(texts) * len(IDEOLOGY_COLUMNS), seconds),
+    }
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Check an inference backend against the reference prediction CSVs.")
+    parser.add_argument('--backend', default='torch', help="torch, torch-int8 or onnx")
+    parser.add_argument('--threads', type=int, default=0, help="Intra-op threads (0 keeps the library default)")
+    parser.add_argument('--limit', type=int, default=1000, help="Number of reference tweets to check")
+    parser.add_argument('--min-agreement', type=float, default=0.97, help="Fail if agreement drops below this")
+    args = parser.parse_args()
+
+    # The backend is read when the pipeline module is imported
+    os.environ['INFERENCE_BACKEND'] = args.backend
+    if args.threads:
+        os.environ['INFERENCE_THREADS'] = str(args.threads)
+    sys.path.append(os.path.join(BACKEND_DIR, 'server'))
+    import predict_pipeline as pp
+    from model_registry import registry
+
+    report = {
+        'backend': args.backend,
+        'relevance': check_relevance(pp, registry, args.limit),
+        'ideology': check_ideology(pp, registry, args.limit),
+        'models': registry.stats(),
+    }
+    print(json.dumps(report, indent=2))
+    if min(report['relevance']['agreement'], report['ideology']['agreement']) < args.min_agreement:
+        sys.exit(1)
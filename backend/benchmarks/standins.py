@@ -0,0 +1,123 @@
+"""
+Tiny random-weight stand-ins for the MITweet relevance/ideology predictors and the summarization
+pipeline, used by bench_pipeline.py when the real checkpoints (or tools/MITweet) are absent.
+
+They have the predictors' interfaces and a fixed seed, so the pipeline around them (caching,
+batching, dedup, Mongo writes, aggregation, export) is exercised on the same code paths with
+deterministic outputs; absolute model latencies are of course not representative.
+"""
+import hashlib
+import re
+import sys
+import types
+import numpy as np
+
+FEATURE_DIM = 1024
+SEED = 1234
+
+_TOKEN = re.compile(r'\w+')
+_URL = re.compile(r'https?\s*:\s*/\s*/\s*\S+|www\.\S+')
+_MENTION = re.compile(r'@\w+')
+
+
+def normalize_tweet(text):
+    """BERTweet-style normalization: @USER for mentions, HTTPURL for links, collapsed whitespace."""
+    text = _URL.sub('HTTPURL', str(text))
+    text = _MENTION.sub('@USER', text)
+    return ' '.join(text.split())
+
+
+def _features(texts):
+    features = np.zeros((len(texts), FEATURE_DIM), dtype=np.float32)
+    for row, text in enumerate(texts):
+        for token in _TOKEN.findall(text.lower()):
+            digest = int.from_bytes(hashlib.blake2b(token.encode('utf-8'), digest_size=4).digest(), 'big')
+            features[row, digest % FEATURE_DIM] += 1.0
+    norms = np.linalg.norm(features, axis=1, keepdims=True)
+    return features / np.where(norms == 0, 1, norms)
+
+
+class StandInRelevancePredictor:
+    """Hashed bag of words -> random linear layer -> 12 sigmoid relevance labels."""
+
+    def __init__(self, num_labels=12, max_seq_length=128, **kwargs):
+        rng = np.random.default_rng(SEED)
+        self.weights = rng.normal(0, 4, (FEATURE_DIM, num_labels)).astype(np.float32)
+        self.bias = np.full(num_labels, -1.5, dtype=np.float32)
+        self.max_seq_length = max_seq_length
+
+    def predict(self, texts, batch_size=32):
+        predictions, probabilities = [], []
+        for start in range(0, len(texts), batch_size):
+            logits = _features(texts[start:start + batch_size]) @ self.weights + self.bias
+            probs = 1 / (1 + np.exp(-logits))
+            predictions.append((probs > 0.5).astype(int))
+            probabilities.append(probs)
+        if not predictions:
+            empty = np.zeros((0, self.weights.shape[1]))
+            return empty.astype(int), empty, {'max_confidence': np.zeros(0)}
+        probabilities = np.concatenate(probabilities)
+        return np.concatenate(predictions), probabilities, {'max_confidence': probabilities.max(axis=1)}
+
+
+class StandInIdeologyPredictor:
+    """Hashed bag of words of (indicator, tweet) -> random linear layer -> left/centre/right."""
+
+    def __init__(self, **kwargs):
+        rng = np.random.default_rng(SEED + 1)
+        self.weights = rng.normal(0, 2, (FEATURE_DIM, 3)).astype(np.float32)
+
+    def predict_batch(self, tweets, indicators, batch_size=32):
+        predictions, probabilities = [], []
+        for indicator in indicators:
+            classes, probs_all = [], []
+            for start in range(0, len(tweets), batch_size):
+                batch = [f"{indicator} {tweet}" for tweet in tweets[start:start + batch_size]]
+                logits = _features(batch) @ self.weights
+                probs = np.exp(logits - logits.max(axis=1, keepdims=True))
+                probs /= probs.sum(axis=1, keepdims=True)
+                classes.append(probs.argmax(axis=1))
+                probs_all.append(probs)
+            predictions.append(np.concatenate(classes) if classes else np.zeros(0, dtype=int))
+            probabilities.append(np.concatenate(probs_all) if probs_all else np.zeros((0, 3)))
+        return predictions, probabilities, None
+
+
+class StandInSummarizer:
+    """Extractive stand-in for the summarization pipeline: keeps the randomly best-scored sentences."""
+
+    def __init__(self):
+        rng = np.random.default_rng(SEED + 2)
+        self.weights = rng.normal(0, 1, FEATURE_DIM).astype(np.float32)
+
+    def _summarize(self, text, max_length):
+        sentences = [s for s in re.split(r'(?<=[.!?])\s+', text) if s.strip()] or [text]
+        scores = _features(sentences) @ self.weights
+        summary = []
+        for index in sorted(np.argsort(-scores)[:3]):
+            summary.extend(sentences[index].split())
+        return ' '.join(summary[:max_length])
+
+    def __call__(self, texts, batch_size=None, max_length=150, **kwargs):
+        if isinstance(texts, str):
+            return [{'summary_text': self._summarize(texts, max_length)}]
+        return [{'summary_text': self._summarize(text, max_length)} for text in texts]
+
+
+def install_mitweet_modules():
+    """
+    Register stand-in tools.MITweet modules so predict_pipeline and preprocess import when the
+    MITweet sources are not checked out next to the server.
+    """
+    def module(name, **attrs):
+        mod = types.ModuleType(name)
+        mod.__dict__.update(attrs)
+        sys.modules[name] = mod
+        return mod
+
+    args = types.SimpleNamespace(indicator_num=5, sep_ind=False, max_seq_length=128)
+    module('tools')
+    module('tools.MITweet')
+    module('tools.MITweet.TweetNormalizer', normalizeTweet=normalize_tweet)
+    module('tools.MITweet.predict_relevence', TweetPredictor=StandInRelevancePredictor)
+    module('tools.MITweet.predict_ideology', RobertaTweetPredictor=StandInIdeologyPredictor, args=args)
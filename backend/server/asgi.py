@@ -0,0 +1,26 @@
+"""
+ASGI entry point: the async read endpoints (async_api.py) in front of the Flask app, which serves
+every other route through asgiref's WSGI adapter (in its thread pool).
+
+    uvicorn asgi:app --port 5500 --workers 2
+    WEB_WORKER_CLASS=uvicorn_worker.UvicornWorker gunicorn -c gunicorn.conf.py asgi:app
+
+Importing wsgi preloads the models before gunicorn forks, as for the WSGI entry point.
+"""
+import re
+from asgiref.wsgi import WsgiToAsgi
+from wsgi import application as flask_app
+from async_api import async_app
+
+# Paths served by the async app; everything else (jobs, stats, models, metrics, ...) goes to Flask
+ASYNC_PATHS = re.compile(r'^/api/(topics(/[^/]+)?|search-topic)/?$')
+
+flask_asgi = WsgiToAsgi(flask_app)
+
+
+async def app(scope, receive, send):
+    if scope['type'] == 'lifespan' or (scope['type'] == 'http' and ASYNC_PATHS.match(scope['path'])):
+        # Quart also handles the lifespan events (startup/shutdown of the Motor client)
+        await async_app(scope, receive, send)
+    else:
+        await flask_asgi(scope, receive, send)
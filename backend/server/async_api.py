@@ -0,0 +1,125 @@
+"""
+Async (Quart) versions of the read endpoints /api/topics, /api/topics/<id> and /api/search-topic.
+
+They read MongoDB through the pooled Motor client in db_async.py, so a slow query only suspends
+its own request, and run the query embedding of topic search on a bounded thread pool. Topic pages
+go through the same response cache as the Flask routes in server.py, whose responses they match.
+asgi.py mounts this app in front of the Flask app.
+"""
+import asyncio
+import json
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from quart import Quart, Response, jsonify, request
+import db_async
+from response_cache import get_response_cache, TopicResponse
+from server import (
+    normalize_query, _similar_topics, _search_topic_payload, _topic_page_args, _wants_ndjson, _topic_page_payload,
+    _topic_list_limit
+)
+
+logger = logging.getLogger(__name__)
+
+# Threads for model inference (query embeddings) handed off from the event loop; unrelated to
+# INFERENCE_THREADS, which sets the intra-op threads of the classifier backends
+ASYNC_EXECUTOR_THREADS = int(os.environ.get('ASYNC_EXECUTOR_THREADS', 4))
+inference_executor = ThreadPoolExecutor(max_workers=ASYNC_EXECUTOR_THREADS, thread_name_prefix='inference')
+
+async_app = Quart(__name__)
+
+
+@async_app.after_request
+async def allow_cross_origin(response):
+    # Same policy as flask_cors' CORS(app) on the Flask app
+    response.headers['Access-Control-Allow-Origin'] = '*'
+    if request.method == 'OPTIONS':
+        response.headers['Access-Control-Allow-Headers'] = request.headers.get('Access-Control-Request-Headers', '*')
+        response.headers['Access-Control-Allow-Methods'] = 'GET, POST, OPTIONS'
+    return response
+
+
+@async_app.after_serving
+async def close_clients():
+    db_async.close_async_client()
+    inference_executor.shutdown(wait=False)
+
+
+@async_app.route('/api/search-topic', methods=['POST'])
+async def search_topic_endpoint():
+    data = await request.get_json()
+    query = (data or {}).get('query')
+    if not query:
+        return jsonify({"error": "No query provided"}), 400
+
+    normalized_query = normalize_query(query)
+    exact_match = await db_async.get_topic_by_query(normalized_query)
+    existing_topics = await db_async.search_similar_topics(query.strip(), max_results=6, executor=inference_executor)
+    return jsonify(_search_topic_payload(exact_match, _similar_topics(normalized_query, existing_topics)))
+
+
+async def _stream_tweets_ndjson(query_id, filters, sort):
+    async for tweet in db_async.iter_topic_tweets(query_id, filters=filters, sort=sort):
+        yield (json.dumps(tweet, default=str) + '\n').encode('utf-8')
+
+
+async def _cached_topic_response(endpoint, query_id, build):
+    """Async server._cached_topic_response; the cache lookup and compression run off the event loop."""
+    version = await db_async.get_topic_version(query_id)
+    if version is None:
+        return jsonify({"error": "Topic not found"}), 404
+    loop = asyncio.get_running_loop()
+    response = await loop.run_in_executor(
+        None, TopicResponse, get_response_cache(), endpoint, query_id, version, request.args, request.headers
+    )
+    if response.needs_body:
+        payload = await build()
+        if payload is None:
+            return jsonify({"error": "Topic not found"}), 404
+        await loop.run_in_executor(None, response.store, async_app.json.dumps(payload).encode('utf-8'))
+    status, body, headers = response.render()
+    return Response(body, status=status, headers=headers, mimetype='application/json')
+
+
+@async_app.route('/api/topics/<query_id>', methods=['GET'])
+async def get_topic_route(query_id):
+    """Async server.get_topic_route: a topic with one page of its tweets, or all of them as NDJSON."""
+    try:
+        filters, sort, offset, limit = _topic_page_args(request.args)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    try:
+        if _wants_ndjson(request):
+            if await db_async.get_topic_version(query_id) is None:
+                return jsonify({"error": "Topic not found"}), 404
+            return Response(_stream_tweets_ndjson(query_id, filters, sort), mimetype='application/x-ndjson')
+
+        async def build():
+            topic = await db_async.get_topic(query_id)
+            if not topic:
+                return None
+            total = await db_async.count_topic_tweets(query_id, filters)
+            tweets = await db_async.get_topic_tweets(query_id, skip=offset, limit=limit, filters=filters, sort=sort)
+            return _topic_page_payload(topic, tweets, total, offset, limit)
+
+        return await _cached_topic_response('topic', query_id, build)
+    except Exception as e:
+        logger.error(f"Error fetching topic {query_id}: {e}")
+        return jsonify({"error": "Failed to fetch topic"}), 500
+
+
+@async_app.route('/api/topics', methods=['GET'])
+async def get_topics_route():
+    """Async server.get_topics_route: one page of topic metadata."""
+    try:
+        limit = _topic_list_limit(request.args)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    try:
+        topics, next_cursor = await db_async.list_topics(limit=limit, cursor=request.args.get('cursor'))
+        return jsonify({"topics": topics, "next_cursor": next_cursor})
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        logger.error(f"Error fetching topics: {e}")
+        return jsonify({"error": "Failed to fetch topics"}), 500
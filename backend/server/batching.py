@@ -0,0 +1,94 @@
+import os
+from contextlib import contextmanager
+from preprocess import token_cache
+
+# Padded tokens (batch size x longest sequence) allowed per forward pass
+MAX_BATCH_TOKENS = int(os.environ.get('BATCH_MAX_TOKENS', 4096))
+MAX_BATCH_SIZE = int(os.environ.get('BATCH_MAX_SIZE', 64))
+
+
+def token_lengths(tokenizer, texts, max_length, text_pairs=None):
+    """Token count of each text (or text pair) after truncation, served from the shared token cache."""
+    encodings = token_cache.encode(tokenizer, list(texts), max_length, text_pairs=text_pairs)
+    return [len(encoding['input_ids']) for encoding in encodings]
+
+
+def plan_batches(lengths, max_tokens=MAX_BATCH_TOKENS, max_batch_size=MAX_BATCH_SIZE):
+    """
+    Group item indices into batches of similar length.
+
+    Items are sorted by token length and packed greedily while the padded size of the batch
+    (items x longest item) stays within max_tokens.
+
+    Returns:
+        List[Tuple[List[int], int]]: (original indices, longest length) per batch
+    """
+    order = sorted(range(len(lengths)), key=lambda i: lengths[i])
+    batches = []
+    current = []
+    longest = 0
+    for i in order:
+        candidate = max(longest, lengths[i])
+        if current and (len(current) >= max_batch_size or candidate * (len(current) + 1) > max_tokens):
+            batches.append((current, longest))
+            current = []
+            candidate = lengths[i]
+        current.append(i)
+        longest = candidate
+    if current:
+        batches.append((current, longest))
+    return batches
+
+
+def padding_efficiency(lengths, batches, fixed_length=None):
+    """Share of computed positions that are real tokens, for a batch plan or for fixed-length padding."""
+    real = sum(lengths)
+    if fixed_length is not None:
+        padded = fixed_length * len(lengths)
+    else:
+        padded = sum(length * len(indices) for indices, length in batches)
+    return real / padded if padded else 1.0
+
+
+@contextmanager
+def sequence_length(predictor, length):
+    """
+    Temporarily cap the sequence length a predictor pads/truncates to, so a batch is padded only
+    to its own longest item. Callers must hold the model's registry lock (registry.use).
+    """
+    targets = [obj for obj in (predictor, getattr(predictor, 'args', None))
+               if obj is not None and isinstance(getattr(obj, 'max_seq_length', None), int)]
+    previous = [obj.max_seq_length for obj in targets]
+    try:
+        for obj, original in zip(targets, previous):
+            obj.max_seq_length = min(length, original)
+        yield
+    finally:
+        for obj, original in zip(targets, previous):
+            obj.max_seq_length = original
+
+
+def predict_bucketed(predictor, texts, lengths, predict_batch, length_margin=0, max_tokens=None, max_batch_size=None):
+    """
+    Run predict_batch over length-bucketed batches and return its per-item results in input order.
+
+    Args:
+        predictor: Model wrapper whose max_seq_length is lowered per batch
+        texts: Inputs to predict on
+        lengths: Token length of each input (see token_lengths)
+        predict_batch: Callable(list of texts) -> list of per-item results
+        length_margin: Extra tokens added to each batch's cap (e.g. for inputs the predictor extends)
+        max_tokens, max_batch_size: Batch limits (default MAX_BATCH_TOKENS / MAX_BATCH_SIZE)
+    """
+    results = [None] * len(texts)
+    batches = plan_batches(
+        lengths,
+        max_tokens=max_tokens or MAX_BATCH_TOKENS,
+        max_batch_size=max_batch_size or MAX_BATCH_SIZE
+    )
+    for indices, longest in batches:
+        with sequence_length(predictor, longest + length_margin):
+            batch_results = predict_batch([texts[i] for i in indices])
+        for i, result in zip(indices, batch_results):
+            results[i] = result
+    return results
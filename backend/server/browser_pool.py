@@ -0,0 +1,219 @@
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from scraper_file import Twitter_Scraper, create_driver, TWITTER_BASE_URL
+from metrics import Cancelled
+
+logger = logging.getLogger(__name__)
+
+# Browsers kept warm per account; matches the default number of job workers
+BROWSER_POOL_SIZE = int(os.environ.get('BROWSER_POOL_SIZE', 2))
+# A browser is recycled after this many scrapes or this many seconds, whichever comes first
+BROWSER_MAX_USES = int(os.environ.get('BROWSER_MAX_USES', 50))
+BROWSER_MAX_AGE_SECONDS = int(os.environ.get('BROWSER_MAX_AGE_SECONDS', 3600))
+BROWSER_ACQUIRE_TIMEOUT = int(os.environ.get('BROWSER_ACQUIRE_TIMEOUT', 600))
+COOKIE_DIR = os.environ.get('BROWSER_COOKIE_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'cache', 'cookies'))
+# Cookie set by Twitter only for an authenticated session
+AUTH_COOKIE = 'auth_token'
+_COOKIE_FIELDS = ('name', 'value', 'domain', 'path', 'secure', 'httpOnly', 'expiry')
+
+
+class BrowserSession:
+    """A WebDriver owned by the pool, with the bookkeeping used to decide when to recycle it."""
+
+    def __init__(self, driver):
+        self.driver = driver
+        self.created_at = time.time()
+        self.uses = 0
+
+    def expired(self):
+        return self.uses >= BROWSER_MAX_USES or time.time() - self.created_at >= BROWSER_MAX_AGE_SECONDS
+
+    def healthy(self):
+        try:
+            self.driver.execute_script("return document.readyState;")
+            return True
+        except Exception:
+            return False
+
+    def quit(self):
+        try:
+            self.driver.quit()
+        except Exception as e:
+            logger.warning(f"Error closing browser: {e}")
+
+
+class BrowserPool:
+    """
+    Pool of warm, logged-in WebDriver sessions for one Twitter account.
+
+    Sessions are handed out with `with pool.session() as driver:`. A new browser first tries the
+    cookies saved by a previous login and only runs the full login flow when they are missing or
+    rejected; cookies are saved again after every login. Browsers that fail a health check, raise
+    during a scrape, or reach BROWSER_MAX_USES / BROWSER_MAX_AGE_SECONDS are quit instead of reused.
+    """
+
+    def __init__(self, username, password, size=None):
+        self.username = username
+        self.password = password
+        self.size = size or BROWSER_POOL_SIZE
+        self.cookie_path = os.path.join(COOKIE_DIR, f"{username}.json")
+        self._idle = []
+        self._open = 0
+        self._condition = threading.Condition()
+        self.created = 0
+        self.recycled = 0
+        self.logins = 0
+
+    def _load_cookies(self):
+        try:
+            with open(self.cookie_path, encoding='utf-8') as cookie_file:
+                return json.load(cookie_file)
+        except (OSError, ValueError):
+            return []
+
+    def _save_cookies(self, driver):
+        os.makedirs(COOKIE_DIR, exist_ok=True)
+        cookies = [{k: c[k] for k in _COOKIE_FIELDS if k in c} for c in driver.get_cookies()]
+        tmp_path = f"{self.cookie_path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as cookie_file:
+            json.dump(cookies, cookie_file)
+        os.replace(tmp_path, self.cookie_path)
+
+    @staticmethod
+    def is_logged_in(driver):
+        return any(cookie.get('name') == AUTH_COOKIE for cookie in driver.get_cookies())
+
+    def _restore_cookies(self, driver):
+        cookies = self._load_cookies()
+        if not cookies:
+            return False
+        driver.get(TWITTER_BASE_URL)
+        for cookie in cookies:
+            try:
+                driver.add_cookie(cookie)
+            except Exception:
+                continue
+        driver.refresh()
+        return self.is_logged_in(driver)
+
+    def _login(self, driver):
+        if self._restore_cookies(driver):
+            logger.info(f"Restored saved session for {self.username}")
+            return
+        logger.info(f"Logging in {self.username} in a new browser")
+        Twitter_Scraper(self.username, self.password, driver=driver).login()
+        self.logins += 1
+        if self.is_logged_in(driver):
+            self._save_cookies(driver)
+
+    def _create(self):
+        driver = create_driver()
+        try:
+            driver.maximize_window()
+            self._login(driver)
+        except BaseException:
+            driver.quit()
+            raise
+        self.created += 1
+        return BrowserSession(driver)
+
+    def _acquire(self):
+        deadline = time.time() + BROWSER_ACQUIRE_TIMEOUT
+        with self._condition:
+            while True:
+                while self._idle:
+                    session = self._idle.pop()
+                    if not session.expired() and session.healthy():
+                        return session
+                    self._discard(session)
+                if self._open < self.size:
+                    self._open += 1
+                    break
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    raise TimeoutError(f"No browser available for {self.username} after {BROWSER_ACQUIRE_TIMEOUT}s")
+                self._condition.wait(remaining)
+        # Start the browser outside the lock so other jobs can still take idle sessions
+        try:
+            return self._create()
+        except BaseException:
+            with self._condition:
+                self._open -= 1
+                self._condition.notify()
+            raise
+
+    def _discard(self, session):
+        """Quit a session; callers hold self._condition."""
+        session.quit()
+        self._open -= 1
+        self.recycled += 1
+        self._condition.notify()
+
+    def _release(self, session, failed):
+        session.uses += 1
+        with self._condition:
+            if failed or session.expired():
+                self._discard(session)
+            else:
+                self._idle.append(session)
+                self._condition.notify()
+
+    @contextmanager
+    def session(self):
+        """Borrow a logged-in WebDriver for one scrape. A scrape stopped on request (Cancelled) returns a healthy browser."""
+        session = self._acquire()
+        failed = True
+        try:
+            yield session.driver
+            failed = False
+        except Cancelled:
+            failed = False
+            raise
+        finally:
+            self._release(session, failed)
+
+    def warm_up(self, count=None):
+        """Start and log in browsers ahead of the first scrape."""
+        sessions = [self._acquire() for _ in range(min(count or self.size, self.size))]
+        for session in sessions:
+            session.uses -= 1  # Warm-up does not count as a use
+            self._release(session, False)
+
+    def close_all(self):
+        with self._condition:
+            while self._idle:
+                self._discard(self._idle.pop())
+
+    def stats(self):
+        with self._condition:
+            return {
+                'size': self.size,
+                'open': self._open,
+                'idle': len(self._idle),
+                'created': self.created,
+                'recycled': self.recycled,
+                'logins': self.logins,
+            }
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_browser_pool(username, password):
+    """Process-wide pool for an account, created on first use."""
+    with _pools_lock:
+        pool = _pools.get(username)
+        if pool is None:
+            pool = _pools[username] = BrowserPool(username, password)
+        return pool
+
+
+def close_browser_pools():
+    with _pools_lock:
+        for pool in _pools.values():
+            pool.close_all()
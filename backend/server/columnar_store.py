@@ -0,0 +1,267 @@
+import argparse
+import ast
+import glob
+import json
+import logging
+import os
+import re
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+import pandas as pd
+from db import parse_count
+
+try:
+    import fcntl
+except ImportError:
+    # Windows: exports of a topic are only serialized within one process
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+# Root of the Parquet store: <root>/topic=<query>/date=<YYYY-MM-DD>/part-<version>-<job>.parquet, with
+# <root>/topic=<query>/_manifest.json naming the parts of the committed version
+TWEET_STORE_DIR = os.environ.get('TWEET_STORE_DIR', os.path.join('data', 'store'))
+COMPRESSION = 'zstd'
+UNKNOWN_DATE = 'unknown'
+
+STRING_COLUMNS = ('Tweet ID', 'Name', 'Handle', 'Content', 'Profile Image', 'Tweet Link', 'leaning', 'dup_of', 'query_id')
+COUNT_COLUMNS = ('Comments', 'Retweets', 'Likes', 'Analytics', 'Engagement')
+LIST_COLUMNS = ('Tags', 'Mentions', 'Emojis')
+NUM_INDICATORS = 12
+
+
+def _schema_fields():
+    import pyarrow as pa
+    fields = [(name, pa.string()) for name in STRING_COLUMNS]
+    fields.append(('Timestamp', pa.timestamp('ms', tz='UTC')))
+    fields.append(('Verified', pa.bool_()))
+    fields += [(name, pa.int64()) for name in COUNT_COLUMNS]
+    fields += [(name, pa.list_(pa.string())) for name in LIST_COLUMNS]
+    fields += [(f'label_{i}', pa.int8()) for i in range(NUM_INDICATORS)]
+    fields.append(('max_confidence', pa.float32()))
+    # Ideology class per indicator; null where the tweet is not relevant to it (see run_ideology_prediction)
+    fields += [(f'I{i}', pa.float32()) for i in range(NUM_INDICATORS)]
+    fields.append(('dup_group_size', pa.int32()))
+    fields.append(('position', pa.int64()))
+    return fields
+
+
+def _as_list(value):
+    if isinstance(value, (list, tuple)):
+        return [str(v) for v in value]
+    if isinstance(value, str) and value.startswith('['):
+        try:
+            return [str(v) for v in ast.literal_eval(value)]
+        except (ValueError, SyntaxError):
+            return []
+    return []
+
+
+def _as_bool(value):
+    if isinstance(value, str):
+        return value.strip().lower() == 'true'
+    return bool(value) if value == value else False
+
+
+def to_table(df):
+    """Typed Arrow table of a tweets DataFrame; columns outside the store schema are dropped."""
+    import pyarrow as pa
+    df = df.copy()
+    if 'Engagement' not in df and all(field in df for field in ('Comments', 'Retweets', 'Likes')):
+        df['Engagement'] = sum(df[field].map(parse_count) for field in ('Comments', 'Retweets', 'Likes'))
+    columns = {}
+    fields = []
+    for name, arrow_type in _schema_fields():
+        if name not in df:
+            continue
+        series = df[name]
+        if name in COUNT_COLUMNS:
+            values = series.map(parse_count)
+        elif name in LIST_COLUMNS:
+            values = series.map(_as_list)
+        elif name == 'Timestamp':
+            values = pd.to_datetime(series, utc=True, errors='coerce')
+        elif name == 'Verified':
+            values = series.map(_as_bool)
+        elif name in STRING_COLUMNS:
+            values = series.map(lambda v: None if v is None or v != v else str(v))
+        else:
+            values = pd.to_numeric(series, errors='coerce')
+            if pa.types.is_integer(arrow_type):
+                values = values.fillna(0).astype('int64')
+        columns[name] = pa.array(values, type=arrow_type, from_pandas=True)
+        fields.append(pa.field(name, arrow_type))
+    return pa.Table.from_arrays(list(columns.values()), schema=pa.schema(fields))
+
+
+def _partition_name(value):
+    """Filesystem-safe partition value."""
+    return re.sub(r'[^\w\-.]+', '_', str(value)).strip('_') or 'unnamed'
+
+
+def _topic_dir(topic, root):
+    return os.path.join(root, f"topic={_partition_name(topic)}")
+
+
+MANIFEST = '_manifest.json'
+_topic_locks = {}
+_topic_locks_guard = threading.Lock()
+
+
+@contextmanager
+def _topic_lock(topic_dir):
+    """Serializes exports of one topic between threads and (where fcntl exists) worker processes."""
+    with _topic_locks_guard:
+        lock = _topic_locks.setdefault(os.path.abspath(topic_dir), threading.Lock())
+    with lock:
+        os.makedirs(topic_dir, exist_ok=True)
+        if fcntl is None:
+            yield
+            return
+        with open(os.path.join(topic_dir, '_lock'), 'a') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def _read_manifest(topic_dir):
+    try:
+        with open(os.path.join(topic_dir, MANIFEST), encoding='utf-8') as manifest_file:
+            return json.load(manifest_file)
+    except (OSError, ValueError):
+        return None
+
+
+def _write_manifest(topic_dir, manifest):
+    path = os.path.join(topic_dir, MANIFEST)
+    with open(f"{path}.tmp", 'w', encoding='utf-8') as manifest_file:
+        json.dump(manifest, manifest_file)
+    os.replace(f"{path}.tmp", path)
+
+
+def _part_version(path):
+    """Version of a part-<version>-<job>.parquet file ('' for parts written before versions existed)."""
+    match = re.match(r'part-(\d{20})-', os.path.basename(path))
+    return match.group(1) if match else ''
+
+
+def _committed_files(topic_dir):
+    manifest = _read_manifest(topic_dir)
+    if manifest is None:
+        # Stores written before manifests existed: every part in the directory
+        return sorted(glob.glob(os.path.join(topic_dir, 'date=*', 'part-*.parquet')))
+    return [os.path.join(topic_dir, relative) for relative in manifest['files']]
+
+
+def write_topic(topic, df, job_id=None, root=None):
+    """
+    Write a topic's tweets as zstd-compressed Parquet, one file per tweet date.
+
+    The export is versioned by its start time: its parts are named part-<version>-<job_id> and
+    become visible to readers only when _manifest.json is atomically replaced to name them. Parts
+    of older versions are deleted after that commit. Exports of one topic are serialized; one
+    that finds a newer version already committed discards its own parts.
+
+    Returns:
+        List[str]: paths written (empty when a newer export had already been committed)
+    """
+    import pyarrow.parquet as pq
+    root = root or TWEET_STORE_DIR
+    job_id = job_id or uuid.uuid4().hex
+    version = f"{time.time_ns():020d}"
+    topic_dir = _topic_dir(topic, root)
+    timestamps = pd.to_datetime(df['Timestamp'], utc=True, errors='coerce') if 'Timestamp' in df else pd.Series(pd.NaT, index=df.index)
+    dates = timestamps.dt.strftime('%Y-%m-%d').fillna(UNKNOWN_DATE)
+    part_name = f"part-{version}-{_partition_name(job_id)}.parquet"
+    with _topic_lock(topic_dir):
+        committed = _read_manifest(topic_dir)
+        if committed is not None and committed['version'] > version:
+            logger.info(f"Skipped export of {topic} by {job_id}: version {committed['version']} is newer")
+            return []
+        written = []
+        for date, rows in df.groupby(dates, sort=True):
+            date_dir = os.path.join(topic_dir, f"date={date}")
+            os.makedirs(date_dir, exist_ok=True)
+            path = os.path.join(date_dir, part_name)
+            tmp_path = os.path.join(date_dir, f".{part_name}.tmp")
+            pq.write_table(to_table(rows), tmp_path, compression=COMPRESSION)
+            os.replace(tmp_path, path)
+            written.append(path)
+        _write_manifest(topic_dir, {
+            'version': version,
+            'job_id': job_id,
+            'files': [os.path.relpath(path, topic_dir) for path in written]
+        })
+        for old_path in glob.glob(os.path.join(topic_dir, 'date=*', 'part-*.parquet')):
+            if _part_version(old_path) < version:
+                os.remove(old_path)
+        for date_dir in glob.glob(os.path.join(topic_dir, 'date=*')):
+            if not os.listdir(date_dir):
+                os.rmdir(date_dir)
+    logger.info(f"Wrote {len(df)} tweets of {topic} to {len(written)} Parquet partitions under {topic_dir}")
+    return written
+
+
+def read_tweets(topic=None, columns=None, start_date=None, end_date=None, root=None):
+    """
+    Load tweets from the store, reading only the requested columns and partitions.
+
+    Args:
+        topic: Topic (query key) to read; all topics when None
+        columns: Columns to load, e.g. ['Content', 'leaning']; all when None
+        start_date, end_date: Inclusive 'YYYY-MM-DD' bounds on the tweet date partition
+    """
+    import pyarrow.dataset as ds
+    root = root or TWEET_STORE_DIR
+    base = _topic_dir(topic, root) if topic is not None else root
+    topic_dirs = [base] if topic is not None else sorted(glob.glob(os.path.join(root, 'topic=*')))
+    condition = None
+    for op, bound in (('>=', start_date), ('<=', end_date)):
+        if bound is not None:
+            clause = (ds.field('date') >= bound) if op == '>=' else (ds.field('date') <= bound)
+            clause = clause & (ds.field('date') != UNKNOWN_DATE)
+            condition = clause if condition is None else condition & clause
+    for attempt in range(3):
+        # Only the parts named by each topic's manifest, so a concurrent export is never half-read
+        files = [path for topic_dir in topic_dirs for path in _committed_files(topic_dir)]
+        if not files:
+            return pd.DataFrame(columns=columns or [])
+        try:
+            dataset = ds.dataset(files, format='parquet', partitioning='hive', partition_base_dir=base)
+            return dataset.to_table(columns=columns, filter=condition).to_pandas()
+        except FileNotFoundError:
+            # A newer export was committed and removed these parts; read its manifest
+            if attempt == 2:
+                raise
+
+
+def list_store_topics(root=None):
+    root = root or TWEET_STORE_DIR
+    return sorted(os.path.basename(path)[len('topic='):] for path in glob.glob(os.path.join(root, 'topic=*')))
+
+
+def import_csv(path, topic=None, root=None):
+    """Convert a legacy data/<query>_tweets.csv export into the store."""
+    topic = topic or os.path.basename(path).rsplit('_tweets.csv', 1)[0]
+    df = pd.read_csv(path, dtype={'Tweet ID': str})
+    return write_topic(topic, df, job_id='csv-import', root=root)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Import CSV exports into the Parquet tweet store or inspect it.")
+    parser.add_argument('--import-csv', nargs='+', metavar='CSV', help='Legacy <query>_tweets.csv files to convert')
+    parser.add_argument('--root', default=None, help=f'Store directory (default {TWEET_STORE_DIR})')
+    args = parser.parse_args()
+    for path in args.import_csv or []:
+        print(f"{path}: {len(import_csv(path, root=args.root))} partitions written")
+    for topic in list_store_topics(args.root):
+        print(f"{topic}: {len(read_tweets(topic, columns=['Tweet ID'], root=args.root))} tweets")
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    main()
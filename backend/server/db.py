@@ -1,88 +1,488 @@
-from pymongo import MongoClient
+import logging
+import os
+import threading
+import pymongo
+from pymongo import MongoClient, ASCENDING, DESCENDING, UpdateOne
+from pymongo.errors import BulkWriteError
 from bson import ObjectId
+from bson.errors import InvalidId
 from datetime import datetime
+from topic_index import topic_index, TOPIC_INDEX_SAMPLE
 
-# MongoDB connection (update with your actual connection string)
-client = MongoClient('mongodb://localhost:27017/')
-db = client['tweets']
-tweets_collection = db['tweets']
-topics_collection = db['tweets']
+logger = logging.getLogger(__name__)
+
+# MongoDB connection. connect=False defers opening sockets to the first operation, so a client
+# created before gunicorn forks its workers (preload_app) is never shared across processes.
+MONGO_URI = os.environ.get('MONGO_URI', 'mongodb://localhost:27017/')
+MONGO_DB = 'tweets'
+# Connection pool, timeouts and read preference, shared with the async client in db_async.py
+MONGO_CLIENT_OPTIONS = {
+    'maxPoolSize': int(os.environ.get('MONGO_MAX_POOL_SIZE', 100)),
+    'minPoolSize': int(os.environ.get('MONGO_MIN_POOL_SIZE', 0)),
+    'serverSelectionTimeoutMS': int(os.environ.get('MONGO_SERVER_SELECTION_TIMEOUT_MS', 5000)),
+    'connectTimeoutMS': int(os.environ.get('MONGO_CONNECT_TIMEOUT_MS', 5000)),
+    'socketTimeoutMS': int(os.environ.get('MONGO_SOCKET_TIMEOUT_MS', 30000)),
+    # e.g. secondaryPreferred to serve reads from replicas
+    'readPreference': os.environ.get('MONGO_READ_PREFERENCE', 'primary'),
+}
+client = MongoClient(MONGO_URI, connect=False, **MONGO_CLIENT_OPTIONS)
+db = client[MONGO_DB]
+# One metadata document per analysed topic
+topics_collection = db['topics']
+# One document per tweet, keyed by (query_id, Tweet ID)
+tweets_collection = db['topic_tweets']
+# Pre-split layout with every tweet embedded in its topic document (see migrate_tweets.py)
+legacy_collection = db['tweets']
+# Status snapshots of analysis jobs, shared by the server's worker processes (see jobs.JobStore)
+jobs_collection = db['jobs']
+
+WRITE_BATCH_SIZE = 1000
+ENGAGEMENT_FIELDS = ('Comments', 'Retweets', 'Likes')
+# Sort orders accepted by get_topic_tweets callers; ties keep scrape order
+TWEET_SORTS = {
+    'position': [('position', ASCENDING)],
+    'engagement': [('Engagement', DESCENDING), ('position', ASCENDING)],
+    'likes': [('Likes', DESCENDING), ('position', ASCENDING)],
+    'retweets': [('Retweets', DESCENDING), ('position', ASCENDING)],
+    'comments': [('Comments', DESCENDING), ('position', ASCENDING)]
+}
+LEANINGS = ('left', 'centre', 'right')
+# Fields returned by the topic listing; never includes tweets
+TOPIC_LIST_FIELDS = {
+    'query': 1,
+    'created_at': 1,
+    'updated_at': 1,
+    'tweet_count': 1,
+    'leaning_distribution': 1,
+    'ideological_summaries': 1,
+    'status': 1
+}
+DUPLICATE_KEY_ERROR = 11000
+
+_indexes_ready = False
+_indexes_lock = threading.Lock()
+
+def ping(timeout=2):
+    """True when MongoDB answers a ping within timeout seconds."""
+    try:
+        with pymongo.timeout(timeout):
+            client.admin.command('ping')
+        return True
+    except Exception as e:
+        logger.warning(f"MongoDB ping failed: {e}")
+        return False
+
+def ensure_indexes():
+    """Create the indexes the storage layer relies on (once per process)."""
+    global _indexes_ready
+    if _indexes_ready:
+        return
+    with _indexes_lock:
+        if _indexes_ready:
+            return
+        tweets_collection.create_index([('query_id', ASCENDING), ('Tweet ID', ASCENDING)], unique=True)
+        tweets_collection.create_index([('query_id', ASCENDING), ('position', ASCENDING)])
+        tweets_collection.create_index([('query_id', ASCENDING), ('leaning', ASCENDING), ('position', ASCENDING)])
+        tweets_collection.create_index([('query_id', ASCENDING), ('Engagement', DESCENDING), ('position', ASCENDING)])
+        topics_collection.create_index([('query', ASCENDING)])
+        _indexes_ready = True
+
+def _to_object_id(query_id):
+    if isinstance(query_id, ObjectId):
+        return query_id
+    try:
+        return ObjectId(query_id)
+    except (InvalidId, TypeError):
+        return None
+
+def _tweet_key(tweet, position):
+    """Stable per-topic key of a tweet; falls back to its scrape position when the ID is missing."""
+    tweet_id = tweet.get('Tweet ID')
+    if tweet_id is None or tweet_id != tweet_id or str(tweet_id) == '':
+        return f"local-{position}"
+    return str(tweet_id)
+
+def parse_count(value):
+    """Convert a scraped engagement count ("12", "1,204", "3.4K", "2M", "") to an int."""
+    if isinstance(value, bool):
+        return int(value)
+    if isinstance(value, (int, float)):
+        return int(value) if value == value else 0
+    text = str(value or '').strip().replace(',', '').upper()
+    if not text:
+        return 0
+    multiplier = 1
+    if text[-1] in ('K', 'M', 'B'):
+        multiplier = {'K': 1_000, 'M': 1_000_000, 'B': 1_000_000_000}[text[-1]]
+        text = text[:-1]
+    try:
+        return int(float(text) * multiplier)
+    except ValueError:
+        return 0
+
+def _chunks(items, size=WRITE_BATCH_SIZE):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+def _tweet_documents(oid, tweets, start_position=0):
+    docs = []
+    for offset, tweet in enumerate(tweets):
+        position = start_position + offset
+        doc = dict(tweet)
+        doc.pop('_id', None)
+        doc['Tweet ID'] = _tweet_key(tweet, position)
+        # Engagement counts are coerced once here so reads never have to
+        for field in ENGAGEMENT_FIELDS:
+            doc[field] = parse_count(doc.get(field, 0))
+        doc['Engagement'] = sum(doc[field] for field in ENGAGEMENT_FIELDS)
+        doc['query_id'] = oid
+        doc['position'] = position
+        docs.append(doc)
+    return docs
 
 def insert_tweets(query, tweets):
-    """Insert tweets for a query into MongoDB."""
-    doc = {
+    """Insert a new topic for a query and store each of its tweets as its own document."""
+    ensure_indexes()
+    topic = {
         'query': query,
-        'tweets': tweets,
+        'tweet_count': len(tweets),
         'created_at': datetime.utcnow()
     }
-    result = tweets_collection.insert_one(doc)
-    return str(result.inserted_id)
+    oid = topics_collection.insert_one(topic).inserted_id
+    for chunk in _chunks(_tweet_documents(oid, tweets)):
+        try:
+            tweets_collection.insert_many(chunk, ordered=False)
+        except BulkWriteError as e:
+            # Tweets scraped twice in one run collide on the unique key; keep the first copy
+            if any(err.get('code') != DUPLICATE_KEY_ERROR for err in e.details.get('writeErrors', [])):
+                raise
+    refresh_topic_aggregates(oid)
+    index_topic(oid, query, [tweet.get('Content') for tweet in tweets[:TOPIC_INDEX_SAMPLE]])
+    return str(oid)
+
+def compute_topic_aggregates(query_id):
+    """Tweet count and leaning distribution of a topic, computed server-side from its tweet documents."""
+    oid = _to_object_id(query_id)
+    distribution = {leaning: 0 for leaning in LEANINGS}
+    distribution['unassigned'] = 0
+    total = 0
+    for group in tweets_collection.aggregate([
+        {'$match': {'query_id': oid}},
+        {'$group': {'_id': '$leaning', 'count': {'$sum': 1}}}
+    ]):
+        leaning = str(group['_id'] or '').lower()
+        distribution[leaning if leaning in LEANINGS else 'unassigned'] += group['count']
+        total += group['count']
+    return {'tweet_count': total, 'leaning_distribution': distribution}
+
+def refresh_topic_aggregates(query_id, extra_fields=None):
+    """Recompute and store the listing aggregates on the topic document after its tweets changed."""
+    oid = _to_object_id(query_id)
+    update = compute_topic_aggregates(oid)
+    update['updated_at'] = datetime.utcnow()
+    if extra_fields:
+        update.update(extra_fields)
+    # Every write to a topic bumps its version, which keys the cached responses (response_cache.py)
+    topics_collection.update_one({'_id': oid}, {'$set': update, '$inc': {'version': 1}})
+    return update
+
+def tweet_filters(leaning=None, relevant_to=None):
+    """
+    Build a tweet filter for get_topic_tweets/count_topic_tweets.
+
+    Args:
+        leaning: Only tweets with this leaning ('left', 'centre', 'right')
+        relevant_to: Only tweets whose relevance label for this indicator index is 1
+    """
+    filters = {}
+    if leaning:
+        filters['leaning'] = leaning.lower()
+    if relevant_to is not None:
+        filters[f'label_{int(relevant_to)}'] = 1
+    return filters
+
+def topic_tweets_query(query_id, filters=None):
+    """MongoDB filter selecting a topic's tweets, narrowed by tweet_filters()."""
+    query = {'query_id': _to_object_id(query_id)}
+    if filters:
+        query.update(filters)
+    return query
+
+def find_topic_tweets(collection, query_id, projection=None, filters=None, sort=None, skip=0, limit=0, batch_size=500):
+    """
+    Cursor over a topic's tweets in `collection`, either tweets_collection or its Motor counterpart
+    (db_async.py); both cursors take the same projection, sort and paging.
+    """
+    if projection:
+        fields = {field: 1 for field in projection}
+        fields['_id'] = 0
+    else:
+        fields = {'_id': 0, 'query_id': 0, 'position': 0}
+    cursor = collection.find(topic_tweets_query(query_id, filters), fields)
+    cursor = cursor.sort(sort or TWEET_SORTS['position']).batch_size(batch_size)
+    if skip:
+        cursor = cursor.skip(skip)
+    if limit:
+        cursor = cursor.limit(limit)
+    return cursor
+
+def count_topic_tweets(query_id, filters=None):
+    if _to_object_id(query_id) is None:
+        return 0
+    return tweets_collection.count_documents(topic_tweets_query(query_id, filters))
+
+def get_topic_tweets(query_id, skip=0, limit=0, projection=None, filters=None, sort=None):
+    """
+    Read a page of tweets for a topic.
+
+    Args:
+        query_id: MongoDB ObjectId (or its string form) of the topic
+        skip: Number of tweets to skip
+        limit: Maximum number of tweets to return (0 means no limit)
+        projection: Optional list of tweet fields to return
+        filters: Optional extra MongoDB filter on tweet fields
+        sort: Optional list of (field, direction) pairs; defaults to scrape order
+    """
+    oid = _to_object_id(query_id)
+    if oid is None:
+        return []
+    return list(iter_topic_tweets(oid, projection=projection, filters=filters, sort=sort, skip=skip, limit=limit))
+
+def iter_topic_tweets(query_id, projection=None, filters=None, sort=None, skip=0, limit=0, batch_size=500):
+    """Lazily iterate a topic's tweets without materialising them all in memory."""
+    if _to_object_id(query_id) is None:
+        return iter(())
+    return find_topic_tweets(tweets_collection, query_id, projection, filters, sort, skip, limit, batch_size)
+
+def get_topic(query_id):
+    """Get a topic's metadata document (without its tweets)."""
+    oid = _to_object_id(query_id)
+    if oid is None:
+        return None
+    return topics_collection.find_one({'_id': oid})
+
+def get_topic_version(query_id):
+    """A topic's version (bumped by every write to it or its tweets), or None if the topic does not exist."""
+    oid = _to_object_id(query_id)
+    if oid is None:
+        return None
+    return topic_version(topics_collection.find_one({'_id': oid}, {'version': 1}))
+
+def topic_version(topic):
+    """The version of a topic document read with at least {'version': 1}; None for a missing topic."""
+    return None if topic is None else topic.get('version', 0)
+
+def _with_tweets(topic):
+    if topic is not None:
+        topic['tweets'] = get_topic_tweets(topic['_id'])
+    return topic
+
+def get_topic_by_query(query):
+    """Get a topic's metadata document (without its tweets) by query string."""
+    return topics_collection.find_one({'query': query})
+
+def get_high_water_mark(query_id):
+    """
+    What an incremental refresh needs to know about the stored tweets of a topic.
+
+    Returns:
+        dict: tweet_ids (set of stored Tweet IDs), latest_timestamp (newest stored Timestamp or None)
+              and next_position (position to append new tweets at)
+    """
+    oid = _to_object_id(query_id)
+    tweet_ids = set(tweets_collection.distinct('Tweet ID', {'query_id': oid}))
+    latest = tweets_collection.find_one(
+        {'query_id': oid, 'Timestamp': {'$nin': [None, '']}}, {'Timestamp': 1}, sort=[('Timestamp', DESCENDING)]
+    )
+    last = tweets_collection.find_one({'query_id': oid}, {'position': 1}, sort=[('position', DESCENDING)])
+    return {
+        'tweet_ids': tweet_ids,
+        'latest_timestamp': latest['Timestamp'] if latest else None,
+        'next_position': last['position'] + 1 if last else 0
+    }
 
 def get_tweets_by_query(query):
-    """Get tweets by query string."""
-    return tweets_collection.find_one({'query': query})
+    """Get a topic and all of its tweets by query string."""
+    return _with_tweets(topics_collection.find_one({'query': query}))
 
 def get_tweets_by_query_id(query_id):
-    """Get tweets by MongoDB ObjectId."""
-    try:
-        return tweets_collection.find_one({'_id': ObjectId(query_id)})
-    except:
-        return None
+    """Get a topic and all of its tweets by MongoDB ObjectId."""
+    return _with_tweets(get_topic(query_id))
+
+def upsert_tweets(query_id, tweets, start_position=0):
+    """Bulk upsert tweets of a topic, keyed on (query_id, Tweet ID). Returns the number of tweets written."""
+    oid = _to_object_id(query_id)
+    ensure_indexes()
+    for chunk in _chunks(_tweet_documents(oid, tweets, start_position)):
+        tweets_collection.bulk_write([
+            UpdateOne({'query_id': oid, 'Tweet ID': doc['Tweet ID']}, {'$set': doc}, upsert=True)
+            for doc in chunk
+        ], ordered=False)
+    return len(tweets)
 
-def update_tweets_by_query_id(query_id, tweets, summaries=None):
+def update_tweets_by_query_id(query_id, tweets, summaries=None, start_position=0):
     """
-    Update tweets and optionally add ideological summaries for a query.
-    
+    Upsert predicted tweets and optionally add ideological summaries for a query.
+
     Args:
         query_id: MongoDB ObjectId as string
         tweets: List of tweet dictionaries
         summaries: Optional dictionary of ideological summaries
+        start_position: Position of the first tweet; pass next_position to append new tweets
     """
-    update_doc = {'tweets': tweets}
-    if summaries:
-        update_doc['ideological_summaries'] = summaries
-    
+    oid = _to_object_id(query_id)
+    if oid is None:
+        print(f"Error updating tweets: invalid query_id {query_id}")
+        return False
     try:
-        tweets_collection.update_one(
-            {'_id': ObjectId(query_id)},
-            {'$set': update_doc}
-        )
+        upsert_tweets(oid, tweets, start_position)
+        refresh_topic_aggregates(oid, {'ideological_summaries': summaries} if summaries else None)
         return True
     except Exception as e:
         print(f"Error updating tweets: {str(e)}")
         return False
 
+def update_topic_summaries(query_id, summaries):
+    """Store ideological summaries on the topic without touching its tweets."""
+    oid = _to_object_id(query_id)
+    if oid is None:
+        return False
+    topics_collection.update_one({'_id': oid}, {'$set': {'ideological_summaries': summaries}, '$inc': {'version': 1}})
+    return True
+
+def index_topic(query_id, query=None, texts=None):
+    """
+    Add or re-embed a topic in the similar-topic index. query and texts default to the stored
+    topic and a sample of its first tweets. Index failures are logged, never raised.
+    """
+    oid = _to_object_id(query_id)
+    try:
+        if query is None:
+            topic = topics_collection.find_one({'_id': oid}, {'query': 1})
+            if not topic:
+                return
+            query = topic['query']
+        if texts is None:
+            texts = [doc.get('Content') for doc in get_topic_tweets(oid, limit=TOPIC_INDEX_SAMPLE, projection=['Content'])]
+        topic_index.upsert(str(oid), query, texts)
+    except Exception as e:
+        logger.error(f"Failed to index topic {query_id}: {e}", exc_info=True)
+
+def _indexable_topics(topic_ids=None):
+    """(topic_id, query, sample texts) of every stored topic (or only of topic_ids), as embedded by the topic index."""
+    topics = []
+    selector = {} if topic_ids is None else {'_id': {'$in': [_to_object_id(topic_id) for topic_id in topic_ids]}}
+    for topic in topics_collection.find(selector, {'query': 1}):
+        texts = [doc.get('Content') for doc in get_topic_tweets(topic['_id'], limit=TOPIC_INDEX_SAMPLE, projection=['Content'])]
+        topics.append((str(topic['_id']), topic['query'], texts))
+    return topics
+
+def rebuild_topic_index():
+    """Re-embed every stored topic (e.g. after changing TOPIC_EMBEDDING_MODEL)."""
+    topics = _indexable_topics()
+    topic_index.rebuild(topics)
+    return len(topics)
+
+_index_checked = False
+_index_check_lock = threading.Lock()
+
+def _check_topic_index():
+    """
+    Sync the topic index with the stored topics once per process, before its first search (the
+    index reloads itself when another worker changes it, so later searches need no check).
+    """
+    global _index_checked
+    if _index_checked:
+        return
+    with _index_check_lock:
+        if _index_checked:
+            return
+        topic_ids = [str(topic['_id']) for topic in topics_collection.find({}, {'_id': 1})]
+        synced = topic_index.refresh(topic_ids, _indexable_topics)
+        if synced is not None:
+            logger.info(f"Synced topic index: {synced[0]} topics added, {synced[1]} removed")
+        _index_checked = True
+
+def rank_topics(query, max_results=5):
+    """
+    (topic_id, cosine score) pairs of the topics most similar to query, best first. Embeds the
+    query, so async callers run it in an executor.
+    """
+    _check_topic_index()
+    return topic_index.search(query, k=max_results)
+
 def search_similar_topics(query, max_results=5):
     """
-    Search for similar topics using text search.
-    Returns both exact matches and similar topics.
-    """
-    # Create text index if it doesn't exist
-    topics_collection.create_index([("query", "text")])
-    
-    # Search for similar topics
-    similar_topics = list(topics_collection.find(
-        {"$text": {"$search": query}},
-        {"score": {"$meta": "textScore"}}
-    ).sort([("score", {"$meta": "textScore"})]).limit(max_results))
-    
-    # Convert ObjectId to string for JSON serialization
-    for topic in similar_topics:
-        topic['_id'] = str(topic['_id'])
-    print(len(similar_topics))
+    Rank stored topics by embedding similarity to a free-text query.
+
+    Returns:
+        list: topic documents (_id as string, query, score), best match first
+    """
+    ranked = rank_topics(query, max_results)
+    if not ranked:
+        return []
+    similar_topics, deleted = ranked_topics(ranked, find_ranked_topics(topics_collection, ranked))
+    for topic_id in deleted:
+        topic_index.remove(topic_id)
     return similar_topics
 
-def get_all_topics():
-    """Get all topics with their metadata."""
-    topics = list(tweets_collection.find({}, {
-        'query': 1,
-        'tweets': 1,
-        'ideological_summaries': 1,
-        'created_at': 1
-    }))
-    
+def find_ranked_topics(collection, ranked):
+    """Cursor over the queries of the rank_topics() results in `collection` (pymongo or Motor)."""
+    return collection.find({'_id': {'$in': [ObjectId(topic_id) for topic_id, _ in ranked]}}, {'query': 1})
+
+def ranked_topics(ranked, found):
+    """
+    Join rank_topics() results with the topic documents read by find_ranked_topics().
+
+    Returns:
+        Tuple[list, list]: (topics as {_id, query, score}, best first; ids of topics deleted since they were indexed)
+    """
+    found = {str(topic['_id']): topic for topic in found}
+    similar_topics, deleted = [], []
+    for topic_id, score in ranked:
+        topic = found.get(topic_id)
+        if topic is None:
+            deleted.append(topic_id)
+            continue
+        similar_topics.append({'_id': topic_id, 'query': topic['query'], 'score': round(score, 4)})
+    return similar_topics, deleted
+
+def list_topics(limit=20, cursor=None):
+    """
+    List topic metadata, most recent first, with cursor-based pagination.
+
+    Args:
+        limit: Maximum number of topics to return
+        cursor: The `next_cursor` returned by the previous page (a topic _id)
+
+    Returns:
+        Tuple[list, Optional[str]]: (topics, next_cursor); next_cursor is None on the last page
+    """
+    return topic_page(list(find_topic_page(topics_collection, limit, cursor)), limit)
+
+def find_topic_page(collection, limit, cursor=None):
+    """
+    Cursor over the limit + 1 most recent topics after `cursor` in `collection` (pymongo or Motor);
+    topic_page() turns what it reads into the page. Raises ValueError for an invalid cursor.
+    """
+    filters = {}
+    if cursor:
+        cursor_oid = _to_object_id(cursor)
+        if cursor_oid is None:
+            raise ValueError(f"Invalid cursor: {cursor}")
+        filters['_id'] = {'$lt': cursor_oid}
+    # ObjectIds grow with creation time, so sorting on _id orders topics by recency
+    return collection.find(filters, TOPIC_LIST_FIELDS).sort('_id', DESCENDING).limit(limit + 1)
+
+def topic_page(topics, limit):
+    """(topics, next_cursor) from the limit + 1 topics read by find_topic_page()."""
+    next_cursor = None
+    if len(topics) > limit:
+        topics = topics[:limit]
+        next_cursor = str(topics[-1]['_id'])
+
     # Convert ObjectId to string for JSON serialization
     for topic in topics:
         topic['_id'] = str(topic['_id'])
-    
-    return topics
+
+    return topics, next_cursor
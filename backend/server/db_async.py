@@ -0,0 +1,91 @@
+"""
+Async read access to the topic and tweet collections through a pooled Motor client, for the
+ASGI read endpoints in async_api.py. Writes stay on the synchronous client in db.py, which also
+builds the queries, projections and pages used here.
+"""
+import asyncio
+import logging
+from db import (
+    MONGO_URI, MONGO_DB, MONGO_CLIENT_OPTIONS, _to_object_id, find_topic_page, topic_page, find_topic_tweets,
+    topic_tweets_query, topic_version, rank_topics, find_ranked_topics, ranked_topics, topic_index,
+    topics_collection, tweets_collection
+)
+
+logger = logging.getLogger(__name__)
+
+TOPICS = topics_collection.name
+TWEETS = tweets_collection.name
+
+_client = None
+
+
+def get_async_db():
+    """The Motor database, with its client created on first use inside the serving event loop."""
+    global _client
+    if _client is None:
+        from motor.motor_asyncio import AsyncIOMotorClient
+        _client = AsyncIOMotorClient(MONGO_URI, **MONGO_CLIENT_OPTIONS)
+    return _client[MONGO_DB]
+
+
+def close_async_client():
+    global _client
+    if _client is not None:
+        _client.close()
+        _client = None
+
+
+async def list_topics(limit=20, cursor=None):
+    """Async db.list_topics: (topics, next_cursor), most recent first."""
+    return topic_page(await find_topic_page(get_async_db()[TOPICS], limit, cursor).to_list(None), limit)
+
+
+async def get_topic(query_id):
+    oid = _to_object_id(query_id)
+    if oid is None:
+        return None
+    return await get_async_db()[TOPICS].find_one({'_id': oid})
+
+
+async def get_topic_version(query_id):
+    oid = _to_object_id(query_id)
+    if oid is None:
+        return None
+    return topic_version(await get_async_db()[TOPICS].find_one({'_id': oid}, {'version': 1}))
+
+
+async def get_topic_by_query(query):
+    return await get_async_db()[TOPICS].find_one({'query': query})
+
+
+async def count_topic_tweets(query_id, filters=None):
+    if _to_object_id(query_id) is None:
+        return 0
+    return await get_async_db()[TWEETS].count_documents(topic_tweets_query(query_id, filters))
+
+
+def iter_topic_tweets(query_id, filters=None, sort=None, skip=0, limit=0, batch_size=500):
+    """Async cursor over a topic's tweets (same fields and order as db.iter_topic_tweets)."""
+    return find_topic_tweets(get_async_db()[TWEETS], query_id, filters=filters, sort=sort, skip=skip, limit=limit, batch_size=batch_size)
+
+
+async def get_topic_tweets(query_id, skip=0, limit=0, filters=None, sort=None):
+    if _to_object_id(query_id) is None:
+        return []
+    return await iter_topic_tweets(query_id, filters=filters, sort=sort, skip=skip, limit=limit).to_list(None)
+
+
+async def search_similar_topics(query, max_results=5, executor=None):
+    """
+    Async db.search_similar_topics. The query is embedded and ranked on `executor` (a thread
+    pool) so inference never blocks the event loop; the topics are then read through Motor.
+    """
+    loop = asyncio.get_running_loop()
+    ranked = await loop.run_in_executor(executor, rank_topics, query, max_results)
+    if not ranked:
+        return []
+    found = await find_ranked_topics(get_async_db()[TOPICS], ranked).to_list(None)
+    similar_topics, deleted = ranked_topics(ranked, found)
+    for topic_id in deleted:
+        await loop.run_in_executor(executor, topic_index.remove, topic_id)
+    return similar_topics
@@ -0,0 +1,122 @@
+import hashlib
+import os
+import re
+import numpy as np
+from preprocess import normalize_contents
+
+# Tweets whose 64-bit SimHashes differ in at most this many bits are treated as copies
+DEDUP_MAX_DISTANCE = int(os.environ.get('DEDUP_MAX_DISTANCE', 3))
+SIMHASH_BITS = 64
+SHINGLE_SIZE = 3
+
+# Retweet prefix and the placeholders normalizeTweet substitutes for mentions and links
+_RETWEET_PREFIX = re.compile(r'^\s*rt\s+@\w+\s*:?\s*', re.IGNORECASE)
+_NOISE = re.compile(r'https?://\S+|httpurl|@\w+|[^\w\s]', re.IGNORECASE)
+
+
+def dedupe_key(text):
+    """Canonical form of a tweet for duplicate detection: no retweet prefix, mentions, links, punctuation or case."""
+    text = _RETWEET_PREFIX.sub('', str(text))
+    return ' '.join(_NOISE.sub(' ', text.lower()).split())
+
+
+def _shingles(words):
+    if len(words) < SHINGLE_SIZE:
+        return words
+    return [' '.join(words[i:i + SHINGLE_SIZE]) for i in range(len(words) - SHINGLE_SIZE + 1)]
+
+
+def simhash(key):
+    """64-bit SimHash of a dedupe_key() string over word shingles."""
+    shingles = _shingles(key.split())
+    if not shingles:
+        return 0
+    hashes = np.array(
+        [int.from_bytes(hashlib.blake2b(s.encode('utf-8'), digest_size=8).digest(), 'big') for s in shingles],
+        dtype='>u8'
+    )
+    bits = np.unpackbits(hashes.view(np.uint8).reshape(-1, 8), axis=1)
+    votes = (2 * bits.astype(np.int32) - 1).sum(axis=0)
+    return int(''.join('1' if vote > 0 else '0' for vote in votes), 2)
+
+
+def near_duplicate_groups(texts, max_distance=None):
+    """
+    Group near-identical texts.
+
+    Each text is compared against the representatives (first members) of the groups found so far.
+    Exact copies of a canonical key match directly; otherwise candidates come from an LSH table
+    over max_distance + 1 bands of the SimHash, which by the pigeonhole principle contains every
+    representative within max_distance bits.
+
+    Returns:
+        List[int]: for each text, the index of its group's representative
+    """
+    max_distance = DEDUP_MAX_DISTANCE if max_distance is None else max_distance
+    bands = max_distance + 1
+    band_bits = SIMHASH_BITS // bands
+    band_mask = (1 << band_bits) - 1
+    by_key = {}
+    tables = [{} for _ in range(bands)]
+    fingerprints = {}
+    groups = []
+    for i, text in enumerate(texts):
+        key = dedupe_key(text)
+        if key in by_key:
+            groups.append(by_key[key])
+            continue
+        fingerprint = simhash(key)
+        parts = [(fingerprint >> (band * band_bits)) & band_mask for band in range(bands)]
+        match = None
+        if key:
+            for band, part in enumerate(parts):
+                for candidate in tables[band].get(part, ()):
+                    if bin(fingerprint ^ fingerprints[candidate]).count('1') <= max_distance:
+                        match = candidate
+                        break
+                if match is not None:
+                    break
+        if match is None:
+            match = i
+            fingerprints[i] = fingerprint
+            if key:
+                for band, part in enumerate(parts):
+                    tables[band].setdefault(part, []).append(i)
+        by_key[key] = match
+        groups.append(match)
+    return groups
+
+
+def collapse_near_duplicates(df, max_distance=None):
+    """
+    Normalize df['Content'] and tag every tweet with its near-duplicate group.
+
+    Adds `dup_group_size` (number of tweets sharing the content, i.e. the weight of the group) and
+    `dup_of` (Tweet ID of the group's representative) to df in place.
+
+    Returns:
+        Tuple[pd.DataFrame, pd.DataFrame]: (df, one representative row per group, keeping df's index)
+    """
+    normalize_contents(df)
+    positions = near_duplicate_groups(df['Content'].tolist(), max_distance)
+    representative = df.index[positions]
+    df['_dup_group'] = representative
+    df['dup_group_size'] = df.groupby('_dup_group')['_dup_group'].transform('size').astype(int)
+    if 'Tweet ID' in df:
+        df['dup_of'] = df.loc[representative, 'Tweet ID'].astype(str).values
+    representatives = df[df.index == df['_dup_group'].values].copy()
+    representatives.attrs['normalized'] = True
+    return df, representatives
+
+
+def expand_duplicates(df, predicted):
+    """
+    Copy the predicted columns of each group's representative (rows of `predicted`, indexed like df)
+    to every member of the group in df.
+    """
+    columns = [column for column in predicted.columns if column not in df.columns]
+    copied = predicted.loc[df['_dup_group'], columns]
+    copied.index = df.index
+    result = df.join(copied).drop(columns=['_dup_group'])
+    result.attrs['normalized'] = True
+    return result
@@ -0,0 +1,53 @@
+"""
+gunicorn settings for the production server (from backend/server):
+
+    gunicorn -c gunicorn.conf.py wsgi:app
+    WEB_WORKER_CLASS=uvicorn_worker.UvicornWorker gunicorn -c gunicorn.conf.py asgi:app
+
+The app and its models are loaded once in the master (preload_app) and shared copy-on-write by
+the forked workers; see wsgi.py. Analysis jobs run in the worker that accepted them and publish
+their status to MongoDB, so any worker can answer polls and cancellations.
+
+Reloads:
+    kill -HUP <master>   re-forks the workers gracefully (in-flight requests and jobs finish first);
+                         with preload_app they reuse the master's code and loaded models
+    kill -USR2 <master>  starts a new master with the new code and models next to the old one;
+                         then `kill -TERM <old master>` once the new workers report ready on /readyz
+"""
+import os
+import sys
+
+bind = os.environ.get('BIND', '0.0.0.0:5500')
+workers = int(os.environ.get('WEB_CONCURRENCY', 2))
+# gthread for wsgi:app; uvicorn_worker.UvicornWorker for asgi:app (async read endpoints)
+worker_class = os.environ.get('WEB_WORKER_CLASS', 'gthread')
+# Threads per gthread worker; the jobs' own pool (JOB_WORKERS) is separate
+threads = int(os.environ.get('WEB_THREADS', 8))
+preload_app = True
+timeout = int(os.environ.get('WEB_TIMEOUT', 120))
+# How long a stopping worker may finish running analysis jobs before it is killed
+graceful_timeout = int(os.environ.get('WEB_GRACEFUL_TIMEOUT', 300))
+keepalive = 5
+# Recycling workers is off by default; a recycled worker first finishes its jobs (graceful_timeout)
+max_requests = int(os.environ.get('WEB_MAX_REQUESTS', 0))
+max_requests_jitter = max_requests // 10
+accesslog = '-'
+errorlog = '-'
+loglevel = os.environ.get('LOG_LEVEL', 'info')
+
+
+def post_fork(server, worker):
+    torch = sys.modules.get('torch')
+    if torch is not None:
+        # The intra-op thread pool does not survive fork; size a fresh one per worker
+        torch.set_num_threads(int(os.environ.get('TORCH_THREADS', max(1, (os.cpu_count() or 1) // workers))))
+    if os.environ.get('PRELOAD_BROWSERS') == '1':
+        # Browsers are per process and cannot be shared through fork
+        from server import get_browser_pool, SCRAPER_USERNAME, SCRAPER_PASSWORD
+        get_browser_pool(SCRAPER_USERNAME, SCRAPER_PASSWORD).warm_up()
+
+
+def worker_exit(server, worker):
+    from server import job_queue, close_browser_pools
+    job_queue.shutdown(wait=True)
+    close_browser_pools()
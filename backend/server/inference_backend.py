@@ -0,0 +1,164 @@
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+TORCH = 'torch'
+TORCH_INT8 = 'torch-int8'
+ONNX = 'onnx'
+BACKENDS = (TORCH, TORCH_INT8, ONNX)
+
+# Selected with INFERENCE_BACKEND; ONNX_CACHE_DIR holds exported/quantized graphs between restarts
+INFERENCE_BACKEND = os.environ.get('INFERENCE_BACKEND', TORCH)
+INTRA_OP_THREADS = int(os.environ.get('INFERENCE_THREADS', 0)) or None
+ONNX_CACHE_DIR = os.environ.get('ONNX_CACHE_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'cache', 'onnx'))
+ONNX_INPUT_NAMES = ('input_ids', 'attention_mask')
+ONNX_OPSET = 14
+
+
+class _OnnxOutput(tuple):
+    """Tuple of output tensors that also exposes `.logits`, like a transformers ModelOutput."""
+
+    @property
+    def logits(self):
+        return self[0]
+
+
+class OnnxModule:
+    """
+    Stand-in for a predictor's torch module backed by an ONNX Runtime session.
+
+    Called like the original module (positional or keyword input_ids / attention_mask) and returns
+    the same kind of object: a tensor, or a tuple/ModelOutput-like value with `.logits`.
+    """
+
+    def __init__(self, session, output_kind):
+        self.session = session
+        self.output_kind = output_kind
+        self.input_names = [i.name for i in session.get_inputs()]
+
+    def __call__(self, *args, **kwargs):
+        import torch
+        feeds = dict(zip(self.input_names, args))
+        feeds.update({name: value for name, value in kwargs.items() if name in self.input_names})
+        feeds = {name: value.cpu().numpy() if hasattr(value, 'cpu') else value for name, value in feeds.items()}
+        outputs = [torch.from_numpy(output) for output in self.session.run(None, feeds)]
+        if self.output_kind == 'tensor':
+            return outputs[0]
+        return _OnnxOutput(outputs)
+
+    # Predictors call these on their module; they have no meaning for an ONNX session
+    def eval(self):
+        return self
+
+    def train(self, mode=True):
+        return self
+
+    def to(self, *args, **kwargs):
+        return self
+
+    def parameters(self):
+        return iter(())
+
+    def buffers(self):
+        return iter(())
+
+
+def _set_torch_threads():
+    if INTRA_OP_THREADS:
+        import torch
+        torch.set_num_threads(INTRA_OP_THREADS)
+
+
+def _quantize_torch(predictor):
+    import torch
+    predictor.model = torch.quantization.quantize_dynamic(predictor.model, {torch.nn.Linear}, dtype=torch.qint8)
+    return predictor
+
+
+def _dummy_inputs(predictor, max_length=16):
+    import torch
+    tokenizer = getattr(predictor, 'tokenizer', None)
+    if tokenizer is not None:
+        encoded = tokenizer(['hello world'], padding='max_length', truncation=True, max_length=max_length, return_tensors='pt')
+        return encoded['input_ids'], encoded['attention_mask']
+    return torch.ones((1, max_length), dtype=torch.long), torch.ones((1, max_length), dtype=torch.long)
+
+
+def _output_kind(outputs):
+    if hasattr(outputs, 'dim'):
+        return 'tensor'
+    return 'tuple'
+
+
+def export_onnx(predictor, name, version):
+    """
+    Export a predictor's torch module to ONNX and dynamically quantize it to INT8.
+    Both graphs are cached under ONNX_CACHE_DIR keyed by model name and checkpoint version.
+
+    Returns:
+        Tuple[str, str]: (path of the INT8 graph, output kind of the original module)
+    """
+    import torch
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+
+    os.makedirs(ONNX_CACHE_DIR, exist_ok=True)
+    safe_version = ''.join(c if c.isalnum() else '_' for c in version)
+    fp32_path = os.path.join(ONNX_CACHE_DIR, f'{name}-{safe_version}.onnx')
+    int8_path = os.path.join(ONNX_CACHE_DIR, f'{name}-{safe_version}.int8.onnx')
+
+    model = predictor.model
+    model.eval()
+    inputs = _dummy_inputs(predictor)
+    with torch.no_grad():
+        outputs = model(*inputs)
+    kind = _output_kind(outputs)
+    if not os.path.exists(int8_path):
+        logger.info(f"Exporting '{name}' to ONNX at {fp32_path}")
+        output_count = 1 if kind == 'tensor' else len(outputs)
+        output_names = [f'output_{i}' for i in range(output_count)]
+        dynamic_axes = {input_name: {0: 'batch', 1: 'sequence'} for input_name in ONNX_INPUT_NAMES}
+        dynamic_axes.update({output_name: {0: 'batch'} for output_name in output_names})
+        torch.onnx.export(
+            model, inputs, fp32_path,
+            input_names=list(ONNX_INPUT_NAMES),
+            output_names=output_names,
+            dynamic_axes=dynamic_axes,
+            opset_version=ONNX_OPSET
+        )
+        quantize_dynamic(fp32_path, int8_path, weight_type=QuantType.QInt8)
+    return int8_path, kind
+
+
+def _use_onnx(predictor, name, version):
+    import onnxruntime as ort
+    path, kind = export_onnx(predictor, name, version)
+    options = ort.SessionOptions()
+    if INTRA_OP_THREADS:
+        options.intra_op_num_threads = INTRA_OP_THREADS
+    options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+    session = ort.InferenceSession(path, sess_options=options, providers=['CPUExecutionProvider'])
+    predictor.model = OnnxModule(session, kind)
+    return predictor
+
+
+def apply_backend(predictor, name, version, backend=None):
+    """
+    Switch a freshly loaded predictor to the configured inference backend.
+
+    Args:
+        predictor: Predictor exposing its torch module as `.model`
+        name: Registry name of the model (used for cache file names)
+        version: Checkpoint version (see prediction_cache.checkpoint_version)
+        backend: One of BACKENDS; defaults to INFERENCE_BACKEND
+    """
+    backend = backend or INFERENCE_BACKEND
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown inference backend '{backend}', expected one of {', '.join(BACKENDS)}")
+    _set_torch_threads()
+    if backend == TORCH or getattr(predictor, 'model', None) is None:
+        return predictor
+    logger.info(f"Using {backend} inference backend for '{name}'")
+    if backend == TORCH_INT8:
+        return _quantize_torch(predictor)
+    return _use_onnx(predictor, name, version)
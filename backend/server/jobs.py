@@ -0,0 +1,418 @@
+import logging
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from pymongo.errors import DuplicateKeyError
+from metrics import trace, new_trace_id, Cancelled
+
+logger = logging.getLogger(__name__)
+
+QUEUED = 'queued'
+RUNNING = 'running'
+SUCCEEDED = 'succeeded'
+FAILED = 'failed'
+CANCELLED = 'cancelled'
+ACTIVE_STATES = (QUEUED, RUNNING)
+
+
+class JobCancelled(Cancelled):
+    """Raised inside a job when cancellation was requested; unwinds the pipeline at the next stage boundary."""
+
+
+class QueueFull(Exception):
+    """Raised when the number of pending jobs exceeds the configured bound."""
+
+
+class JobStore:
+    """
+    Job status snapshots in a MongoDB collection, shared by every server worker process.
+
+    Each job runs in the worker that accepted it; other workers answer polls from its latest
+    snapshot and forward cancellations through the `cancel_requested` flag, which the owning
+    worker checks at stage boundaries. Snapshots expire retention_seconds after their last update.
+
+    The store also deduplicates jobs across workers: a queued or running job is `active` for its
+    key, and a unique index on the key of active snapshots lets only one job per key be active.
+    A claim not updated for lease_seconds (its worker died) is taken over by the next submission;
+    the owning worker renews the claims of its running jobs (see renew) well within the lease.
+    """
+
+    def __init__(self, collection, retention_seconds=3600, lease_seconds=1800):
+        self.collection = collection
+        self.retention_seconds = retention_seconds
+        self.lease_seconds = lease_seconds
+        self._indexed = False
+
+    def _ensure_indexes(self):
+        if not self._indexed:
+            self.collection.create_index('updated_at', expireAfterSeconds=self.retention_seconds)
+            self.collection.create_index('key', unique=True, partialFilterExpression={'active': True}, name='active_key')
+            self._indexed = True
+
+    def save(self, status):
+        self._ensure_indexes()
+        doc = {key: value for key, value in status.items() if key != 'cancel_requested'}
+        doc['updated_at'] = datetime.utcnow()
+        if status['status'] not in ACTIVE_STATES:
+            doc['active'] = False
+        self.collection.update_one({'_id': status['job_id']}, {'$set': doc}, upsert=True)
+
+    def claim(self, status):
+        """
+        Atomically record a new job as the active one for its key.
+
+        Returns:
+            Optional[dict]: None if the job was claimed, else the snapshot of the job already
+            active for the key (in this or another worker)
+        """
+        self._ensure_indexes()
+        doc = {key: value for key, value in status.items() if key not in ('cancel_requested', 'key')}
+        doc.update({'_id': status['job_id'], 'updated_at': datetime.utcnow()})
+        while True:
+            try:
+                existing = self.collection.find_one_and_update(
+                    {'key': status['key'], 'active': True}, {'$setOnInsert': doc}, upsert=True
+                )
+            except DuplicateKeyError:
+                # Another worker claimed the key between our lookup and insert; read its claim
+                continue
+            if existing is None:
+                return None
+            stale = existing['updated_at'] < datetime.utcnow() - timedelta(seconds=self.lease_seconds)
+            if not stale and not existing.get('cancel_requested'):
+                for field in ('_id', 'updated_at', 'active'):
+                    existing.pop(field, None)
+                return existing
+            logger.warning(f"Taking over key {status['key']} from {'stale' if stale else 'cancelled'} job {existing['_id']}")
+            self.release(existing['_id'])
+
+    def release(self, job_id):
+        """Stop counting a job as the active one for its key."""
+        self.collection.update_one({'_id': job_id, 'active': True}, {'$set': {'active': False}})
+
+    def renew(self, job_ids):
+        """Refresh the lease of the given jobs' active claims without touching their status."""
+        if job_ids:
+            self.collection.update_many({'_id': {'$in': list(job_ids)}, 'active': True},
+                                        {'$set': {'updated_at': datetime.utcnow()}})
+
+    def active(self, key):
+        """Snapshot of the job active for key in any worker, None if there is none."""
+        return self.collection.find_one({'key': key, 'active': True}, {'_id': 0, 'updated_at': 0, 'active': 0})
+
+    def load(self, job_id):
+        return self.collection.find_one({'_id': job_id}, {'_id': 0, 'updated_at': 0, 'active': 0})
+
+    def request_cancel(self, job_id):
+        """Flag another worker's job for cancellation and free its key; returns its snapshot, None if unknown."""
+        self.collection.update_one({'_id': job_id}, {'$set': {'cancel_requested': True, 'active': False}})
+        return self.load(job_id)
+
+    def cancel_requested(self, job_id):
+        return self.collection.count_documents({'_id': job_id, 'cancel_requested': True}, limit=1) > 0
+
+
+class Job:
+    # Minimum seconds between progress snapshots written to the job store
+    PUBLISH_INTERVAL = 1.0
+    # Seconds a cancellation flag read from the job store is trusted before it is read again
+    CANCEL_CHECK_INTERVAL = 5.0
+
+    def __init__(self, key, query, params=None, trace_id=None, store=None):
+        self.id = uuid.uuid4().hex
+        # Tags this job's spans and log lines; taken from the submitting request when it sent one
+        self.trace_id = trace_id or new_trace_id()
+        self.trace = None
+        self.key = key
+        self.query = query
+        self.params = params or {}
+        self.status = QUEUED
+        self.stage = None
+        self.stages = []
+        self.progress = {}
+        self.result = None
+        self.error = None
+        self.created_at = datetime.utcnow()
+        self.started_at = None
+        self.finished_at = None
+        self._cancel_event = threading.Event()
+        self._lock = threading.Lock()
+        self.future = None
+        self.store = store
+        self._published = 0.0
+        self._cancel_checked = 0.0
+
+    @property
+    def cancel_requested(self):
+        return self._cancel_event.is_set()
+
+    def check_cancelled(self):
+        """
+        Raise JobCancelled if cancellation was requested. Requests made in this process are seen
+        at once; the job store (requests forwarded by other workers) is read at most every
+        CANCEL_CHECK_INTERVAL seconds, since the stream checks this every second and per batch.
+        """
+        if not self._cancel_event.is_set() and self.store is not None:
+            now = time.time()
+            if now - self._cancel_checked >= self.CANCEL_CHECK_INTERVAL:
+                self._cancel_checked = now
+                if self.store.cancel_requested(self.id):
+                    self._cancel_event.set()
+        if self._cancel_event.is_set():
+            raise JobCancelled(f"Job {self.id} was cancelled")
+
+    def set_stage(self, stage, total=None):
+        """Enter a new pipeline stage. Also the cancellation point between stages."""
+        self.check_cancelled()
+        with self._lock:
+            now = time.time()
+            if self.stages and self.stages[-1]['finished'] is None:
+                self.stages[-1]['finished'] = now
+            self.stage = stage
+            self.stages.append({'name': stage, 'started': now, 'finished': None})
+            self.progress = {'done': 0, 'total': total}
+        logger.info(f"Job {self.id} [{self.key}] -> {stage}")
+        self.publish()
+
+    def update_progress(self, done, total=None, **details):
+        """Update the current stage's progress; details (e.g. scraped=...) are reported alongside done/total."""
+        with self._lock:
+            self.progress['done'] = done
+            if total is not None:
+                self.progress['total'] = total
+            self.progress.update(details)
+        self.publish(force=False)
+
+    def complete_stage(self, done=None):
+        """
+        Report the current stage as finished: done items out of done (the stage's total when
+        omitted, or 1 for stages without a countable total).
+        """
+        with self._lock:
+            if done is None:
+                done = self.progress.get('total')
+            if done is None:
+                done = 1
+            self.progress['done'] = done
+            self.progress['total'] = done
+        self.publish(force=False)
+
+    def publish(self, force=True):
+        """Write the job's status to the shared store (progress updates are throttled)."""
+        if self.store is None:
+            return
+        now = time.time()
+        if not force and now - self._published < self.PUBLISH_INTERVAL:
+            return
+        self._published = now
+        try:
+            self.store.save(self.to_dict())
+        except Exception as e:
+            logger.warning(f"Could not publish status of job {self.id}: {e}")
+
+    def to_dict(self):
+        with self._lock:
+            return {
+                'job_id': self.id,
+                'query': self.query,
+                'key': self.key,
+                'status': self.status,
+                'stage': self.stage,
+                'progress': dict(self.progress),
+                'stages': [
+                    {
+                        'name': s['name'],
+                        'seconds': round((s['finished'] or time.time()) - s['started'], 3),
+                        'done': s['finished'] is not None,
+                    }
+                    for s in self.stages
+                ],
+                'trace_id': self.trace_id,
+                'spans': self.trace.to_list() if self.trace is not None else [],
+                'query_id': self.result,
+                'error': self.error,
+                'cancel_requested': self.cancel_requested,
+                'created_at': self.created_at.isoformat(),
+                'started_at': self.started_at.isoformat() if self.started_at else None,
+                'finished_at': self.finished_at.isoformat() if self.finished_at else None,
+            }
+
+
+class JobQueue:
+    """
+    Bounded background executor for long-running query jobs.
+
+    Jobs are deduplicated on their key while queued or running, so concurrent
+    submissions of the same normalized query share one job; with a JobStore this
+    holds across worker processes. Finished jobs are kept for `retention_seconds`
+    so clients can poll their final status.
+    """
+    # Seconds between lease renewals of running jobs in the store; well below JobStore.lease_seconds,
+    # so long stages that report no progress (model inference, summarization) keep their claim
+    HEARTBEAT_INTERVAL = 60.0
+
+    def __init__(self, runner, max_workers=2, max_pending=20, retention_seconds=3600, store=None):
+        self.runner = runner
+        self.store = store
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self.retention_seconds = retention_seconds
+        self._jobs = {}
+        self._active_by_key = {}
+        self._lock = threading.Lock()
+        self._executor = None
+        self._heartbeat = None
+        self._stopped = threading.Event()
+
+    def _get_executor(self):
+        # Created lazily so the worker threads are started in the serving process, not before a fork
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='job')
+            if self.store is not None:
+                self._heartbeat = threading.Thread(target=self._renew_leases, name='job-heartbeat', daemon=True)
+                self._heartbeat.start()
+        return self._executor
+
+    def _renew_leases(self):
+        while not self._stopped.wait(self.HEARTBEAT_INTERVAL):
+            with self._lock:
+                running = [job.id for job in self._active_by_key.values() if job.status in ACTIVE_STATES]
+            try:
+                self.store.renew(running)
+            except Exception as e:
+                logger.warning(f"Could not renew job leases: {e}")
+
+    def submit(self, key, query, trace_id=None, **params):
+        """
+        Enqueue a job for key, or return the active job already running for it (in any worker
+        process when the queue has a store). trace_id tags the new job's spans and logs (a fresh
+        id is generated when omitted).
+
+        Returns:
+            Tuple[dict, bool]: (job status, created) where created is False for a deduplicated submission
+        """
+        with self._lock:
+            self._prune()
+            active = self._active_by_key.get(key)
+            if active is not None and active.status in ACTIVE_STATES and not active.cancel_requested:
+                return active.to_dict(), False
+            pending = sum(1 for job in self._jobs.values() if job.status == QUEUED)
+            if pending >= self.max_pending:
+                raise QueueFull(f"Too many pending jobs ({pending})")
+            job = Job(key, query, params, trace_id=trace_id, store=self.store)
+            if self.store is not None:
+                existing = self.store.claim(job.to_dict())
+                if existing is not None:
+                    return existing, False
+            self._jobs[job.id] = job
+            self._active_by_key[key] = job
+            job.future = self._get_executor().submit(self._run, job)
+        logger.info(f"Queued job {job.id} for {key}")
+        return job.to_dict(), True
+
+    def active(self, key):
+        """Status of the job queued or running for key in any worker, None if there is none."""
+        with self._lock:
+            job = self._active_by_key.get(key)
+            if job is not None and job.status in ACTIVE_STATES and not job.cancel_requested:
+                return job.to_dict()
+        return self.store.active(key) if self.store is not None else None
+
+    def _run(self, job):
+        if job.cancel_requested:
+            self._finish(job, CANCELLED)
+            return
+        job.status = RUNNING
+        job.started_at = datetime.utcnow()
+        with trace(job.trace_id) as job.trace:
+            self._execute(job)
+
+    def _execute(self, job):
+        try:
+            job.result = self.runner(job)
+            if job.result is None:
+                job.error = job.error or 'Pipeline did not produce a result'
+                self._finish(job, FAILED)
+            else:
+                self._finish(job, SUCCEEDED)
+        except JobCancelled:
+            logger.info(f"Job {job.id} cancelled during stage {job.stage}")
+            self._finish(job, CANCELLED)
+        except Exception as e:
+            logger.error(f"Job {job.id} failed: {e}", exc_info=True)
+            job.error = str(e)
+            self._finish(job, FAILED)
+
+    def _finish(self, job, status):
+        with job._lock:
+            if job.stages and job.stages[-1]['finished'] is None:
+                job.stages[-1]['finished'] = time.time()
+        job.status = status
+        job.finished_at = datetime.utcnow()
+        job.publish()
+        with self._lock:
+            if self._active_by_key.get(job.key) is job:
+                del self._active_by_key[job.key]
+
+    def _prune(self):
+        cutoff = datetime.utcnow().timestamp() - self.retention_seconds
+        expired = [
+            job_id for job_id, job in self._jobs.items()
+            if job.finished_at is not None and job.finished_at.timestamp() < cutoff
+        ]
+        for job_id in expired:
+            del self._jobs[job_id]
+
+    def counts(self):
+        """Number of retained jobs per status."""
+        with self._lock:
+            counts = {status: 0 for status in (QUEUED, RUNNING, SUCCEEDED, FAILED, CANCELLED)}
+            for job in self._jobs.values():
+                counts[job.status] += 1
+            return counts
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def status(self, job_id):
+        """Status dict of a job of this process, else its snapshot from the shared store (None if unknown)."""
+        job = self.get(job_id)
+        if job is not None:
+            return job.to_dict()
+        return self.store.load(job_id) if self.store is not None else None
+
+    def cancel_anywhere(self, job_id):
+        """Cancel a job of this process, or flag one running in another worker; returns its status dict."""
+        job = self.cancel(job_id)
+        if job is not None:
+            return job.to_dict()
+        return self.store.request_cancel(job_id) if self.store is not None else None
+
+    def shutdown(self, wait=True):
+        """Stop accepting work: queued jobs are cancelled, running ones finish when wait is True."""
+        with self._lock:
+            queued = [job for job in self._jobs.values() if job.status == QUEUED]
+        for job in queued:
+            self.cancel(job.id)
+        self._stopped.set()
+        if self._executor is not None:
+            self._executor.shutdown(wait=wait, cancel_futures=True)
+
+    def cancel(self, job_id):
+        """Request cancellation. Queued jobs never start; running jobs stop at the next stage boundary."""
+        job = self.get(job_id)
+        if job is None:
+            return None
+        if job.status in ACTIVE_STATES:
+            job._cancel_event.set()
+            if job.future is not None and job.future.cancel():
+                self._finish(job, CANCELLED)
+            with self._lock:
+                if self._active_by_key.get(job.key) is job:
+                    del self._active_by_key[job.key]
+            if self.store is not None:
+                self.store.release(job.id)
+        return job
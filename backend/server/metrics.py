@@ -0,0 +1,233 @@
+import contextvars
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from model_registry import current_rss_bytes
+
+logger = logging.getLogger(__name__)
+
+METRICS_PREFIX = 'biasbreaker'
+# Upper bounds (seconds) of the stage duration histogram buckets
+DURATION_BUCKETS = (0.01, 0.05, 0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1800)
+# How often RSS is sampled while spans are open, for their peak_rss
+RSS_SAMPLE_INTERVAL = float(os.environ.get('METRICS_RSS_SAMPLE_INTERVAL', 0.25))
+
+_current_trace = contextvars.ContextVar('trace', default=None)
+
+
+def new_trace_id():
+    return uuid.uuid4().hex[:16]
+
+
+class Trace:
+    """The spans recorded under one trace id (one analysis job or request)."""
+
+    def __init__(self, trace_id=None):
+        self.id = trace_id or new_trace_id()
+        self.spans = []
+        self._lock = threading.Lock()
+
+    def add(self, record):
+        with self._lock:
+            self.spans.append(record)
+
+    def to_list(self):
+        with self._lock:
+            return list(self.spans)
+
+
+@contextmanager
+def trace(trace_id=None):
+    """Run the block under a trace: spans and log lines inside it carry its id."""
+    current = Trace(trace_id)
+    token = _current_trace.set(current)
+    try:
+        yield current
+    finally:
+        _current_trace.reset(token)
+
+
+def current_trace_id():
+    current = _current_trace.get()
+    return current.id if current is not None else None
+
+
+class TraceIdFilter(logging.Filter):
+    """Adds the current trace id as %(trace_id)s to log records ('-' outside a trace)."""
+
+    def filter(self, record):
+        record.trace_id = current_trace_id() or '-'
+        return True
+
+
+class _RssSampler:
+    """Background thread sampling RSS while any span is open and raising each open span's peak."""
+
+    def __init__(self, interval):
+        self.interval = interval
+        self._open = set()
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+
+    def add(self, span):
+        with self._lock:
+            self._open.add(span)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='rss-sampler', daemon=True)
+                self._thread.start()
+        self._wake.set()
+
+    def remove(self, span):
+        with self._lock:
+            self._open.discard(span)
+
+    def _run(self):
+        while True:
+            self._wake.wait()
+            rss = current_rss_bytes()
+            with self._lock:
+                spans = list(self._open)
+                if not spans:
+                    self._wake.clear()
+            for span in spans:
+                span.observe_rss(rss)
+            time.sleep(self.interval)
+
+
+class Span:
+    def __init__(self, name, items=None):
+        self.name = name
+        self.items = items
+        self.status = 'ok'
+        self.peak_rss = current_rss_bytes()
+        self.started = time.perf_counter()
+        self.duration = None
+
+    def observe_rss(self, rss):
+        if rss > self.peak_rss:
+            self.peak_rss = rss
+
+    def to_dict(self):
+        rate = self.items / self.duration if self.items and self.duration else None
+        return {
+            'stage': self.name,
+            'seconds': round(self.duration, 4),
+            'items': self.items,
+            'items_per_second': round(rate, 2) if rate is not None else None,
+            'peak_rss_bytes': self.peak_rss,
+            'status': self.status,
+        }
+
+
+class MetricsRegistry:
+    """Per-stage span aggregates and gauges, rendered in the Prometheus text exposition format."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stages = {}
+        self._gauges = []
+
+    def record(self, span):
+        with self._lock:
+            stage = self._stages.setdefault(span.name, {
+                'buckets': [0] * len(DURATION_BUCKETS), 'count': 0, 'sum': 0.0, 'items': 0,
+                'status': {}, 'items_per_second': 0.0, 'peak_rss': 0
+            })
+            for i, bound in enumerate(DURATION_BUCKETS):
+                if span.duration <= bound:
+                    stage['buckets'][i] += 1
+            stage['count'] += 1
+            stage['sum'] += span.duration
+            stage['items'] += span.items or 0
+            stage['status'][span.status] = stage['status'].get(span.status, 0) + 1
+            if span.items and span.duration:
+                stage['items_per_second'] = span.items / span.duration
+            stage['peak_rss'] = span.peak_rss
+
+    def register_gauge(self, name, help_text, read, label=None):
+        """Expose read() at scrape time: a number, or a {label value: number} dict when label is given."""
+        self._gauges.append((name, help_text, read, label))
+
+    def render(self):
+        lines = []
+
+        def header(name, kind, help_text):
+            lines.append(f"# HELP {METRICS_PREFIX}_{name} {help_text}")
+            lines.append(f"# TYPE {METRICS_PREFIX}_{name} {kind}")
+
+        with self._lock:
+            stages = {name: dict(stage, status=dict(stage['status'])) for name, stage in self._stages.items()}
+        header('stage_duration_seconds', 'histogram', 'Duration of pipeline stage spans.')
+        for name, stage in sorted(stages.items()):
+            for bound, count in zip(DURATION_BUCKETS, stage['buckets']):
+                lines.append(f'{METRICS_PREFIX}_stage_duration_seconds_bucket{{stage="{name}",le="{bound}"}} {count}')
+            lines.append(f'{METRICS_PREFIX}_stage_duration_seconds_bucket{{stage="{name}",le="+Inf"}} {stage["count"]}')
+            lines.append(f'{METRICS_PREFIX}_stage_duration_seconds_sum{{stage="{name}"}} {stage["sum"]:.6f}')
+            lines.append(f'{METRICS_PREFIX}_stage_duration_seconds_count{{stage="{name}"}} {stage["count"]}')
+        header('stage_items_total', 'counter', 'Items (tweets) processed by pipeline stages.')
+        for name, stage in sorted(stages.items()):
+            lines.append(f'{METRICS_PREFIX}_stage_items_total{{stage="{name}"}} {stage["items"]}')
+        header('stage_runs_total', 'counter', 'Pipeline stage spans by outcome.')
+        for name, stage in sorted(stages.items()):
+            for status, count in sorted(stage['status'].items()):
+                lines.append(f'{METRICS_PREFIX}_stage_runs_total{{stage="{name}",status="{status}"}} {count}')
+        header('stage_items_per_second', 'gauge', 'Throughput of the latest span of each stage.')
+        for name, stage in sorted(stages.items()):
+            lines.append(f'{METRICS_PREFIX}_stage_items_per_second{{stage="{name}"}} {stage["items_per_second"]:.3f}')
+        header('stage_peak_rss_bytes', 'gauge', 'Peak resident set size during the latest span of each stage.')
+        for name, stage in sorted(stages.items()):
+            lines.append(f'{METRICS_PREFIX}_stage_peak_rss_bytes{{stage="{name}"}} {stage["peak_rss"]}')
+        header('process_resident_memory_bytes', 'gauge', 'Resident set size of the server process.')
+        lines.append(f'{METRICS_PREFIX}_process_resident_memory_bytes {current_rss_bytes()}')
+        for name, help_text, read, label in self._gauges:
+            try:
+                value = read()
+            except Exception as e:
+                logger.warning(f"Metric {name} could not be read: {e}")
+                continue
+            header(name, 'gauge', help_text)
+            if label is None:
+                lines.append(f'{METRICS_PREFIX}_{name} {value}')
+            else:
+                for label_value, number in sorted(value.items()):
+                    lines.append(f'{METRICS_PREFIX}_{name}{{{label}="{label_value}"}} {number}')
+        return '\n'.join(lines) + '\n'
+
+
+class Cancelled(Exception):
+    """Base class of the exceptions that abort work on request; spans they unwind are 'cancelled', not 'error'."""
+
+
+metrics = MetricsRegistry()
+_sampler = _RssSampler(RSS_SAMPLE_INTERVAL)
+
+
+@contextmanager
+def span(name, items=None):
+    """
+    Time a pipeline stage. Records duration, item count (settable on the yielded span as
+    `span.items`), items per second and peak RSS into the metrics registry and the current
+    trace, and logs them as one JSON line tagged with the trace id.
+    """
+    current = Span(name, items)
+    _sampler.add(current)
+    try:
+        yield current
+    except BaseException as e:
+        current.status = 'cancelled' if isinstance(e, Cancelled) else 'error'
+        raise
+    finally:
+        current.duration = time.perf_counter() - current.started
+        _sampler.remove(current)
+        current.observe_rss(current_rss_bytes())
+        metrics.record(current)
+        record = current.to_dict()
+        active = _current_trace.get()
+        if active is not None:
+            active.add(record)
+        logger.info(f"span {json.dumps(dict(record, trace_id=current_trace_id()))}")
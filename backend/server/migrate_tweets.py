@@ -0,0 +1,46 @@
+"""
+Convert topics stored with an embedded `tweets` array into the split layout:
+one document per topic in `topics` and one document per tweet in `topic_tweets`.
+
+Topics keep their original _id, so existing query_ids stay valid. The migration
+is idempotent (tweets are upserted on query_id + Tweet ID) and can be re-run.
+
+Usage:
+    python migrate_tweets.py [--dry-run] [--drop-legacy]
+"""
+import argparse
+from db import topics_collection, legacy_collection, ensure_indexes, refresh_topic_aggregates, upsert_tweets
+
+def migrate_topic(legacy_doc, dry_run=False):
+    """Migrate one embedded topic document. Returns the number of tweets written."""
+    oid = legacy_doc['_id']
+    tweets = legacy_doc.get('tweets') or []
+    topic = {key: value for key, value in legacy_doc.items() if key not in ('_id', 'tweets')}
+    topic['tweet_count'] = len(tweets)
+    if dry_run:
+        return len(tweets)
+    topics_collection.update_one({'_id': oid}, {'$set': topic}, upsert=True)
+    upsert_tweets(oid, tweets)
+    refresh_topic_aggregates(oid)
+    return len(tweets)
+
+def migrate(dry_run=False, drop_legacy=False):
+    ensure_indexes()
+    migrated_topics = 0
+    migrated_tweets = 0
+    for legacy_doc in legacy_collection.find({'tweets': {'$exists': True}}):
+        count = migrate_topic(legacy_doc, dry_run=dry_run)
+        migrated_topics += 1
+        migrated_tweets += count
+        print(f"{'[dry-run] ' if dry_run else ''}Migrated '{legacy_doc.get('query')}' ({legacy_doc['_id']}): {count} tweets")
+        if drop_legacy and not dry_run:
+            legacy_collection.delete_one({'_id': legacy_doc['_id']})
+    print(f"Done: {migrated_topics} topics, {migrated_tweets} tweets")
+    return migrated_topics, migrated_tweets
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Split embedded topic documents into per-tweet documents.")
+    parser.add_argument('--dry-run', action='store_true', help="Only report what would be migrated")
+    parser.add_argument('--drop-legacy', action='store_true', help="Delete each embedded document after migrating it")
+    args = parser.parse_args()
+    migrate(dry_run=args.dry_run, drop_legacy=args.drop_legacy)
@@ -0,0 +1,179 @@
+import gc
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+
+def current_rss_bytes():
+    """Return the resident set size of this process in bytes (0 if it cannot be read)."""
+    try:
+        import psutil
+        return psutil.Process(os.getpid()).memory_info().rss
+    except ImportError:
+        pass
+    try:
+        with open('/proc/self/statm') as statm:
+            return int(statm.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, AttributeError):
+        return 0
+
+
+def _parameter_bytes(model):
+    """Best-effort size of the torch parameters and buffers held by a loaded model."""
+    modules = []
+    for attr in ('model', 'module'):
+        inner = getattr(model, attr, None)
+        if inner is not None and hasattr(inner, 'parameters'):
+            modules.append(inner)
+    if hasattr(model, 'parameters'):
+        modules.append(model)
+    total = 0
+    seen = set()
+    for module in modules:
+        try:
+            tensors = list(module.parameters()) + list(module.buffers())
+        except Exception:
+            continue
+        for tensor in tensors:
+            if id(tensor) in seen:
+                continue
+            seen.add(id(tensor))
+            total += tensor.numel() * tensor.element_size()
+    return total
+
+
+class _Entry:
+    def __init__(self, name, loader):
+        self.name = name
+        self.loader = loader
+        self.model = None
+        self.lock = threading.RLock()
+        self.load_seconds = None
+        self.rss_delta_bytes = None
+        self.param_bytes = None
+        self.loaded_at = None
+        self.load_count = 0
+
+    def stats(self):
+        return {
+            'loaded': self.model is not None,
+            'load_seconds': self.load_seconds,
+            'rss_delta_bytes': self.rss_delta_bytes,
+            'param_bytes': self.param_bytes,
+            'loaded_at': self.loaded_at.isoformat() if self.loaded_at else None,
+            'load_count': self.load_count,
+        }
+
+
+class ModelRegistry:
+    """
+    Process-wide cache of heavyweight models.
+
+    Each model is registered with a zero-argument loader and is built at most once,
+    either eagerly via warm_up() or lazily on the first get(). A per-model lock
+    serializes loading, unloading and (through use()) inference on the shared instance.
+    """
+
+    def __init__(self):
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def register(self, name, loader):
+        """Register a loader for a model name. Re-registering replaces the loader and drops any loaded instance."""
+        with self._lock:
+            previous = self._entries.get(name)
+            self._entries[name] = _Entry(name, loader)
+        if previous is not None:
+            with previous.lock:
+                previous.model = None
+            gc.collect()
+
+    def names(self):
+        with self._lock:
+            return list(self._entries)
+
+    def _entry(self, name):
+        with self._lock:
+            entry = self._entries.get(name)
+        if entry is None:
+            raise KeyError(f"No model registered under '{name}'")
+        return entry
+
+    def _load(self, entry):
+        logger.info(f"Loading model '{entry.name}'...")
+        gc.collect()
+        rss_before = current_rss_bytes()
+        start_time = time.time()
+        model = entry.loader()
+        entry.load_seconds = time.time() - start_time
+        entry.rss_delta_bytes = max(current_rss_bytes() - rss_before, 0)
+        entry.param_bytes = _parameter_bytes(model)
+        entry.loaded_at = datetime.utcnow()
+        entry.load_count += 1
+        entry.model = model
+        logger.info(
+            f"Loaded model '{entry.name}' in {entry.load_seconds:.2f}s "
+            f"(+{entry.rss_delta_bytes / 2**20:.1f} MiB RSS)"
+        )
+        return model
+
+    def get(self, name):
+        """Return the shared instance for name, loading it on first use."""
+        entry = self._entry(name)
+        model = entry.model
+        if model is not None:
+            return model
+        with entry.lock:
+            if entry.model is None:
+                self._load(entry)
+            return entry.model
+
+    @contextmanager
+    def use(self, name):
+        """Hold the model's lock while using it, so it cannot be unloaded or reconfigured mid-inference."""
+        entry = self._entry(name)
+        with entry.lock:
+            if entry.model is None:
+                self._load(entry)
+            yield entry.model
+
+    def is_loaded(self, name):
+        return self._entry(name).model is not None
+
+    def unload(self, name):
+        """Drop the loaded instance for name. Returns True if something was unloaded."""
+        entry = self._entry(name)
+        with entry.lock:
+            if entry.model is None:
+                return False
+            entry.model = None
+        gc.collect()
+        logger.info(f"Unloaded model '{name}'")
+        return True
+
+    def reload(self, name):
+        """Unload and immediately load name again, e.g. after a checkpoint was replaced on disk."""
+        entry = self._entry(name)
+        with entry.lock:
+            entry.model = None
+            gc.collect()
+            return self._load(entry)
+
+    def warm_up(self, names=None):
+        """Eagerly load the given models (all registered models by default)."""
+        for name in names or self.names():
+            self.get(name)
+
+    def stats(self):
+        """Load time and memory footprint per registered model."""
+        with self._lock:
+            entries = list(self._entries.values())
+        return {entry.name: entry.stats() for entry in entries}
+
+
+registry = ModelRegistry()
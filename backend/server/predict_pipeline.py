@@ -1,70 +1,192 @@
+import logging
+import numpy as np
 import pandas as pd
 import sys
 import os
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 from tools.MITweet.predict_relevence import TweetPredictor as RelevancePredictor
 from tools.MITweet.predict_ideology import RobertaTweetPredictor, args as ideology_args
+from model_registry import registry
+from preprocess import normalize_contents, leaning_from_indicators, install_token_cache
+from inference_backend import apply_backend, INFERENCE_BACKEND, TORCH
+from batching import token_lengths, predict_bucketed
+from prediction_cache import get_prediction_cache, checkpoint_version, content_key, RELEVANCE, IDEOLOGY
 
-def run_relevance_prediction(tweets):
-    # Prepare DataFrame
-    df = pd.DataFrame(tweets)
-    # Apply tweet normalization
-    from tools.MITweet.TweetNormalizer import normalizeTweet
-    df['Content'] = df['Content'].apply(normalizeTweet)
-    predictor = RelevancePredictor(
-        model_path=r"C:\Learn\IPD\backend\best_relevence_model.pth",
+logger = logging.getLogger(__name__)
+
+RELEVANCE_MODEL = 'relevance'
+IDEOLOGY_MODEL = 'ideology'
+RELEVANCE_MODEL_PATH = r"C:\Learn\IPD\backend\best_relevence_model.pth"
+IDEOLOGY_MODEL_PATH = "C:/Learn/IPD/backend/best_model.pth"
+INDICATORS_PATH = 'C:/Learn/IPD/backend/tools/MITweet/data/random_split/Indicators.txt'
+NUM_INDICATORS = 12
+FIXED_BATCH_SIZE = 32
+# Slack for special/separator tokens the ideology predictor adds around (indicator, tweet) pairs
+IDEOLOGY_LENGTH_MARGIN = 8
+
+def model_version(checkpoint_path):
+    """Cache version of a model: its checkpoint plus the inference backend, since quantized outputs can differ."""
+    version = checkpoint_version(checkpoint_path)
+    if INFERENCE_BACKEND != TORCH:
+        version += f"+{INFERENCE_BACKEND}"
+    return version
+
+def load_relevance_predictor():
+    predictor = install_token_cache(RelevancePredictor(
+        model_path=RELEVANCE_MODEL_PATH,
         model_name="vinai/bertweet-base",
         max_seq_length=128
-    )
-    predictions, probabilities, metrics = predictor.predict(df['Content'].tolist(), batch_size=32)
+    ))
+    return apply_backend(predictor, RELEVANCE_MODEL, model_version(RELEVANCE_MODEL_PATH))
+
+def load_ideology_predictor():
+    predictor = install_token_cache(RobertaTweetPredictor(
+        model_path=IDEOLOGY_MODEL_PATH,
+        args=ideology_args
+    ))
+    return apply_backend(predictor, IDEOLOGY_MODEL, model_version(IDEOLOGY_MODEL_PATH))
+
+registry.register(RELEVANCE_MODEL, load_relevance_predictor)
+registry.register(IDEOLOGY_MODEL, load_ideology_predictor)
+
+_indicators = None
+
+def load_indicators():
+    """Read the indicator descriptions once; they are static for the lifetime of the process."""
+    global _indicators
+    if _indicators is None:
+        with open(INDICATORS_PATH, encoding='utf-8') as indicators_file:
+            indicators = [' '.join(line.strip('\n').strip().split(' ')[:ideology_args.indicator_num]) for line in indicators_file]
+        if ideology_args.sep_ind:
+            indicators = [ind.replace(' ', '</s> ') for ind in indicators]
+        _indicators = indicators
+    return _indicators
+
+def predictor_max_seq_length(predictor):
+    for obj in (predictor, getattr(predictor, 'args', None)):
+        length = getattr(obj, 'max_seq_length', None)
+        if isinstance(length, int):
+            return length
+    return None
+
+def predict_in_batches(predictor, texts, predict_batch, indicator=None):
+    """
+    Run predict_batch(texts, batch_size) with length-bucketed dynamic batches when the predictor
+    exposes its tokenizer and max_seq_length, else with the fixed batch size.
+    """
+    tokenizer = getattr(predictor, 'tokenizer', None)
+    max_length = predictor_max_seq_length(predictor)
+    if tokenizer is None or max_length is None:
+        return predict_batch(texts, FIXED_BATCH_SIZE)
+    if indicator is None:
+        lengths = token_lengths(tokenizer, texts, max_length)
+        margin = 0
+    else:
+        lengths = token_lengths(tokenizer, [indicator] * len(texts), max_length, text_pairs=texts)
+        margin = IDEOLOGY_LENGTH_MARGIN
+    return predict_bucketed(predictor, texts, lengths, lambda batch: predict_batch(batch, len(batch)), length_margin=margin)
+
+def predict_relevance_cached(texts):
+    """
+    Relevance labels and max confidence for normalized texts, running the model only on
+    texts whose (content, model version) is not already in the prediction cache.
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray]: (labels of shape (n, NUM_INDICATORS), max_confidence of shape (n,))
+    """
+    cache = get_prediction_cache()
+    version = model_version(RELEVANCE_MODEL_PATH)
+    keys = [content_key(version, text) for text in texts]
+    results = cache.get_many(RELEVANCE, keys)
+    missing = {key: text for key, text in zip(keys, texts) if key not in results}
+    if missing:
+        def predict_batch(batch, batch_size):
+            predictions, probabilities, metrics = predictor.predict(batch, batch_size=batch_size)
+            return [
+                {'labels': [int(label) for label in predictions[i]], 'confidence': float(metrics['max_confidence'][i])}
+                for i in range(len(batch))
+            ]
+        with registry.use(RELEVANCE_MODEL) as predictor:
+            outputs = predict_in_batches(predictor, list(missing.values()), predict_batch)
+        computed = dict(zip(missing, outputs))
+        cache.put_many(RELEVANCE, computed)
+        results.update(computed)
+    logger.info(f"Relevance: {len(texts) - len(missing)}/{len(texts)} tweets served from the prediction cache")
+    if not keys:
+        return np.zeros((0, NUM_INDICATORS), dtype=int), np.zeros(0)
+    labels = np.array([results[key]['labels'] for key in keys], dtype=int)
+    confidence = np.array([results[key]['confidence'] for key in keys])
+    return labels, confidence
+
+def predict_ideology_cached(pairs):
+    """
+    Ideology class (0 left, 1 centre, 2 right) of (normalized text, indicator index) pairs, via the
+    prediction cache. All pairs share one cache lookup and write; the model runs only on the
+    missing pairs, in length-bucketed batches per indicator, since the predictor's predict_batch
+    scores every tweet of a call against the same indicator list and cannot mix indicators in a batch.
+    """
+    cache = get_prediction_cache()
+    version = model_version(IDEOLOGY_MODEL_PATH)
+    keys = [content_key(version, text, indicator_idx) for text, indicator_idx in pairs]
+    results = cache.get_many(IDEOLOGY, keys)
+    missing = {}
+    for key, (text, indicator_idx) in zip(keys, pairs):
+        if key not in results:
+            missing.setdefault(indicator_idx, {})[key] = text
+    if missing:
+        indicators = load_indicators()
+        computed = {}
+        with registry.use(IDEOLOGY_MODEL) as predictor:
+            for indicator_idx, texts in sorted(missing.items()):
+                indicator = indicators[indicator_idx]
+                def predict_batch(batch, batch_size):
+                    predictions, probabilities, _ = predictor.predict_batch(batch, indicators=[indicator], batch_size=batch_size)
+                    return [int(prediction) for prediction in predictions[0]]
+                outputs = predict_in_batches(predictor, list(texts.values()), predict_batch, indicator=indicator)
+                computed.update(zip(texts, outputs))
+        cache.put_many(IDEOLOGY, computed)
+        results.update(computed)
+    computed_pairs = sum(len(texts) for texts in missing.values())
+    logger.info(f"Ideology: {len(pairs) - computed_pairs}/{len(pairs)} (tweet, indicator) pairs served from the prediction cache")
+    return [results[key] for key in keys]
+
+def run_relevance_prediction(tweets):
+    # Prepare DataFrame (tweets may already be one, e.g. the representatives from dedup)
+    df = tweets if isinstance(tweets, pd.DataFrame) else pd.DataFrame(tweets)
+    # Apply tweet normalization (once; memoized across tweets and runs)
+    normalize_contents(df)
+    predictions, max_confidence = predict_relevance_cached(df['Content'].tolist())
     # Add predictions to DataFrame
     for i in range(predictions.shape[1]):
         df[f'label_{i}'] = predictions[:, i]
-    df['max_confidence'] = metrics['max_confidence']
-    df.to_csv(r"C:\Learn\IPD\backend\server\tempdata\tempPred.csv", index=False, encoding='utf-8')
+    df['max_confidence'] = max_confidence
     return df
 
 def run_ideology_prediction(df):
-    # Apply tweet normalization
-    from tools.MITweet.TweetNormalizer import normalizeTweet
-    df['Content'] = df['Content'].apply(normalizeTweet)
-    # Find the indicator (label) with the most 1s across all tweets
-    label_cols = [col for col in df.columns if col.startswith('label_')]
-    label_sums = df[label_cols].sum()
-    majority_indicator_idx = int(label_sums.idxmax().split('_')[1])
-    majority_label_col = f'label_{majority_indicator_idx}'
-    # Only process tweets where the majority indicator is 1
-    df_to_predict = df[df[majority_label_col] == 1].copy()
-    # indicators file path
-    indicators_file = open('C:/Learn/IPD/backend/tools/MITweet/data/random_split/Indicators.txt', encoding='utf-8')
-    indicators = [' '.join(line.strip('\n').strip().split(' ')[:ideology_args.indicator_num]) for line in indicators_file]
-    if ideology_args.sep_ind:
-        indicators = [ind.replace(' ', '</s> ') for ind in indicators]
-    predictor = RobertaTweetPredictor(
-        model_path="C:/Learn/IPD/backend/best_model.pth",
-        args=ideology_args
-    )
-    tweets = df_to_predict['Content'].tolist()
-    # Only predict for the majority indicator
-    predictions, probabilities, _ = predictor.predict_batch(tweets, indicators=[indicators[majority_indicator_idx]], batch_size=32)
-    # Set ideology column for the majority indicator
-    col_pred = predictions[0].tolist()
-    out_col = f'I{majority_indicator_idx}'
-    df_to_predict[out_col] = col_pred
-    # Assign leaning only for tweets where the majority indicator is 1
-    def get_leaning(row):
-        if row[majority_label_col] == 1:
-            val = row.get(out_col, -1)
-            if val == 0:
-                return 'left'
-            elif val == 1:
-                return 'centre'
-            elif val == 2:
-                return 'right'
-        return ''
-    # Update the main df with ideology and leaning only for those rows
-    df.loc[df_to_predict.index, out_col] = df_to_predict[out_col]
-    df['leaning'] = df.apply(get_leaning, axis=1)
+    """
+    Predict ideology for every (tweet, indicator) pair the tweet is relevant to (label_<i> == 1) and
+    derive a per-tweet leaning.
+
+    Output layout: I0..I11 hold the ideology class (0 left, 1 centre, 2 right) where label_<i> == 1
+    and NaN where the tweet is not relevant to indicator i. Unlike the dense reference output in
+    predictions_output_IDEOLOGY.csv (every tweet scored on every indicator), readers of these
+    columns must treat NaN as "not scored"; the columns are floats because of it.
+    """
+    # No-op for the output of run_relevance_prediction, which is already normalized
+    normalize_contents(df)
+    relevant = {}
+    for idx in range(NUM_INDICATORS):
+        label_col = f'label_{idx}'
+        df[f'I{idx}'] = np.nan
+        if label_col in df:
+            relevant[idx] = df.index[df[label_col] == 1]
+    pairs = [(text, idx) for idx, rows in relevant.items() for text in df.loc[rows, 'Content']]
+    # Cost grows with the number of relevant pairs, not 12x the number of tweets
+    predictions = iter(predict_ideology_cached(pairs))
+    for idx, rows in relevant.items():
+        if len(rows):
+            df.loc[rows, f'I{idx}'] = [next(predictions) for _ in rows]
+    df['leaning'] = leaning_from_indicators(df[[f'I{idx}' for idx in range(NUM_INDICATORS)]])
     # Remove any old leaning columns
     cols_to_drop = [f'leaning_{i}' for i in range(12)]
     df = df.drop(columns=[col for col in cols_to_drop if col in df.columns])
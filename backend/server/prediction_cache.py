@@ -0,0 +1,148 @@
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CACHE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'cache', 'predictions.sqlite')
+RELEVANCE = 'relevance'
+IDEOLOGY = 'ideology'
+TABLES = (RELEVANCE, IDEOLOGY)
+# SQLite caps the number of bound parameters per statement
+_SQL_BATCH = 500
+
+
+def checkpoint_version(path, default='unversioned'):
+    """Version tag for a model checkpoint, derived from its size and modification time."""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return default
+    return f"{os.path.basename(path)}:{stat.st_size}:{int(stat.st_mtime)}"
+
+
+def content_key(model_version, text, *extra):
+    """Content-addressed cache key for a normalized tweet under a given model version."""
+    digest = hashlib.sha256()
+    for part in (model_version, text, *extra):
+        digest.update(str(part).encode('utf-8'))
+        digest.update(b'\0')
+    return digest.hexdigest()
+
+
+class PredictionCache:
+    """
+    On-disk (SQLite) cache of model outputs keyed by content_key().
+
+    Values are JSON-encoded. Entries older than ttl_seconds are expired and, once a
+    table grows past max_entries, the least recently used entries are evicted.
+    """
+
+    def __init__(self, path=DEFAULT_CACHE_PATH, max_entries=500_000, ttl_seconds=30 * 24 * 3600):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.hits = {table: 0 for table in TABLES}
+        self.misses = {table: 0 for table in TABLES}
+        self._lock = threading.Lock()
+        if path != ':memory:':
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        for table in TABLES:
+            self._conn.execute(
+                f'CREATE TABLE IF NOT EXISTS {table} ('
+                'key TEXT PRIMARY KEY, value TEXT NOT NULL, created_at REAL NOT NULL, accessed_at REAL NOT NULL)'
+            )
+            self._conn.execute(f'CREATE INDEX IF NOT EXISTS {table}_accessed ON {table} (accessed_at)')
+        self._conn.commit()
+
+    def get_many(self, table, keys):
+        """Return {key: value} for the keys present and not expired; refreshes their LRU timestamp."""
+        keys = list(dict.fromkeys(keys))
+        found = {}
+        now = time.time()
+        with self._lock:
+            for start in range(0, len(keys), _SQL_BATCH):
+                batch = keys[start:start + _SQL_BATCH]
+                placeholders = ','.join('?' * len(batch))
+                rows = self._conn.execute(
+                    f'SELECT key, value FROM {table} WHERE key IN ({placeholders}) AND created_at >= ?',
+                    (*batch, now - self.ttl_seconds)
+                ).fetchall()
+                for key, value in rows:
+                    found[key] = json.loads(value)
+                if rows:
+                    self._conn.executemany(
+                        f'UPDATE {table} SET accessed_at = ? WHERE key = ?',
+                        [(now, key) for key, _ in rows]
+                    )
+            self._conn.commit()
+            self.hits[table] += len(found)
+            self.misses[table] += len(keys) - len(found)
+        return found
+
+    def put_many(self, table, items):
+        """Store {key: value} pairs, then enforce the TTL and size bound."""
+        if not items:
+            return
+        now = time.time()
+        with self._lock:
+            self._conn.executemany(
+                f'INSERT OR REPLACE INTO {table} (key, value, created_at, accessed_at) VALUES (?, ?, ?, ?)',
+                [(key, json.dumps(value), now, now) for key, value in items.items()]
+            )
+            self._evict(table, now)
+            self._conn.commit()
+
+    def _evict(self, table, now):
+        self._conn.execute(f'DELETE FROM {table} WHERE created_at < ?', (now - self.ttl_seconds,))
+        (count,) = self._conn.execute(f'SELECT COUNT(*) FROM {table}').fetchone()
+        overflow = count - self.max_entries
+        if overflow > 0:
+            self._conn.execute(
+                f'DELETE FROM {table} WHERE key IN (SELECT key FROM {table} ORDER BY accessed_at ASC LIMIT ?)',
+                (overflow,)
+            )
+
+    def clear(self):
+        with self._lock:
+            for table in TABLES:
+                self._conn.execute(f'DELETE FROM {table}')
+            self._conn.commit()
+
+    def stats(self):
+        with self._lock:
+            stats = {}
+            for table in TABLES:
+                (entries,) = self._conn.execute(f'SELECT COUNT(*) FROM {table}').fetchone()
+                lookups = self.hits[table] + self.misses[table]
+                stats[table] = {
+                    'entries': entries,
+                    'hits': self.hits[table],
+                    'misses': self.misses[table],
+                    'hit_rate': self.hits[table] / lookups if lookups else None,
+                }
+            return stats
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_prediction_cache():
+    """Process-wide cache, opened on first use (PREDICTION_CACHE_PATH overrides the location)."""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = PredictionCache(
+                    path=os.environ.get('PREDICTION_CACHE_PATH', DEFAULT_CACHE_PATH),
+                    max_entries=int(os.environ.get('PREDICTION_CACHE_MAX_ENTRIES', 500_000)),
+                    ttl_seconds=int(os.environ.get('PREDICTION_CACHE_TTL_SECONDS', 30 * 24 * 3600)),
+                )
+    return _cache
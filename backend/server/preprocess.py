@@ -0,0 +1,174 @@
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+from tools.MITweet.TweetNormalizer import normalizeTweet
+from metrics import span
+
+LEANING_BY_CLASS = {0: 'left', 1: 'centre', 2: 'right'}
+
+
+@lru_cache(maxsize=200_000)
+def normalize_tweet(text):
+    """Memoized normalizeTweet; scraped topics repeat the same content many times."""
+    return normalizeTweet(text)
+
+
+def normalize_contents(df):
+    """
+    Normalize df['Content'] in place exactly once. The DataFrame is flagged via df.attrs so
+    later stages (e.g. ideology prediction on the relevance output) do not normalize again.
+    """
+    if df.attrs.get('normalized'):
+        return df
+    if 'Content' in df:
+        with span('normalize', items=len(df)):
+            df['Content'] = [normalize_tweet(str(text)) for text in df['Content'].fillna('')]
+    df.attrs['normalized'] = True
+    return df
+
+
+def leaning_from_classes(classes, mask=None):
+    """
+    Vectorized mapping of ideology classes (0/1/2, NaN when not predicted) to leaning labels.
+
+    Args:
+        classes: pd.Series of ideology classes
+        mask: Optional boolean Series; rows where it is False get an empty leaning
+    """
+    leaning = classes.map(LEANING_BY_CLASS).fillna('')
+    if mask is not None:
+        leaning = leaning.where(mask, '')
+    return leaning
+
+
+def leaning_from_indicators(ideology):
+    """
+    Overall leaning of each tweet from its per-indicator ideology classes (columns I0..I11, NaN when
+    the tweet is not relevant to an indicator): the median class, with ties between two classes
+    resolved to centre. Tweets without any ideology prediction get an empty leaning.
+    """
+    median = ideology.median(axis=1, skipna=True)
+    classes = median.where(median % 1 == 0, 1).where(median.notna())
+    return leaning_from_classes(classes)
+
+
+class TokenizationCache:
+    """
+    Bounded LRU of encodings (input_ids and, if the tokenizer emits them, token_type_ids)
+    per (tokenizer, max_length, text[, text pair]).
+
+    Shared by every model so a tweet is tokenized once per tokenizer for the lifetime
+    of the process, not once per request.
+    """
+
+    def __init__(self, max_entries=500_000):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def encode(self, tokenizer, texts, max_length, text_pairs=None, add_special_tokens=True):
+        """Unpadded encodings (truncated to max_length) for each text, tokenizing only the uncached ones."""
+        name = getattr(tokenizer, 'name_or_path', type(tokenizer).__name__)
+        pairs = text_pairs if text_pairs is not None else [None] * len(texts)
+        keys = [(name, max_length, add_special_tokens, text, pair) for text, pair in zip(texts, pairs)]
+        result = [None] * len(keys)
+        missing = []
+        with self._lock:
+            for i, key in enumerate(keys):
+                ids = self._entries.get(key)
+                if ids is None:
+                    missing.append(i)
+                else:
+                    self._entries.move_to_end(key)
+                    result[i] = ids
+            self.hits += len(keys) - len(missing)
+            self.misses += len(missing)
+        if missing:
+            kwargs = {'truncation': max_length is not None, 'max_length': max_length, 'add_special_tokens': add_special_tokens}
+            if text_pairs is not None:
+                encoded = tokenizer([texts[i] for i in missing], [text_pairs[i] for i in missing], **kwargs)
+            else:
+                encoded = tokenizer([texts[i] for i in missing], **kwargs)
+            fields = [field for field in ('input_ids', 'token_type_ids') if field in encoded]
+            with self._lock:
+                for row, i in enumerate(missing):
+                    result[i] = {field: list(encoded[field][row]) for field in fields}
+                    self._entries[keys[i]] = result[i]
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+        return result
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else None,
+            }
+
+
+token_cache = TokenizationCache()
+
+
+class CachingTokenizer:
+    """
+    Drop-in wrapper around a Hugging Face tokenizer whose batch calls are served from token_cache.
+
+    Only the common `tokenizer(texts[, pairs], truncation=..., max_length=..., padding=..., return_tensors=...)`
+    form is cached; encodings are looked up per text and padded per call with tokenizer.pad().
+    Every other attribute and call form is delegated to the wrapped tokenizer unchanged.
+    """
+
+    _CACHED_KWARGS = {'truncation', 'max_length', 'padding', 'return_tensors', 'add_special_tokens', 'return_attention_mask'}
+
+    def __init__(self, tokenizer, cache=token_cache):
+        self._tokenizer = tokenizer
+        self._cache = cache
+
+    def __getattr__(self, name):
+        return getattr(self._tokenizer, name)
+
+    def __call__(self, text, text_pair=None, **kwargs):
+        texts = [text] if isinstance(text, str) else text
+        pairs = [text_pair] if isinstance(text_pair, str) else text_pair
+        cacheable = (
+            isinstance(texts, (list, tuple)) and all(isinstance(t, str) for t in texts)
+            and (pairs is None or (isinstance(pairs, (list, tuple)) and len(pairs) == len(texts)))
+            and set(kwargs) <= self._CACHED_KWARGS
+            and kwargs.get('truncation', True) in (True, 'longest_first')
+        )
+        if not cacheable:
+            return self._tokenizer(text, text_pair, **kwargs)
+        max_length = kwargs.get('max_length') if kwargs.get('truncation') else None
+        encodings = self._cache.encode(
+            self._tokenizer, list(texts), max_length,
+            text_pairs=list(pairs) if pairs is not None else None,
+            add_special_tokens=kwargs.get('add_special_tokens', True)
+        )
+        padding = kwargs.get('padding', False)
+        padded = self._tokenizer.pad(
+            {field: [encoding[field] for encoding in encodings] for field in encodings[0]} if encodings else {'input_ids': []},
+            padding=padding,
+            max_length=kwargs.get('max_length') if padding == 'max_length' else None,
+            return_tensors=kwargs.get('return_tensors'),
+            return_attention_mask=kwargs.get('return_attention_mask', True)
+        )
+        if isinstance(text, str) and kwargs.get('return_tensors') is None:
+            return {key: value[0] for key, value in padded.items()}
+        return padded
+
+
+def install_token_cache(predictor):
+    """Route a predictor's tokenizer through the shared token cache (no-op if it has none)."""
+    tokenizer = getattr(predictor, 'tokenizer', None)
+    if tokenizer is not None and not isinstance(tokenizer, CachingTokenizer):
+        predictor.tokenizer = CachingTokenizer(tokenizer)
+    return predictor
@@ -0,0 +1,293 @@
+"""
+Cache of serialized read-endpoint responses (/api/topics/<id> and /api/topics/<id>/stats).
+
+Entries are keyed by the endpoint, the topic id, the topic's `version` (bumped by every write to
+the topic or its tweets, see db.py) and the request arguments, so a write makes the old entries
+unreachable instead of having to invalidate them in every worker. The ETag is derived from that
+key, so a conditional request is answered with 304 before the body is even looked up.
+
+A body is compressed (gzip, plus brotli when the `brotli` package is installed) once, when it is
+cached. The in-process LRU is bounded in bytes; RESPONSE_CACHE_DIR adds an on-disk SQLite tier
+shared by the worker processes of a host and kept across restarts.
+"""
+import gzip
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from urllib.parse import urlencode
+
+logger = logging.getLogger(__name__)
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Bodies smaller than this are served uncompressed
+MIN_COMPRESS_SIZE = 1024
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+# Content-Encoding values in order of preference
+ENCODINGS = ('br', 'gzip')
+
+
+def response_key(endpoint, query_id, version, args=()):
+    """Cache key of a response: endpoint, topic id and version, and the sorted request arguments."""
+    return f"{endpoint}:{query_id}:{version}:{urlencode(sorted(args))}"
+
+
+def etag_for(key):
+    # Weak: the same representation is served with different content encodings
+    return 'W/"' + hashlib.sha1(key.encode('utf-8')).hexdigest() + '"'
+
+
+def etag_matches(if_none_match, etag):
+    """Whether an If-None-Match header matches the etag (weak comparison)."""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == '*':
+        return True
+    opaque = etag[2:] if etag.startswith('W/') else etag
+    return any(
+        (tag.strip()[2:] if tag.strip().startswith('W/') else tag.strip()) == opaque
+        for tag in if_none_match.split(',')
+    )
+
+
+def accepted_encodings(accept_encoding):
+    """Content codings an Accept-Encoding header allows (q > 0)."""
+    accepted = set()
+    for part in (accept_encoding or '').split(','):
+        coding, _, params = part.strip().partition(';')
+        q = 1.0
+        if params.strip().startswith('q='):
+            try:
+                q = float(params.strip()[2:])
+            except ValueError:
+                q = 0.0
+        if coding and q > 0:
+            accepted.add(coding.strip().lower())
+    return accepted
+
+
+class CachedResponse:
+    """A serialized response body with its precompressed variants ({encoding: bytes})."""
+
+    __slots__ = ('etag', 'body', 'variants')
+
+    def __init__(self, etag, body, variants=None):
+        self.etag = etag
+        self.body = body
+        self.variants = variants or {}
+
+    @classmethod
+    def compress(cls, etag, body):
+        variants = {}
+        if len(body) >= MIN_COMPRESS_SIZE:
+            variants['gzip'] = gzip.compress(body, compresslevel=GZIP_LEVEL)
+            if brotli is not None:
+                variants['br'] = brotli.compress(body, quality=BROTLI_QUALITY)
+        return cls(etag, body, {encoding: data for encoding, data in variants.items() if len(data) < len(body)})
+
+    @property
+    def size(self):
+        return len(self.body) + sum(len(data) for data in self.variants.values())
+
+    def select(self, accept_encoding):
+        """(body, content encoding or None) for a request's Accept-Encoding header."""
+        accepted = accepted_encodings(accept_encoding)
+        for encoding in ENCODINGS:
+            if encoding in self.variants and (encoding in accepted or '*' in accepted):
+                return self.variants[encoding], encoding
+        return self.body, None
+
+
+class ResponseCache:
+    """
+    Two-tier response cache: an in-process LRU bounded to max_bytes and, if path is given, an
+    SQLite file bounded to disk_max_bytes (least recently used entries are evicted from both).
+    """
+
+    def __init__(self, max_bytes=256 * 1024 * 1024, path=None, disk_max_bytes=2 * 1024 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.disk_max_bytes = disk_max_bytes
+        self.path = path
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._conn = None
+        if path:
+            if path != ':memory:':
+                os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            self._conn = sqlite3.connect(path, check_same_thread=False)
+            self._conn.execute('PRAGMA journal_mode=WAL')
+            self._conn.execute(
+                'CREATE TABLE IF NOT EXISTS responses ('
+                'key TEXT PRIMARY KEY, etag TEXT NOT NULL, body BLOB NOT NULL, gzip BLOB, br BLOB, '
+                'size INTEGER NOT NULL, accessed_at REAL NOT NULL)'
+            )
+            self._conn.execute('CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed_at)')
+            self._conn.commit()
+
+    def get(self, key):
+        """The cached response for key (promoted from disk to memory), or None."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry
+            entry = self._disk_get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self.disk_hits += 1
+            self._remember(key, entry)
+            return entry
+
+    def put(self, key, body):
+        """Compress and store a serialized body; returns its CachedResponse."""
+        entry = CachedResponse.compress(etag_for(key), body)
+        with self._lock:
+            self._remember(key, entry)
+            self._disk_put(key, entry)
+        return entry
+
+    def _remember(self, key, entry):
+        if entry.size > self.max_bytes:
+            return
+        previous = self._entries.pop(key, None)
+        if previous is not None:
+            self._bytes -= previous.size
+        self._entries[key] = entry
+        self._bytes += entry.size
+        while self._bytes > self.max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self._bytes -= evicted.size
+
+    def _disk_get(self, key):
+        if self._conn is None:
+            return None
+        row = self._conn.execute('SELECT etag, body, gzip, br FROM responses WHERE key = ?', (key,)).fetchone()
+        if row is None:
+            return None
+        self._conn.execute('UPDATE responses SET accessed_at = ? WHERE key = ?', (time.time(), key))
+        self._conn.commit()
+        etag, body, gzip_body, br_body = row
+        variants = {encoding: data for encoding, data in (('gzip', gzip_body), ('br', br_body)) if data is not None}
+        return CachedResponse(etag, body, variants)
+
+    def _disk_put(self, key, entry):
+        if self._conn is None or entry.size > self.disk_max_bytes:
+            return
+        self._conn.execute(
+            'INSERT OR REPLACE INTO responses (key, etag, body, gzip, br, size, accessed_at) VALUES (?, ?, ?, ?, ?, ?, ?)',
+            (key, entry.etag, entry.body, entry.variants.get('gzip'), entry.variants.get('br'), entry.size, time.time())
+        )
+        (total,) = self._conn.execute('SELECT COALESCE(SUM(size), 0) FROM responses').fetchone()
+        if total > self.disk_max_bytes:
+            evict = []
+            for old_key, size in self._conn.execute('SELECT key, size FROM responses ORDER BY accessed_at ASC'):
+                if total <= self.disk_max_bytes:
+                    break
+                evict.append((old_key,))
+                total -= size
+            self._conn.executemany('DELETE FROM responses WHERE key = ?', evict)
+        self._conn.commit()
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+            if self._conn is not None:
+                self._conn.execute('DELETE FROM responses')
+                self._conn.commit()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.disk_hits + self.misses
+            stats = {
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'disk_hits': self.disk_hits,
+                'misses': self.misses,
+                'hit_rate': (self.hits + self.disk_hits) / lookups if lookups else None,
+                'encodings': [encoding for encoding in ENCODINGS if encoding != 'br' or brotli is not None],
+            }
+            if self._conn is not None:
+                stats['disk_entries'], stats['disk_bytes'] = self._conn.execute(
+                    'SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses'
+                ).fetchone()
+            return stats
+
+
+class TopicResponse:
+    """
+    One read of a cached topic endpoint, shared by the Flask routes (server.py) and the async ones
+    (async_api.py):
+
+        response = TopicResponse(cache, endpoint, query_id, version, request.args, request.headers)
+        if response.needs_body:
+            response.store(serialized_payload)
+        status, body, headers = response.render()
+
+    The constructor answers If-None-Match and looks the body up, so the payload is only built and
+    serialized when neither the client nor the cache has this version of the response.
+    """
+
+    def __init__(self, cache, endpoint, query_id, version, args, headers):
+        self.cache = cache
+        self.key = response_key(endpoint, query_id, version, args.items(multi=True))
+        self.etag = etag_for(self.key)
+        self.accept_encoding = headers.get('Accept-Encoding')
+        self.not_modified = etag_matches(headers.get('If-None-Match'), self.etag)
+        self.entry = None if self.not_modified else cache.get(self.key)
+
+    @property
+    def needs_body(self):
+        return not self.not_modified and self.entry is None
+
+    def store(self, body):
+        self.entry = self.cache.put(self.key, body)
+
+    def render(self):
+        """(status, body, headers) of the response."""
+        # Clients may keep the response but must revalidate it (If-None-Match) before reuse
+        headers = {'ETag': self.etag, 'Vary': 'Accept-Encoding', 'Cache-Control': 'no-cache'}
+        if self.not_modified:
+            return 304, b'', headers
+        body, encoding = self.entry.select(self.accept_encoding)
+        if encoding:
+            headers['Content-Encoding'] = encoding
+        return 200, body, headers
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_response_cache():
+    """
+    Process-wide cache, created on first use. RESPONSE_CACHE_MAX_BYTES bounds the in-process tier;
+    RESPONSE_CACHE_DIR enables the on-disk tier, bounded by RESPONSE_CACHE_DISK_MAX_BYTES.
+    """
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                directory = os.environ.get('RESPONSE_CACHE_DIR')
+                _cache = ResponseCache(
+                    max_bytes=int(os.environ.get('RESPONSE_CACHE_MAX_BYTES', 256 * 1024 * 1024)),
+                    path=os.path.join(directory, 'responses.sqlite') if directory else None,
+                    disk_max_bytes=int(os.environ.get('RESPONSE_CACHE_DISK_MAX_BYTES', 2 * 1024 * 1024 * 1024)),
+                )
+    return _cache
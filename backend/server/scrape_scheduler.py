@@ -0,0 +1,160 @@
+import argparse
+import contextvars
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import date, timedelta
+import pandas as pd
+from browser_pool import get_browser_pool, close_browser_pools
+from metrics import Cancelled
+from scraper_runner import run_scraper_for_query
+
+logger = logging.getLogger(__name__)
+
+# Split a full scrape into this many date ranges scraped in parallel (1 disables sharding)
+SCRAPE_SHARDS = int(os.environ.get('SCRAPE_SHARDS', 1))
+# Date range covered by the shards, ending today
+SCRAPE_SHARD_DAYS = int(os.environ.get('SCRAPE_SHARD_DAYS', 7))
+
+
+class ScrapeTask:
+    """One scrape: a search query and how many tweets to collect for it."""
+
+    def __init__(self, query, max_tweets=100, known_tweet_ids=None, since=None):
+        self.query = query
+        self.max_tweets = max_tweets
+        self.known_tweet_ids = known_tweet_ids
+        self.since = since
+
+    def __repr__(self):
+        return f"ScrapeTask({self.query!r}, max_tweets={self.max_tweets})"
+
+
+def shard_query(query, shards, days=SCRAPE_SHARD_DAYS, until=None):
+    """
+    Split a search query into date-range shards with Twitter's since:/until: operators.
+
+    Returns:
+        List[str]: queries covering the `days` days up to and including `until` (default today), newest first
+    """
+    until = until or date.today()
+    shards = max(1, min(shards, days))
+    end = until + timedelta(days=1)  # until: is exclusive
+    step, extra = divmod(days, shards)
+    queries = []
+    for i in range(shards):
+        start = end - timedelta(days=step + (1 if i < extra else 0))
+        queries.append(f"{query} since:{start.isoformat()} until:{end.isoformat()}")
+        end = start
+    return queries
+
+
+class ScrapeScheduler:
+    """
+    Runs scrape tasks in parallel, one per pooled browser session of an account.
+
+    Every session draws from the process-wide scraper_file.request_budget, so adding tasks raises
+    throughput only up to the global request rate; each scrape also backs off on its own when
+    scrolls stop loading tweets.
+    """
+
+    def __init__(self, username, password, max_parallel=None, on_tweets=None):
+        """on_tweets(list of tweet dicts) is passed to every scrape to stream tweets as they are scraped."""
+        self.username = username
+        self.password = password
+        self.on_tweets = on_tweets
+        self.max_parallel = max_parallel or get_browser_pool(username, password).size
+
+    def _run_task(self, task):
+        return run_scraper_for_query(
+            task.query, self.username, self.password, max_tweets=task.max_tweets,
+            known_tweet_ids=task.known_tweet_ids, since=task.since, on_tweets=self.on_tweets
+        )
+
+    def iter_results(self, tasks):
+        """Yield (task, tweets) for each task as soon as it finishes; failed or stopped tasks yield no tweets."""
+        with ThreadPoolExecutor(max_workers=self.max_parallel, thread_name_prefix='scrape') as executor:
+            # Each shard runs in a copy of the caller's context so its log lines keep the job's trace id
+            futures = {executor.submit(contextvars.copy_context().run, self._run_task, task): task for task in tasks}
+            for future in as_completed(futures):
+                task = futures[future]
+                try:
+                    tweets = future.result()
+                except Cancelled:
+                    logger.info(f"Scrape stopped for {task}")
+                    tweets = []
+                except Exception as e:
+                    logger.error(f"Scrape failed for {task}: {e}", exc_info=True)
+                    tweets = []
+                logger.info(f"Scraped {len(tweets)} tweets for {task}")
+                yield task, tweets
+
+    def run(self, tasks, on_result=None):
+        """
+        Run all tasks and return their tweets merged and deduplicated by Tweet ID.
+        on_result(task, tweets) is called as each task finishes, e.g. to write results incrementally.
+        """
+        merged = {}
+        for task, tweets in self.iter_results(tasks):
+            if on_result is not None:
+                on_result(task, tweets)
+            for tweet in tweets:
+                merged.setdefault(str(tweet.get('Tweet ID') or '') or f"local-{len(merged)}", tweet)
+        return list(merged.values())
+
+
+def run_sharded_scrape(query, username, password, max_tweets=100, shards=None, days=SCRAPE_SHARD_DAYS, on_tweets=None):
+    """
+    Scrape a query over SCRAPE_SHARDS date ranges in parallel, splitting max_tweets between them.
+    Without sharding this is a single run_scraper_for_query call.
+    """
+    shards = shards or SCRAPE_SHARDS
+    if shards <= 1:
+        return run_scraper_for_query(query, username, password, max_tweets=max_tweets, on_tweets=on_tweets)
+    queries = shard_query(query, shards, days)
+    per_shard, extra = divmod(max_tweets, len(queries))
+    tasks = [ScrapeTask(q, per_shard + (1 if i < extra else 0)) for i, q in enumerate(queries)]
+    return ScrapeScheduler(username, password, on_tweets=on_tweets).run(tasks)[:max_tweets]
+
+
+def _write_csv(path, tweets):
+    tmp_path = f"{path}.tmp"
+    pd.DataFrame(tweets).to_csv(tmp_path, index=False, encoding='utf-8')
+    os.replace(tmp_path, path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Scrape several queries in parallel, writing one CSV per query as it finishes.")
+    parser.add_argument('queries', nargs='+')
+    parser.add_argument('--username', default=os.environ.get('SCRAPER_USERNAME'))
+    parser.add_argument('--password', default=os.environ.get('SCRAPER_PASSWORD'))
+    parser.add_argument('--max-tweets', type=int, default=100)
+    parser.add_argument('--shards', type=int, default=1, help='Date-range shards per query')
+    parser.add_argument('--days', type=int, default=SCRAPE_SHARD_DAYS)
+    parser.add_argument('--parallel', type=int, default=None, help='Concurrent browsers (default BROWSER_POOL_SIZE)')
+    parser.add_argument('--out-dir', default='data')
+    args = parser.parse_args()
+
+    tasks = []
+    for query in args.queries:
+        queries = shard_query(query, args.shards, args.days) if args.shards > 1 else [query]
+        tasks.extend(ScrapeTask(q, max(1, args.max_tweets // len(queries))) for q in queries)
+    os.makedirs(args.out_dir, exist_ok=True)
+
+    def write_result(task, tweets):
+        path = os.path.join(args.out_dir, f"{task.query.replace(' ', '_').replace(':', '-')}_tweets.csv")
+        _write_csv(path, tweets)
+        print(f"Wrote {len(tweets)} tweets to {path}")
+
+    scheduler = ScrapeScheduler(args.username, args.password, max_parallel=args.parallel)
+    if args.parallel:
+        get_browser_pool(args.username, args.password).size = args.parallel
+    try:
+        scheduler.run(tasks, on_result=write_result)
+    finally:
+        close_browser_pools()
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    main()
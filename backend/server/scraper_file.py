@@ -1,7 +1,10 @@
 import os
 import sys
+import threading
+import time
 import pandas as pd
 from datetime import datetime
+from urllib.parse import quote
 from fake_headers import Headers
 from time import sleep
 from selenium import webdriver
@@ -11,6 +14,7 @@ from selenium.webdriver.common.action_chains import ActionChains
 from selenium.webdriver.chrome.options import Options as ChromeOptions
 from selenium.webdriver.chrome.service import Service as ChromeService
 from webdriver_manager.chrome import ChromeDriverManager
+from metrics import Cancelled
 
 # Progress class
 class Progress:
@@ -48,6 +52,90 @@ class Scroller:
     def update_scroll_position(self) -> None:
         self.current_position = self.driver.execute_script("return window.pageYOffset;")
 
+# Global request budget shared by every scraper in the process
+class RequestBudget:
+    """
+    Token bucket limiting page loads and scrolls across all browser sessions.
+
+    Sessions call acquire() before each request; when several scrapes run in parallel they
+    share requests_per_minute instead of each issuing requests at full speed.
+    """
+    def __init__(self, requests_per_minute, burst=None) -> None:
+        self.rate = requests_per_minute / 60.0
+        self.capacity = burst or max(1, requests_per_minute // 6)
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+    def acquire(self) -> None:
+        if self.rate <= 0:
+            return
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            sleep(wait)
+
+request_budget = RequestBudget(int(os.environ.get('SCRAPE_REQUESTS_PER_MINUTE', 120)))
+
+# Adaptive wait between scrolls
+class Backoff:
+    """Delay that doubles after each scroll that loaded nothing and shrinks back after a productive one."""
+    def __init__(self, min_delay=0.25, max_delay=8.0, factor=2.0) -> None:
+        self.min_delay = min_delay
+        self.max_delay = max_delay
+        self.factor = factor
+        self.delay = min_delay
+    def success(self) -> None:
+        self.delay = max(self.min_delay, self.delay / self.factor)
+    def failure(self) -> None:
+        self.delay = min(self.max_delay, self.delay * self.factor)
+
+# Extracts every visible tweet card in a single WebDriver round-trip. Mirrors the XPath lookups
+# of the Tweet class field by field and returns rows in Tweet.tweet order; ads and cards missing
+# a user, handle or timestamp are skipped (emojis are escaped in Python, as in Tweet).
+EXTRACT_TWEETS_JS = r"""
+const text = el => el ? (el.innerText || el.textContent || '').trim() : '';
+const firstTextNode = el => Array.from(el.childNodes).find(n => n.nodeType === Node.TEXT_NODE);
+const count = el => text(el) || '0';
+const rows = [];
+for (const card of document.querySelectorAll('article[data-testid="tweet"]:not([disabled])')) {
+  const user = card.querySelector('div[data-testid="User-Name"] span');
+  const handle = Array.from(card.querySelectorAll('span')).find(span => {
+    const node = firstTextNode(span);
+    return node && node.textContent.includes('@');
+  });
+  const time = card.querySelector('time');
+  if (!user || !handle || !time) continue;
+  const body = card.querySelector('div[data-testid="tweetText"]');
+  const children = body ? Array.from(body.children) : [];
+  const link = card.querySelector("a[href*='/status/']");
+  const tweetLink = link ? link.href : '';
+  rows.push([
+    text(user),
+    text(handle),
+    time.getAttribute('datetime'),
+    !!card.querySelector('svg[data-testid="icon-verified"]'),
+    children.filter(c => c.tagName === 'SPAN' || c.tagName === 'A').map(text).join(''),
+    count(card.querySelector('div[data-testid="reply"] span')),
+    count(card.querySelector('div[data-testid="retweet"] span')),
+    count(card.querySelector('div[data-testid="like"] span')),
+    count(card.querySelector('a[href*="/analytics"] span')),
+    Array.from(card.querySelectorAll('a[href*="src=hashtag_click"]')).map(text),
+    body ? Array.from(body.querySelectorAll('a')).filter(a => { const n = firstTextNode(a); return n && n.textContent.includes('@'); }).map(text) : [],
+    children.filter(c => c.tagName === 'IMG' && (c.getAttribute('src') || '').includes('emoji')).map(img => img.getAttribute('alt') || ''),
+    (card.querySelector('div[data-testid="Tweet-User-Avatar"] img') || {src: ''}).src,
+    tweetLink,
+    tweetLink ? tweetLink.split('/').pop() : ''
+  ]);
+}
+return rows;
+"""
+
 # Tweet class
 class Tweet:
     def __init__(self, card, driver, actions, scrape_poster_details=False) -> None:
@@ -151,9 +239,46 @@ class Tweet:
         )
 
 # Twitter Scraper class
-TWITTER_LOGIN_URL = "https://twitter.com/i/flow/login"
+# TWITTER_BASE_URL can point the scraper at a local fixture server (see backend/benchmarks/fixture_server.py)
+TWITTER_BASE_URL = os.environ.get('TWITTER_BASE_URL', "https://twitter.com").rstrip("/")
+TWITTER_LOGIN_URL = f"{TWITTER_BASE_URL}/i/flow/login"
+TWEET_CARD_SELECTOR = 'article[data-testid="tweet"]'
+
+# Resolved once per process; ChromeDriverManager().install() hits the network on every call
+_chromedriver_path = None
+
+def create_driver():
+    """Start a headless Chrome WebDriver, falling back to a ChromeDriverManager-installed driver."""
+    global _chromedriver_path
+    print("[INFO] Creating Chrome WebDriver instance...")
+    header = Headers().generate()["User-Agent"]
+    browser_option = ChromeOptions()
+    browser_option.add_argument("--no-sandbox")
+    browser_option.add_argument("--disable-dev-shm-usage")
+    browser_option.add_argument("--ignore-certificate-errors")
+    browser_option.add_argument("--disable-gpu")
+    browser_option.add_argument("--log-level=3")
+    browser_option.add_argument("--disable-notifications")
+    browser_option.add_argument("--disable-popup-blocking")
+    browser_option.add_argument(f"--user-agent={header}")
+    browser_option.add_argument("--headless")
+    if _chromedriver_path is None:
+        try:
+            driver = webdriver.Chrome(options=browser_option)
+            return driver
+        except WebDriverException:
+            _chromedriver_path = ChromeDriverManager().install()
+    chrome_service = ChromeService(executable_path=_chromedriver_path)
+    driver = webdriver.Chrome(service=chrome_service, options=browser_option)
+    return driver
+
 class Twitter_Scraper:
-    def __init__(self, username, password, max_tweets=50, scrape_username=None, scrape_hashtag=None, scrape_query=None, scrape_poster_details=False, scrape_latest=False, scrape_top=True):
+    def __init__(self, username, password, max_tweets=50, scrape_username=None, scrape_hashtag=None, scrape_query=None, scrape_poster_details=False, scrape_latest=False, scrape_top=True, driver=None, budget=None):
+        """
+        Pass driver to scrape with an existing (e.g. pooled, already logged-in) WebDriver instead of starting one.
+        Page loads and scrolls draw from budget (default: the process-wide request_budget).
+        """
+        self.budget = budget or request_budget
         print("[INFO] Initializing Twitter_Scraper...")
         self.username = username
         self.password = password
@@ -173,7 +298,7 @@ class Twitter_Scraper:
         self.progress = Progress(0, max_tweets)
         self.router = self.go_to_home
         print("[INFO] Setting up WebDriver...")
-        self.driver = self._get_driver()
+        self.driver = driver if driver is not None else self._get_driver()
         self.actions = ActionChains(self.driver)
         self.scroller = Scroller(self.driver)
         self._config_scraper(max_tweets, scrape_username, scrape_hashtag, scrape_query, scrape_latest, scrape_top, scrape_poster_details)
@@ -206,29 +331,11 @@ class Twitter_Scraper:
             self.scraper_details["type"] = "Home"
             self.router = self.go_to_home
     def _get_driver(self):
-        print("[INFO] Creating Chrome WebDriver instance...")
-        header = Headers().generate()["User-Agent"]
-        browser_option = ChromeOptions()
-        browser_option.add_argument("--no-sandbox")
-        browser_option.add_argument("--disable-dev-shm-usage")
-        browser_option.add_argument("--ignore-certificate-errors")
-        browser_option.add_argument("--disable-gpu")
-        browser_option.add_argument("--log-level=3")
-        browser_option.add_argument("--disable-notifications")
-        browser_option.add_argument("--disable-popup-blocking")
-        browser_option.add_argument(f"--user-agent={header}")
-        browser_option.add_argument("--headless")
-        try:
-            driver = webdriver.Chrome(options=browser_option)
-            return driver
-        except WebDriverException:
-            chromedriver_path = ChromeDriverManager().install()
-            chrome_service = ChromeService(executable_path=chromedriver_path)
-            driver = webdriver.Chrome(service=chrome_service, options=browser_option)
-            return driver
+        return create_driver()
     def login(self):
         print("[INFO] Starting login process...")
         self.driver.maximize_window()
+        self.budget.acquire()
         self.driver.get(TWITTER_LOGIN_URL)
         sleep(3)
         self._input_username()
@@ -282,23 +389,26 @@ class Twitter_Scraper:
                     sleep(2)
     def go_to_home(self):
         print("[INFO] Navigating to Twitter Home page...")
-        self.driver.get("https://twitter.com/home")
+        self.budget.acquire()
+        self.driver.get(f"{TWITTER_BASE_URL}/home")
         sleep(3)
     def go_to_profile(self):
         print(f"[INFO] Navigating to profile: {self.scraper_details['username']}")
         if self.scraper_details["username"] is None or self.scraper_details["username"] == "":
             sys.exit(1)
         else:
-            self.driver.get(f"https://twitter.com/{self.scraper_details['username']}")
+            self.budget.acquire()
+            self.driver.get(f"{TWITTER_BASE_URL}/{self.scraper_details['username']}")
             sleep(3)
     def go_to_hashtag(self):
         print(f"[INFO] Navigating to hashtag: {self.scraper_details['hashtag']}")
         if self.scraper_details["hashtag"] is None or self.scraper_details["hashtag"] == "":
             sys.exit(1)
         else:
-            url = f"https://twitter.com/hashtag/{self.scraper_details['hashtag']}?src=hashtag_click"
+            url = f"{TWITTER_BASE_URL}/hashtag/{quote(self.scraper_details['hashtag'])}?src=hashtag_click"
             if self.scraper_details["tab"] == "Latest":
                 url += "&f=live"
+            self.budget.acquire()
             self.driver.get(url)
             sleep(3)
     def go_to_search(self):
@@ -306,11 +416,22 @@ class Twitter_Scraper:
         if self.scraper_details["query"] is None or self.scraper_details["query"] == "":
             sys.exit(1)
         else:
-            url = f"https://twitter.com/search?q={self.scraper_details['query']}&src=typed_query"
+            url = f"{TWITTER_BASE_URL}/search?q={quote(self.scraper_details['query'])}&src=typed_query"
             if self.scraper_details["tab"] == "Latest":
                 url += "&f=live"
+            self.budget.acquire()
             self.driver.get(url)
             sleep(1)
+    def _card_count(self):
+        return self.driver.execute_script(f"return document.querySelectorAll('{TWEET_CARD_SELECTOR}').length;")
+    def _wait_for_new_cards(self, previous_count, timeout, poll=0.1):
+        """Wait until more tweet cards are in the DOM than before the scroll, or timeout seconds pass."""
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if self._card_count() != previous_count:
+                return True
+            sleep(poll)
+        return False
     def get_tweet_cards(self):
         self.tweet_cards = self.driver.find_elements("xpath", '//article[@data-testid="tweet" and not(@disabled)]')
     def remove_hidden_cards(self):
@@ -320,10 +441,46 @@ class Twitter_Scraper:
                 self.driver.execute_script("arguments[0].parentNode.parentNode.parentNode.remove();", card)
         except Exception:
             return
-    def scrape_tweets(self, max_tweets=50, scrape_username=None, scrape_hashtag=None, scrape_query=None, scrape_latest=True, scrape_top=False, scrape_poster_details=False, router=None):
-        import random
+    def extract_tweets(self):
+        """Every visible, non-ad tweet as a Tweet.tweet tuple, read with one execute_script call."""
+        rows = self.driver.execute_script(EXTRACT_TWEETS_JS) or []
+        tweets = []
+        for row in rows:
+            row[11] = [emoji.encode("unicode-escape").decode("ASCII") for emoji in row[11]]
+            tweets.append(tuple(row))
+        return tweets
+    def parse_tweet_cards(self):
+        """Per-card WebDriver parsing with the Tweet class (slower; used when scraping poster details)."""
+        self.get_tweet_cards()
+        tweets = []
+        for card in self.tweet_cards[-20:]:
+            try:
+                tweet = Tweet(card=card, driver=self.driver, actions=self.actions, scrape_poster_details=self.scraper_details["poster_details"])
+            except NoSuchElementException:
+                continue
+            if not tweet.error and tweet.tweet is not None and not tweet.is_ad:
+                tweets.append(tweet.tweet)
+        return tweets
+    def _is_known(self, tweet, known_tweet_ids, since):
+        """True if the tweet was already stored by a previous run (by ID, or at/before the stored high-water timestamp)."""
+        tweet_id, date_time = tweet[14], tweet[2]
+        if known_tweet_ids and tweet_id in known_tweet_ids:
+            return True
+        return bool(since) and bool(date_time) and date_time <= since
+    def scrape_tweets(self, max_tweets=50, scrape_username=None, scrape_hashtag=None, scrape_query=None, scrape_latest=True, scrape_top=False, scrape_poster_details=False, router=None, known_tweet_ids=None, since=None, max_known_streak=5, on_tweets=None):
+        """
+        Scroll the configured timeline and collect tweets into self.data.
+
+        For incremental runs pass the IDs already stored (known_tweet_ids) and/or the newest stored
+        timestamp (since). Known tweets are skipped, and scraping stops once max_known_streak known
+        tweets are seen in a row, since the Latest tab is ordered newest first.
+
+        on_tweets(list of Tweet.tweet tuples) is called with the tweets added by each scroll, so a
+        consumer can process them while scrolling continues.
+        """
         print("[INFO] Starting tweet scraping loop...")
         self._config_scraper(max_tweets, scrape_username, scrape_hashtag, scrape_query, scrape_latest, scrape_top, scrape_poster_details)
+        known_streak = 0
         if router is None:
             router = self.router
         router()
@@ -334,43 +491,42 @@ class Twitter_Scraper:
         no_new_tweets_attempts = 0
         last_data_len = 0
         max_no_new_tweets_attempts = 10  # Stop after 10 attempts with no new tweets
+        backoff = Backoff()
         while self.scroller.scrolling:
             try:
                 print(f"[DEBUG] Scrolling... Current tweets collected: {len(self.data)}")
-                self.get_tweet_cards()
+                if self.scraper_details["poster_details"]:
+                    visible_tweets = self.parse_tweet_cards()
+                else:
+                    visible_tweets = self.extract_tweets()
                 added_tweets = 0
-                for card in self.tweet_cards[-20:]:  # Check more cards per scroll
-                    try:
-                        tweet_id = str(card)
-                        if tweet_id not in self.tweet_ids:
-                            self.tweet_ids.add(tweet_id)
-                            if not self.scraper_details["poster_details"]:
-                                self.driver.execute_script("arguments[0].scrollIntoView();", card)
-                            tweet = Tweet(card=card, driver=self.driver, actions=self.actions, scrape_poster_details=self.scraper_details["poster_details"])
-                            if tweet:
-                                if not tweet.error and tweet.tweet is not None:
-                                    if not tweet.is_ad:
-                                        self.data.append(tweet.tweet)
-                                        added_tweets += 1
-                                        self.progress.print_progress(len(self.data))
-                                        print(f"[DEBUG] Added tweet {len(self.data)}")
-                                        sleep(random.uniform(0.2, 0.6))  # Short, random sleep
-                                        if len(self.data) >= self.max_tweets:
-                                            self.scroller.scrolling = False
-                                            break
-                                    else:
-                                        continue
-                                else:
-                                    continue
-                            else:
-                                continue
-                        else:
-                            continue
-                    except NoSuchElementException:
+                for tweet in visible_tweets:
+                    # Dedupe on the real Tweet ID (link, or handle and time, when a card has none)
+                    tweet_key = tweet[14] or tweet[13] or f"{tweet[1]}|{tweet[2]}"
+                    if tweet_key in self.tweet_ids:
                         continue
+                    self.tweet_ids.add(tweet_key)
+                    if self._is_known(tweet, known_tweet_ids, since):
+                        known_streak += 1
+                        if known_streak >= max_known_streak:
+                            print("[INFO] Reached previously scraped tweets. Stopping scrape.")
+                            self.scroller.scrolling = False
+                            break
+                        continue
+                    known_streak = 0
+                    self.data.append(tweet)
+                    added_tweets += 1
+                    if len(self.data) >= self.max_tweets:
+                        self.scroller.scrolling = False
+                        break
+                self.progress.print_progress(len(self.data))
+                if on_tweets is not None and added_tweets:
+                    on_tweets(self.data[-added_tweets:])
                 if len(self.data) >= self.max_tweets:
                     print("[INFO] Reached max tweets. Stopping scrape.")
                     break
+                if not self.scroller.scrolling:
+                    break
                 if len(self.data) == last_data_len:
                     no_new_tweets_attempts += 1
                 else:
@@ -384,18 +540,24 @@ class Twitter_Scraper:
                             break
                         refresh_count += 1
                     empty_count += 1
-                    sleep(random.uniform(2.5, 4.5))  # Randomized longer sleep
+                    backoff.failure()  # Likely rate limited or at the end of the timeline
                 else:
                     empty_count = 0
                     refresh_count = 0
-                # Aggressive but randomized scrolling
-                scroll_pause = random.uniform(0.5, 1.2)
+                    backoff.success()
+                # Scroll, then wait only until new cards render (up to the current backoff delay)
+                card_count = self._card_count()
+                self.budget.acquire()
                 self.driver.execute_script("window.scrollTo(0, document.body.scrollHeight);")
-                sleep(scroll_pause)
+                self._wait_for_new_cards(card_count, backoff.delay)
             except StaleElementReferenceException:
                 print("[WARN] StaleElementReferenceException encountered. Retrying...")
-                sleep(random.uniform(2, 4))
+                backoff.failure()
+                sleep(backoff.delay)
                 continue
+            except Cancelled:
+                # The consumer of on_tweets stopped (e.g. a cancelled job); not a scrape error
+                raise
             except KeyboardInterrupt:
                 print("[INFO] KeyboardInterrupt detected. Stopping scrape.")
                 self.interrupted = True
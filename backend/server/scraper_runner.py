@@ -2,42 +2,50 @@ import sys
 import os
 from datetime import datetime
 from scraper_file import Twitter_Scraper  # You may need to refactor the notebook code into scraper/main.py
+from browser_pool import get_browser_pool
 
-def run_scraper_for_query(query, username, password, max_tweets=100):
+def tweet_to_dict(t):
+    """Convert a Tweet.tweet tuple to the dict stored per tweet."""
+    return {
+        'Name': t[0],
+        'Handle': t[1],
+        'Timestamp': t[2],
+        'Verified': t[3],
+        'Content': t[4],
+        'Comments': t[5],
+        'Retweets': t[6],
+        'Likes': t[7],
+        'Analytics': t[8],
+        'Tags': t[9],
+        'Mentions': t[10],
+        'Emojis': t[11],
+        'Profile Image': t[12],
+        'Tweet Link': t[13],
+        'Tweet ID': t[14]
+    }
+
+def run_scraper_for_query(query, username, password, max_tweets=100, known_tweet_ids=None, since=None, on_tweets=None):
     """
     Run the Twitter scraper for a given search query and return tweets as a list of dicts.
+    Pass known_tweet_ids / since (newest stored Timestamp) to only collect tweets newer than a previous run.
+    The scrape runs in a warm, already logged-in browser borrowed from the account's pool.
+    on_tweets(list of tweet dicts) receives tweets as they are scraped, one call per scroll.
     """
-    scraper = Twitter_Scraper(
-        username=username,
-        password=password,
-        max_tweets=max_tweets,
-        scrape_query=query,
-        scrape_top=False
-    )
-    scraper.login()
-    scraper.scrape_tweets(
-        max_tweets=max_tweets,
-        scrape_query=query,
-        scrape_top=False
-    )
-    tweets = []
-    for t in scraper.get_tweets():
-        tweets.append({
-            'Name': t[0],
-            'Handle': t[1],
-            'Timestamp': t[2],
-            'Verified': t[3],
-            'Content': t[4],
-            'Comments': t[5],
-            'Retweets': t[6],
-            'Likes': t[7],
-            'Analytics': t[8],
-            'Tags': t[9],
-            'Mentions': t[10],
-            'Emojis': t[11],
-            'Profile Image': t[12],
-            'Tweet Link': t[13],
-            'Tweet ID': t[14]
-        })
-    scraper.driver.close()
-    return tweets
+    with get_browser_pool(username, password).session() as driver:
+        scraper = Twitter_Scraper(
+            username=username,
+            password=password,
+            max_tweets=max_tweets,
+            scrape_query=query,
+            scrape_top=False,
+            driver=driver
+        )
+        scraper.scrape_tweets(
+            max_tweets=max_tweets,
+            scrape_query=query,
+            scrape_top=False,
+            known_tweet_ids=known_tweet_ids,
+            since=since,
+            on_tweets=(lambda batch: on_tweets([tweet_to_dict(t) for t in batch])) if on_tweets else None
+        )
+    return [tweet_to_dict(t) for t in scraper.get_tweets()]
@@ -1,30 +1,60 @@
 import pandas as pd
 import os
-from flask import Flask, jsonify, request
+import json
+from flask import Flask, Response, jsonify, request, stream_with_context
 from flask_cors import CORS
 from transformers import pipeline  # Keep this for tweet summarization
-from db import insert_tweets, get_tweets_by_query, get_tweets_by_query_id, update_tweets_by_query_id, search_similar_topics, get_all_topics
+from db import insert_tweets, get_tweets_by_query, get_tweets_by_query_id, update_tweets_by_query_id, search_similar_topics, list_topics, get_topic, get_topic_by_query, get_high_water_mark, get_topic_tweets, iter_topic_tweets, count_topic_tweets, tweet_filters, update_topic_summaries, upsert_tweets, refresh_topic_aggregates, index_topic, get_topic_version, jobs_collection, ping, TWEET_SORTS
 from scraper_runner import run_scraper_for_query
+from scrape_scheduler import run_sharded_scrape
 from predict_pipeline import run_relevance_prediction, run_ideology_prediction
+from model_registry import registry
+from prediction_cache import get_prediction_cache
+from preprocess import token_cache
+from summarization import summarize_groups
+from dedup import collapse_near_duplicates, expand_duplicates
+from streaming import stream_pipeline
+from columnar_store import write_topic
+from topic_stats import refresh_topic_stats, get_topic_stats
+from response_cache import get_response_cache, TopicResponse
+from jobs import JobQueue, JobStore, JobCancelled, QueueFull
+from browser_pool import get_browser_pool, close_browser_pools
+from metrics import metrics, span, TraceIdFilter
+from contextlib import contextmanager
+import atexit
 import logging
+import threading
 import time
 from typing import Tuple, Optional
 
 # Example credentials (replace with env or config in production)
 SCRAPER_USERNAME = "ItoutTry71369"
 SCRAPER_PASSWORD = "ABCDEFGHIJ"
+# Models that must be loaded before /readyz reports ready (empty: models load on first use)
+READY_MODELS = [name for name in os.environ.get('READY_MODELS', '').split(',') if name]
+# Similar topics scoring below this cosine similarity are not suggested
+SIMILAR_TOPIC_MIN_SCORE = float(os.environ.get('SIMILAR_TOPIC_MIN_SCORE', 0.2))
 
 # Set up logging
 logging.basicConfig(
     level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s',
+    format='%(asctime)s - %(levelname)s - [%(trace_id)s] %(message)s',
     handlers=[
         logging.FileHandler('query_optimizer.log'),
         logging.StreamHandler()
     ]
 )
+for _handler in logging.getLogger().handlers:
+    _handler.addFilter(TraceIdFilter())
 logger = logging.getLogger(__name__)
 
+SUMMARIZER_MODEL = 'summarizer'
+
+def load_summarizer():
+    return pipeline("summarization", model="sshleifer/distilbart-cnn-12-6", device="cpu")
+
+registry.register(SUMMARIZER_MODEL, load_summarizer)
+
 def normalize_query(query: str) -> str:
     """Normalize a query for comparison by removing special characters and converting to lowercase."""
     return query.lower().strip().replace(' ', '_').replace(')', '').replace('(', '')
@@ -62,32 +92,129 @@ def process_query_text(query: str) -> Tuple[str, str]:
 def search_topic(query: str) -> dict:
     """
     Search for existing similar topics.
-    Returns a dictionary containing existing topics and a boolean indicating if an exact match was found.
+    Returns a dictionary containing the exact match (if any) and the most similar other topics,
+    ranked by embedding similarity and each carrying its cosine `score`.
     """
     normalized_query = normalize_query(query)
-    existing_topics = search_similar_topics(normalized_query)
-    
-    exact_match = None
-    similar_topics = []
-    
-    for topic in existing_topics:
-        if normalize_query(topic['query']) == normalized_query:
-            exact_match = topic
-        else:
-            similar_topics.append(topic)
-    
+    exact_match = get_topic_by_query(normalized_query)
+    # Embed the readable query; the underscore-joined key is only a storage key
+    existing_topics = search_similar_topics(query.strip(), max_results=6)
     return {
         'exact_match': exact_match,
-        'similar_topics': similar_topics[:5]  # Return top 5 similar topics
+        'similar_topics': _similar_topics(normalized_query, existing_topics)
     }
 
-def process_query_pipeline(query: str, max_tweets: int = 2000) -> Optional[str]:
+def _similar_topics(normalized_query, topics):
+    """The top 5 ranked topics worth suggesting: not the query itself and similar enough."""
+    return [
+        topic for topic in topics
+        if normalize_query(topic['query']) != normalized_query and topic['score'] >= SIMILAR_TOPIC_MIN_SCORE
+    ][:5]
+
+def _search_topic_payload(exact_match, similar_topics):
+    """Body of /api/search-topic: the exact match's query_id, if any, and the similar topics (no tweets)."""
+    payload = {
+        "similar_topics": [{"_id": str(t['_id']), "query": t['query'], "score": t['score']} for t in similar_topics]
+    }
+    if exact_match:
+        payload.update({"query_id": str(exact_match['_id']), "existing": True})
+    return payload
+
+def _enter_stage(job, stage, total=None):
+    """Report stage progress to the job (if any); raises JobCancelled when the job was cancelled."""
+    if job is not None:
+        job.set_stage(stage, total=total)
+
+def _complete_stage(job, done=None):
+    """Report the job's current stage (if any) as finished with `done` items (default: its total)."""
+    if job is not None:
+        job.complete_stage(done)
+
+@contextmanager
+def _stage(job, stage, total=None):
+    """
+    Enter a job stage and time it as a metrics span; the yielded span's items default to total.
+    The stage's progress is reported complete with the span's item count when it finishes.
+    """
+    _enter_stage(job, stage, total=total)
+    with span(stage, items=total) as current:
+        yield current
+    _complete_stage(job, current.items)
+
+def classify_tweets(tweets, job=None) -> pd.DataFrame:
+    """
+    Collapse near-duplicate tweets and retweets, run relevance and ideology prediction on one
+    representative per group and copy the results to every member. Each tweet keeps its own row,
+    tagged with dup_group_size and dup_of.
+    """
+    with _stage(job, 'dedupe', total=len(tweets)):
+        df, representatives = collapse_near_duplicates(pd.DataFrame(tweets))
+    logger.info(f"Collapsed {len(df)} tweets into {len(representatives)} near-duplicate groups")
+    logger.info("Running relevance prediction...")
+    with _stage(job, 'relevance', total=len(representatives)):
+        df_relevance = run_relevance_prediction(representatives)
+    logger.info("Running ideology prediction...")
+    with _stage(job, 'ideology', total=len(representatives)):
+        df_ideology = run_ideology_prediction(df_relevance)
+    return expand_duplicates(df, df_ideology)
+
+def stream_new_topic(search_query: str, storage_key: str, max_tweets: int, job=None) -> Optional[str]:
+    """
+    Scrape a new topic and classify it as it is scraped: each micro-batch of tweets is classified
+    and bulk-upserted as soon as it is full, so the topic (status 'partial') and the job's query_id
+    expose results while scrolling continues.
+
+    Returns:
+        Optional[str]: query_id of the new topic, None if nothing was scraped
+    """
+    _enter_stage(job, 'stream', total=max_tweets)
+    state = {'query_id': None, 'scraped': 0}
+    # The scrape shards report tweets from their own threads
+    scraped_lock = threading.Lock()
+
+    def scrape(on_tweets):
+        def counted(tweets):
+            with scraped_lock:
+                state['scraped'] += len(tweets)
+            on_tweets(tweets)
+        with span('scrape') as scrape_span:
+            try:
+                run_sharded_scrape(search_query, SCRAPER_USERNAME, SCRAPER_PASSWORD, max_tweets=max_tweets, on_tweets=counted)
+            finally:
+                scrape_span.items = state['scraped']
+
+    def process_batch(tweets, start_position):
+        df = classify_tweets(tweets)
+        if state['query_id'] is None:
+            # Create the topic with its first batch so empty scrapes leave nothing behind
+            state['query_id'] = insert_tweets(storage_key, [])
+            if job is not None:
+                job.result = state['query_id']
+        with span('update', items=len(df)):
+            upsert_tweets(state['query_id'], df.to_dict(orient='records'), start_position=start_position)
+            refresh_topic_aggregates(state['query_id'], {'status': 'partial'})
+        classified = start_position + len(tweets)
+        logger.info(f"Stored {classified} classified tweets for query_id: {state['query_id']}")
+        if job is not None:
+            job.update_progress(classified, total=max(max_tweets, classified), scraped=state['scraped'])
+
+    processed = stream_pipeline(scrape, process_batch, should_stop=job.check_cancelled if job is not None else None)
+    _complete_stage(job, processed)
+    if state['query_id'] is not None:
+        refresh_topic_aggregates(state['query_id'], {'status': 'complete'})
+        # Re-embed the topic now that it has tweets (it was indexed by its query alone)
+        index_topic(state['query_id'])
+    logger.info(f"Streamed {processed} tweets into query_id: {state['query_id']}")
+    return state['query_id']
+
+def process_query_pipeline(query: str, max_tweets: int = 2000, job=None) -> Optional[str]:
     """
     Main pipeline: process query, check if exists, fetch or scrape tweets, store in MongoDB if new.
     
     Args:
         query (str): The search query
         max_tweets (int): Maximum number of tweets to retrieve
+        job (Job, optional): Background job to report per-stage progress to
         
     Returns:
         Optional[str]: MongoDB query_id if successful, None if failed
@@ -99,168 +226,240 @@ def process_query_pipeline(query: str, max_tweets: int = 2000) -> Optional[str]:
         logger.info(f"Search query: {search_query}")
         
         # 2. Check if query already exists in storage
-        existing_doc = get_tweets_by_query(storage_key)
+        with _stage(job, 'lookup'):
+            existing_doc = get_tweets_by_query(storage_key)
         if existing_doc and 'tweets' in existing_doc:
             logger.info(f"Found existing tweets for query: {storage_key}")
             tweets = existing_doc['tweets']
             query_id = str(existing_doc['_id'])
         else:
-            # 3. Scrape tweets if not present
+            # 3. Scrape new tweets and classify/store them in micro-batches while scrolling continues
             logger.info(f"Scraping new tweets for query: {search_query}")
-            tweets = run_scraper_for_query(search_query, SCRAPER_USERNAME, SCRAPER_PASSWORD, max_tweets=max_tweets)
-            if not tweets:
+            query_id = stream_new_topic(search_query, storage_key, max_tweets, job)
+            if not query_id:
                 logger.error("No tweets retrieved from scraper")
-                return None
-                
-            # 4. Store raw tweets in MongoDB
-            query_id = insert_tweets(storage_key, tweets)
-            logger.info(f"Stored {len(tweets)} tweets with query_id: {query_id}")
+            return query_id
     
-        # 5. Run predictions
-        logger.info("Running relevance prediction...")
-        df_relevance = run_relevance_prediction(tweets)
-        logger.info("Running ideology prediction...")
-        df_final = run_ideology_prediction(df_relevance)
+        # 4. Run predictions once per group of near-identical tweets
+        df_final = classify_tweets(tweets, job)
         
-        # 6. Update MongoDB with final output
-        df_final.to_csv(r"C:\Learn\IPD\backend\server\tempdata\tempPred.csv", index=False, encoding='utf-8')
-        update_tweets_by_query_id(query_id, df_final.to_dict(orient='records'))
+        # 5. Update MongoDB with final output
+        with _stage(job, 'update', total=len(df_final)):
+            update_tweets_by_query_id(query_id, df_final.to_dict(orient='records'))
+            if existing_doc.get('status') == 'partial':
+                # Left behind by an interrupted streaming run; its tweets are now all classified
+                refresh_topic_aggregates(query_id, {'status': 'complete'})
         logger.info(f"Updated MongoDB with predictions for query_id: {query_id}")
         
         return query_id
         
+    except JobCancelled:
+        raise
     except Exception as e:
         logger.error(f"Error in query pipeline: {e}", exc_info=True)
+        if job is not None:
+            job.error = str(e)
         return None
 
+def refresh_topic_pipeline(query: str, max_tweets: int = 2000, job=None):
+    """
+    Incremental refresh: scrape only tweets newer than the stored ones, classify just that delta
+    and append it to the existing topic.
+
+    Returns:
+        Tuple[Optional[str], Optional[pd.DataFrame]]: (query_id, predicted new tweets); the DataFrame is
+        empty when nothing new was found. query_id is None if the topic does not exist or the run failed.
+    """
+    try:
+        search_query, storage_key = process_query_text(query)
+        with _stage(job, 'lookup'):
+            topic = get_topic_by_query(storage_key)
+            high_water = get_high_water_mark(topic['_id']) if topic else None
+        if not topic:
+            logger.info(f"No stored topic to refresh for query: {storage_key}")
+            return None, None
+        query_id = str(topic['_id'])
+        logger.info(
+            f"Refreshing {storage_key}: {len(high_water['tweet_ids'])} stored tweets, "
+            f"newest at {high_water['latest_timestamp']}"
+        )
+
+        with _stage(job, 'scrape', total=max_tweets) as scrape_span:
+            tweets = run_scraper_for_query(
+                search_query, SCRAPER_USERNAME, SCRAPER_PASSWORD, max_tweets=max_tweets,
+                known_tweet_ids=high_water['tweet_ids'], since=high_water['latest_timestamp']
+            )
+            tweets = [t for t in tweets if str(t.get('Tweet ID')) not in high_water['tweet_ids']]
+            scrape_span.items = len(tweets)
+        if not tweets:
+            logger.info(f"No new tweets for query: {storage_key}")
+            return query_id, pd.DataFrame()
+
+        df_new = classify_tweets(tweets, job)
+
+        with _stage(job, 'update', total=len(df_new)):
+            update_tweets_by_query_id(query_id, df_new.to_dict(orient='records'), start_position=high_water['next_position'])
+        logger.info(f"Appended {len(df_new)} new tweets to query_id: {query_id}")
+        return query_id, df_new
+
+    except JobCancelled:
+        raise
+    except Exception as e:
+        logger.error(f"Error in refresh pipeline: {e}", exc_info=True)
+        if job is not None:
+            job.error = str(e)
+        return None, None
+
 def get_tweets_for_query_id(query_id):
     doc = get_tweets_by_query_id(query_id)
     if doc:
         return doc['tweets']
     return []
 
-def export_tweets_to_csv(query_id, query_name, data_folder="data"):
+def export_topic_to_store(query_id, query_name, job_id=None):
     """
-    Fetch tweets from MongoDB by query_id and store them in a CSV file named after the query inside the data folder.
-    """
-    doc = get_tweets_by_query_id(query_id)
-    if not doc or 'tweets' not in doc:
-        print(f"No tweets found for query_id: {query_id}")
-        return
-    tweets = doc['tweets']
-    df = pd.DataFrame(tweets)
-    if not os.path.exists(data_folder):
-        os.makedirs(data_folder)
-    filename = os.path.join(data_folder, f"{query_name.replace(' ', '_')}_tweets.csv")
-    df.to_csv(filename, index=False, encoding='utf-8')
-    print(f"Tweets exported to {filename}")
-
-def chunk_text(texts, max_tokens=800):
-    """Split list of texts into chunks that won't exceed token limit."""
-    chunks = []
-    current_chunk = []
-    current_length = 0
-    
-    for text in texts:
-        # Rough estimate of tokens (words + some extra for special tokens)
-        estimated_tokens = len(text.split()) + 10
-        
-        if current_length + estimated_tokens > max_tokens:
-            if current_chunk:  # Save current chunk if not empty
-                chunks.append(" ".join(current_chunk))
-            current_chunk = [text]
-            current_length = estimated_tokens
-        else:
-            current_chunk.append(text)
-            current_length += estimated_tokens
-    
-    if current_chunk:  # Add the last chunk
-        chunks.append(" ".join(current_chunk))
-    
-    return chunks
+    Export a topic's tweets from MongoDB to the Parquet store (see columnar_store), partitioned by
+    topic and tweet date. Failures are logged; the export never fails the analysis job.
 
-def batch_summarize_tweets(tweets, summarizer, max_batch_size=10):
-    """
-    Hierarchically summarize tweets by processing them in batches and recursively summarizing until reaching a single summary.
+    Returns:
+        Optional[int]: number of tweets exported, None if there were none or the export failed
     """
-    summaries = tweets
-    batch = []
-
-    while len(summaries) > 1:
-        tweets = summaries
-        summaries = []
-        for tweet in tweets:
-            batch.append(tweet)
-            
-            # Summarize when reaching batch size or at the end
-            if len(batch) == max_batch_size or tweet == tweets[-1]:
-                try:
-                    batch_text = " ".join(batch)
-                    summary = summarizer(batch_text, 
-                                      max_length=150, 
-                                      min_length=20, 
-                                      do_sample=False,
-                                      truncation=True)[0]['summary_text']
-                    summaries.append(summary)
-                except Exception as e:
-                    print(f"Error summarizing batch: {e}")
-                    # If error occurs, just join the batch as fallback
-                    summaries.append(" ".join(batch[:3]) + "...") # Include first 3 tweets as sample
-                batch = []
-    
-    return summaries[0] if summaries else "No summary generated."
+    try:
+        df = pd.DataFrame(list(iter_topic_tweets(query_id)))
+        if df.empty:
+            print(f"No tweets found for query_id: {query_id}")
+            return
+        with span('export', items=len(df)):
+            paths = write_topic(normalize_query(query_name), df, job_id=job_id)
+        print(f"Tweets exported to {len(paths)} Parquet partitions")
+        return len(df)
+    except Exception as e:
+        logger.error(f"Error exporting tweets for {query_id}: {e}", exc_info=True)
 
 def generate_ideological_summaries(query_id):
     """
     Generate summaries for tweets based on their ideological leanings (left, center, right)
-    using hierarchical batch summarization.
+    using hierarchical batch summarization. The three leanings are reduced together so their
+    chunks share batched forward passes.
     """
     print(f"Starting summary generation for query_id: {query_id}")
     
-    # Get tweets from MongoDB
-    doc = get_tweets_by_query_id(query_id)
-    if not doc or 'tweets' not in doc:
+    # Get tweets from MongoDB (only the fields the summaries need)
+    with span('summary_lookup') as lookup_span:
+        tweets = get_topic_tweets(query_id, projection=['Content', 'leaning'])
+        lookup_span.items = len(tweets)
+    if not tweets:
         print("No tweets found in MongoDB for this query_id")
         return None
         
     # Convert to DataFrame for easier processing
-    tweets_df = pd.DataFrame(doc['tweets'])
+    tweets_df = pd.DataFrame(tweets)
     print(f"Total tweets loaded: {len(tweets_df)}")
     
-    # Initialize the summarization pipeline with a lighter model
-    print("Initializing summarization pipeline...")
-    summarizer = pipeline("summarization", model="sshleifer/distilbart-cnn-12-6", device="cpu")
+    # Group tweets by ideological leaning
+    groups = {}
+    for leaning in ['left', 'centre', 'right']:
+        groups[leaning] = tweets_df[tweets_df['leaning'].fillna('').str.lower() == leaning]['Content'].tolist()
+        print(f"Found {len(groups[leaning])} tweets for {leaning} leaning")
     
-    # Generate summaries for each ideological leaning
+    # Use hierarchical batch summarization with the process-wide pipeline (loaded on first use)
     summaries = {}
-    for leaning in ['left', 'centre', 'right']:
-        print(f"\nProcessing {leaning} leaning tweets...")
-        # Filter tweets by leaning
-        leaning_tweets = tweets_df[tweets_df['leaning'].str.lower() == leaning]['Content'].tolist()
-        print(f"Found {len(leaning_tweets)} tweets for {leaning} leaning")
-        
+    try:
+        with span('summarize', items=len(tweets_df)), registry.use(SUMMARIZER_MODEL) as summarizer:
+            generated = summarize_groups(groups, summarizer)
+    except Exception as e:
+        print(f"Error generating summaries: {str(e)}")
+        generated = None
+    for leaning, leaning_tweets in groups.items():
         if not leaning_tweets:
             summaries[leaning] = "No tweets found for this ideological leaning."
-            continue
-            
-        # Use hierarchical batch summarization
-        try:
-            print(f"Generating summary for {leaning} leaning...")
-            summary = batch_summarize_tweets(leaning_tweets, summarizer)
-            summaries[leaning] = summary
-            print(f"Summary generated for {leaning}: {summary[:100]}...")  # Print first 100 chars of summary
-        except Exception as e:
-            print(f"Error generating summary for {leaning}: {str(e)}")
+        elif generated is None:
             summaries[leaning] = "Error generating summary for this ideological leaning."
+        else:
+            summaries[leaning] = generated.get(leaning, "No tweets found for this ideological leaning.")
+            print(f"Summary generated for {leaning}: {summaries[leaning][:100]}...")  # Print first 100 chars of summary
     
-    # Update MongoDB document with summaries
+    # Update MongoDB topic with summaries
     print("\nUpdating MongoDB with generated summaries...")
-    doc['ideological_summaries'] = summaries
-    update_tweets_by_query_id(query_id, doc['tweets'], summaries=summaries)
+    update_topic_summaries(query_id, summaries)
     print("MongoDB update completed")
     
     return summaries
 
+def update_ideological_summaries(query_id, new_tweets_df):
+    """
+    Fold newly added tweets into a topic's stored summaries instead of re-summarizing every tweet:
+    each leaning's previous summary is summarized together with that leaning's new tweets.
+    """
+    topic = get_topic(query_id)
+    previous = (topic or {}).get('ideological_summaries')
+    if not previous:
+        return generate_ideological_summaries(query_id)
+
+    groups = {}
+    for leaning in ['left', 'centre', 'right']:
+        new_tweets = new_tweets_df[new_tweets_df['leaning'].fillna('').str.lower() == leaning]['Content'].tolist()
+        if not new_tweets:
+            continue
+        old_summary = previous.get(leaning, '')
+        has_summary = old_summary and not old_summary.startswith(('No tweets found', 'Error generating'))
+        groups[leaning] = ([old_summary] if has_summary else []) + new_tweets
+    summaries = dict(previous)
+    try:
+        items = sum(len(texts) for texts in groups.values())
+        with span('summarize', items=items), registry.use(SUMMARIZER_MODEL) as summarizer:
+            summaries.update(summarize_groups(groups, summarizer))
+    except Exception as e:
+        print(f"Error updating summaries: {str(e)}")
+    update_topic_summaries(query_id, summaries)
+    return summaries
+
+def run_process_job(job):
+    """Entry point of job queue workers: incremental refresh or full analysis."""
+    if job.params.get('refresh'):
+        return run_refresh_job(job)
+    return run_full_job(job)
+
+def run_full_job(job):
+    """Full analysis chain executed by a job queue worker: pipeline, analytics, Parquet export and summaries."""
+    query_id = process_query_pipeline(job.query, max_tweets=job.params.get('max_tweets', 1000), job=job)
+    if not query_id:
+        return None
+    with _stage(job, 'stats'):
+        refresh_topic_stats(query_id)
+    _enter_stage(job, 'export')
+    _complete_stage(job, export_topic_to_store(query_id, job.query, job_id=job.id))
+    _enter_stage(job, 'summarize')
+    generate_ideological_summaries(query_id)
+    _complete_stage(job)
+    return query_id
+
+def run_refresh_job(job):
+    """Incremental variant of run_process_job; falls back to a full analysis for unknown topics."""
+    if not get_topic_by_query(normalize_query(job.query)):
+        return run_full_job(job)
+    query_id, new_tweets_df = refresh_topic_pipeline(job.query, max_tweets=job.params.get('max_tweets', 1000), job=job)
+    if query_id is None:
+        return None
+    if new_tweets_df is not None and len(new_tweets_df):
+        with _stage(job, 'stats'):
+            refresh_topic_stats(query_id)
+        _enter_stage(job, 'export')
+        _complete_stage(job, export_topic_to_store(query_id, job.query, job_id=job.id))
+        _enter_stage(job, 'summarize')
+        update_ideological_summaries(query_id, new_tweets_df)
+        _complete_stage(job)
+    return query_id
+
+job_queue = JobQueue(
+    run_process_job,
+    max_workers=int(os.environ.get('JOB_WORKERS', 2)),
+    max_pending=int(os.environ.get('JOB_MAX_PENDING', 20)),
+    store=JobStore(jobs_collection)
+)
+
+metrics.register_gauge('jobs', 'Analysis jobs retained by the job queue, by status.', job_queue.counts, label='status')
+
 # Initialize Flask app
 app = Flask(__name__)
 CORS(app)
@@ -273,105 +472,268 @@ def search_topic_endpoint():
         return jsonify({"error": "No query provided"}), 400
         
     result = search_topic(query)
-    # If exact match, return only query_id
-    if result['exact_match']:
-        return jsonify({
-            "query_id": str(result['exact_match']['_id']),
-            "existing": True,
-            "similar_topics": [
-                {"_id": str(t['_id']), "query": t['query']} for t in result['similar_topics']
-            ]
-        })
-    # Otherwise, return only similar topics (no tweets)
-    return jsonify({
-        "similar_topics": [
-            {"_id": str(t['_id']), "query": t['query']} for t in result['similar_topics']
-        ]
-    })
+    return jsonify(_search_topic_payload(result['exact_match'], result['similar_topics']))
 
 @app.route('/api/process', methods=['POST'])
 def process_query_endpoint():
     data = request.get_json()
     query = data.get('query')
     force_new = data.get('forceNew', False)  # Option to force new analysis
+    refresh = data.get('refresh', False)  # Option to only add tweets newer than the stored ones
     
     if not query:
         return jsonify({"error": "No query provided"}), 400
     
-    # Check for existing topics first
-    if not force_new:
-        search_result = search_topic(query)
-        if search_result['exact_match']:
+    # Check for existing topics first. A topic whose analysis is still running (in any worker) is
+    # only partly built, so the request joins that job below instead of returning the topic.
+    if not force_new and not refresh and job_queue.active(normalize_query(query)) is None:
+        exact_match = get_topic_by_query(normalize_query(query))
+        if exact_match and exact_match.get('status', 'complete') == 'complete':
             # Return only query_id if topic exists
             return jsonify({
-                "query_id": str(search_result['exact_match']['_id']),
+                "query_id": str(exact_match['_id']),
                 "existing": True
             })
     
-    # If no exact match or force_new is True, proceed with new analysis
-    query_id = process_query_pipeline(query, max_tweets=1000)
-    export_tweets_to_csv(query_id, query)
-    generate_ideological_summaries(query_id)
-    if not query_id:
-        return jsonify({"error": "Failed to process query"}), 500
+    # Otherwise queue a new analysis (a partial topic left by a failed run is completed by it);
+    # identical queries share one job
+    try:
+        job, created = job_queue.submit(
+            normalize_query(query), query, trace_id=request.headers.get('X-Request-ID'), max_tweets=1000, refresh=refresh
+        )
+    except QueueFull as e:
+        return jsonify({"error": str(e)}), 503
     
-    # Do not send tweets or summaries, just the query_id
+    # Do not send tweets or summaries, just the job handle to poll
     return jsonify({
-        "query_id": query_id,
-        "existing": False
-    })
+        "job_id": job['job_id'],
+        "trace_id": job['trace_id'],
+        "status": job['status'],
+        "existing": False,
+        "deduplicated": not created
+    }), 202, {"X-Trace-Id": job['trace_id']}
 
-@app.route('/api/topics/<query_id>', methods=['GET'])
-def get_topic(query_id):
-    """Get a specific topic by ID."""
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+def get_job_route(job_id):
+    """Poll the status, current stage and progress of a queued analysis (served by any worker)."""
+    status = job_queue.status(job_id)
+    if not status:
+        return jsonify({"error": "Job not found"}), 404
+    return jsonify(status)
+
+@app.route('/api/jobs/<job_id>', methods=['DELETE'])
+def cancel_job_route(job_id):
+    """Cancel a queued or running analysis, also when another worker process runs it."""
+    status = job_queue.cancel_anywhere(job_id)
+    if not status:
+        return jsonify({"error": "Job not found"}), 404
+    return jsonify(status)
+
+def _tweet_query_args(args):
+    """Parse the leaning / relevance filters and sort order shared by the tweet read endpoints."""
+    leaning = args.get('leaning')
+    if leaning and leaning.lower() not in ('left', 'centre', 'right'):
+        raise ValueError("leaning must be one of left, centre, right")
+    relevant_to = args.get('relevant_to')
+    if relevant_to is not None:
+        if not relevant_to.isdigit() or int(relevant_to) > 11:
+            raise ValueError("relevant_to must be an indicator index between 0 and 11")
+    sort = args.get('sort', 'position')
+    if sort not in TWEET_SORTS:
+        raise ValueError(f"sort must be one of {', '.join(TWEET_SORTS)}")
+    return tweet_filters(leaning=leaning, relevant_to=relevant_to), TWEET_SORTS[sort]
+
+def _topic_page_args(args):
+    """(filters, sort, offset, limit) of a topic page request; raises ValueError for invalid arguments."""
+    filters, sort = _tweet_query_args(args)
+    offset = max(int(args.get('offset', 0)), 0)
+    limit = min(max(int(args.get('limit', 100)), 1), 1000)
+    return filters, sort, offset, limit
+
+def _wants_ndjson(req):
+    return req.args.get('format') == 'ndjson' or req.accept_mimetypes.best == 'application/x-ndjson'
+
+def _topic_page_payload(topic, tweets, total, offset, limit):
+    topic['_id'] = str(topic['_id'])
+    topic['tweets'] = tweets
+    return {
+        "topic": topic,
+        "pagination": {
+            "offset": offset,
+            "limit": limit,
+            "total": total,
+            "has_more": offset + len(tweets) < total
+        }
+    }
+
+def _topic_list_limit(args):
     try:
-        topic = get_tweets_by_query_id(query_id)
-        if not topic:
+        return min(max(int(args.get('limit', 20)), 1), 100)
+    except ValueError:
+        raise ValueError("limit must be an integer")
+
+def _stream_tweets_ndjson(query_id, filters, sort):
+    for tweet in iter_topic_tweets(query_id, filters=filters, sort=sort):
+        yield json.dumps(tweet, default=str) + '\n'
+
+def _cached_topic_response(endpoint, query_id, build):
+    """
+    Serve a topic read endpoint through the response cache. build() returns the JSON payload (or
+    None if the topic is gone) and only runs when nothing is cached for the topic's current version.
+    """
+    version = get_topic_version(query_id)
+    if version is None:
+        return jsonify({"error": "Topic not found"}), 404
+    response = TopicResponse(get_response_cache(), endpoint, query_id, version, request.args, request.headers)
+    if response.needs_body:
+        payload = build()
+        if payload is None:
             return jsonify({"error": "Topic not found"}), 404
-            
-        # Convert numeric values in tweets
-        if topic.get('tweets'):
-            for tweet in topic['tweets']:
-                tweet['Comments'] = int(tweet.get('Comments', 0))
-                tweet['Retweets'] = int(tweet.get('Retweets', 0))
-                tweet['Likes'] = int(tweet.get('Likes', 0))
-                
-        topic['_id'] = str(topic['_id'])
-        return jsonify({"topic": topic})
+        response.store(app.json.dumps(payload).encode('utf-8'))
+    status, body, headers = response.render()
+    return Response(body, status=status, headers=headers, mimetype='application/json')
+
+@app.route('/api/topics/<query_id>', methods=['GET'])
+def get_topic_route(query_id):
+    """
+    Get a specific topic by ID with one page of its tweets. Pages are served from the response
+    cache with an ETag (If-None-Match is answered with 304) and gzip/brotli compressed.
+
+    Query params:
+        offset, limit: Page of tweets to return (limit defaults to 100, max 1000)
+        leaning: Only tweets with this leaning (left, centre, right)
+        relevant_to: Only tweets relevant to this indicator index (label_<n> == 1)
+        sort: position (scrape order), engagement, likes, retweets or comments
+        format: 'ndjson' streams every matching tweet, one JSON object per line
+    """
+    try:
+        filters, sort, offset, limit = _topic_page_args(request.args)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    try:
+        if _wants_ndjson(request):
+            if get_topic_version(query_id) is None:
+                return jsonify({"error": "Topic not found"}), 404
+            return Response(
+                stream_with_context(_stream_tweets_ndjson(query_id, filters, sort)),
+                mimetype='application/x-ndjson'
+            )
+
+        def build():
+            topic = get_topic(query_id)
+            if not topic:
+                return None
+            total = count_topic_tweets(query_id, filters)
+            tweets = get_topic_tweets(query_id, skip=offset, limit=limit, filters=filters, sort=sort)
+            return _topic_page_payload(topic, tweets, total, offset, limit)
+
+        return _cached_topic_response('topic', query_id, build)
     except Exception as e:
         logger.error(f"Error fetching topic {query_id}: {e}")
         return jsonify({"error": "Failed to fetch topic"}), 500
 
+@app.route('/api/topics/<query_id>/stats', methods=['GET'])
+def get_topic_stats_route(query_id):
+    """
+    Precomputed analytics of a topic: leaning counts, engagement-weighted leaning, hourly/daily
+    leaning time series, top hashtags and mentions per leaning and the verified/unverified split.
+    """
+    def build():
+        stats = get_topic_stats(query_id)
+        return None if stats is None else {"query_id": query_id, "stats": stats}
+
+    try:
+        return _cached_topic_response('stats', query_id, build)
+    except Exception as e:
+        logger.error(f"Error fetching stats for topic {query_id}: {e}")
+        return jsonify({"error": "Failed to fetch topic stats"}), 500
+
 @app.route('/api/topics', methods=['GET'])
 def get_topics_route():
-    """Get all analyzed topics."""
+    """
+    List analyzed topics (metadata, counts, leaning distribution and summaries only).
+
+    Query params: limit (default 20, max 100) and cursor (the previous page's next_cursor).
+    """
     try:
-        topics = get_all_topics()
-        # Convert numbers and clean up tweets data
-        cleaned_topics = []
-        for topic in topics:
-            # Ensure _id is a string
-            topic['_id'] = str(topic['_id'])
-            
-            # Clean up tweets data
-            if 'tweets' in topic and topic['tweets']:
-                for tweet in topic['tweets']:
-                    try:
-                        tweet['Comments'] = int(tweet.get('Comments', 0))
-                        tweet['Retweets'] = int(tweet.get('Retweets', 0))
-                        tweet['Likes'] = int(tweet.get('Likes', 0))
-                    except (ValueError, TypeError):
-                        tweet['Comments'] = 0
-                        tweet['Retweets'] = 0
-                        tweet['Likes'] = 0
-            
-            cleaned_topics.append(topic)
-        
-        return jsonify({"topics": cleaned_topics})
+        limit = _topic_list_limit(request.args)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    try:
+        topics, next_cursor = list_topics(limit=limit, cursor=request.args.get('cursor'))
+        return jsonify({"topics": topics, "next_cursor": next_cursor})
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         logger.error(f"Error fetching topics: {e}")
         return jsonify({"error": "Failed to fetch topics"}), 500
 
+@app.route('/healthz', methods=['GET'])
+def healthz_route():
+    """Liveness: the process is up and serving requests."""
+    return jsonify({"status": "ok", "pid": os.getpid()})
+
+@app.route('/readyz', methods=['GET'])
+def readyz_route():
+    """
+    Readiness: MongoDB answers and the models in READY_MODELS (comma-separated; by default the
+    ones preloaded by wsgi.py) are loaded. Returns 503 until then, with the state of every model.
+    """
+    models = {name: registry.is_loaded(name) for name in registry.names()}
+    required = [name for name in READY_MODELS if name in models]
+    mongo = ping()
+    ready = mongo and all(models[name] for name in required)
+    body = {"ready": ready, "mongo": mongo, "models": models, "required_models": required, "pid": os.getpid()}
+    return jsonify(body), 200 if ready else 503
+
+@app.route('/metrics', methods=['GET'])
+def metrics_route():
+    """Per-stage span durations, item counts, throughput and peak RSS in the Prometheus text format."""
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/api/models', methods=['GET'])
+def get_models_route():
+    """Report load state, load time and memory footprint of every registered model."""
+    return jsonify({"models": registry.stats()})
+
+@app.route('/api/cache', methods=['GET'])
+def get_cache_route():
+    """Report size and hit rate of the prediction cache, the in-process token cache and the response cache."""
+    return jsonify({
+        "prediction_cache": get_prediction_cache().stats(),
+        "token_cache": token_cache.stats(),
+        "response_cache": get_response_cache().stats()
+    })
+
+@app.route('/api/browsers', methods=['GET'])
+def get_browsers_route():
+    """Report the scraper's browser session pool (open/idle browsers, logins, recycled sessions)."""
+    return jsonify(get_browser_pool(SCRAPER_USERNAME, SCRAPER_PASSWORD).stats())
+
+@app.route('/api/models/<name>/<action>', methods=['POST'])
+def manage_model_route(name, action):
+    """Explicitly load, unload or reload a registered model."""
+    if name not in registry.names():
+        return jsonify({"error": f"Unknown model: {name}"}), 404
+    if action == 'load':
+        registry.get(name)
+    elif action == 'unload':
+        registry.unload(name)
+    elif action == 'reload':
+        registry.reload(name)
+    else:
+        return jsonify({"error": f"Unknown action: {action}"}), 400
+    return jsonify({"model": name, **registry.stats()[name]})
+
 if __name__ == '__main__':
-    # No need to preload any model now
-    app.run(host='localhost', port=5500, debug=True)
+    # Set PRELOAD_MODELS=1 to load every model before serving instead of on first use
+    if os.environ.get('PRELOAD_MODELS') == '1':
+        registry.warm_up()
+    # Set PRELOAD_BROWSERS=1 to start and log in the scraper browsers before serving
+    if os.environ.get('PRELOAD_BROWSERS') == '1':
+        get_browser_pool(SCRAPER_USERNAME, SCRAPER_PASSWORD).warm_up()
+    atexit.register(close_browser_pools)
+    # Development server only; production runs wsgi.py under gunicorn (see gunicorn.conf.py).
+    # The reloader ignores site-packages, so installing packages no longer restarts the process.
+    debug = os.environ.get('FLASK_DEBUG', '1') == '1'
+    app.run(host='localhost', port=int(os.environ.get('PORT', 5500)), debug=debug, exclude_patterns=['*/site-packages/*'])
@@ -0,0 +1,115 @@
+import contextvars
+import logging
+import os
+import queue
+import threading
+import time
+from metrics import Cancelled
+
+logger = logging.getLogger(__name__)
+
+# Tweets classified per micro-batch, tweets buffered between scraper and classifier, and the
+# longest a partial batch waits for more tweets before it is classified anyway
+STREAM_BATCH_SIZE = int(os.environ.get('STREAM_BATCH_SIZE', 64))
+STREAM_QUEUE_SIZE = int(os.environ.get('STREAM_QUEUE_SIZE', 512))
+STREAM_BATCH_WAIT = float(os.environ.get('STREAM_BATCH_WAIT', 2.0))
+# Seconds between should_stop() checks while no batch is ready (e.g. during a slow scrape)
+STOP_CHECK_INTERVAL = 1.0
+
+_DONE = object()
+
+
+class StreamStopped(Cancelled):
+    """Raised in the scraper thread when the consumer stopped, so the scrape ends early (not a scrape failure)."""
+
+
+def stream_pipeline(scrape, process_batch, batch_size=None, queue_size=None, batch_wait=None, should_stop=None):
+    """
+    Run a scraper and a batch consumer concurrently.
+
+    scrape(on_tweets) runs in a producer thread and hands tweets to on_tweets as it scrapes them;
+    they pass through a bounded queue (so a slow consumer throttles the scraper) and are given to
+    process_batch(tweets, start_position) in micro-batches of up to batch_size, on the calling thread.
+    A partial batch is processed once no tweet arrived for batch_wait seconds. Tweets are
+    deduplicated by Tweet ID across batches.
+
+    should_stop() is checked before each batch and every STOP_CHECK_INTERVAL seconds while the
+    consumer waits for tweets; it may raise (e.g. JobCancelled) to abort the run, which also stops
+    the scraper.
+
+    Returns:
+        int: number of tweets processed
+    """
+    batch_size = batch_size or STREAM_BATCH_SIZE
+    batch_wait = batch_wait or STREAM_BATCH_WAIT
+    tweets_queue = queue.Queue(maxsize=queue_size or STREAM_QUEUE_SIZE)
+    stopped = threading.Event()
+    failure = []
+
+    def on_tweets(tweets):
+        for tweet in tweets:
+            while True:
+                if stopped.is_set():
+                    raise StreamStopped()
+                try:
+                    tweets_queue.put(tweet, timeout=0.5)
+                    break
+                except queue.Full:
+                    continue
+
+    def produce():
+        try:
+            scrape(on_tweets)
+        except StreamStopped:
+            pass
+        except Exception as e:
+            failure.append(e)
+        finally:
+            while True:
+                try:
+                    tweets_queue.put(_DONE, timeout=0.5)
+                    break
+                except queue.Full:
+                    if stopped.is_set():
+                        break
+
+    # The scraper thread runs in a copy of the caller's context, so its spans and logs keep the trace id
+    producer = threading.Thread(target=contextvars.copy_context().run, args=(produce,), name='stream-scrape', daemon=True)
+    producer.start()
+    seen = set()
+    batch = []
+    processed = 0
+    last_arrival = last_stop_check = time.monotonic()
+    try:
+        while True:
+            try:
+                tweet = tweets_queue.get(timeout=0.1)
+            except queue.Empty:
+                tweet = None
+                if should_stop is not None and time.monotonic() - last_stop_check >= STOP_CHECK_INTERVAL:
+                    last_stop_check = time.monotonic()
+                    should_stop()
+            finished = tweet is _DONE
+            if tweet is not None and not finished:
+                last_arrival = time.monotonic()
+                key = str(tweet.get('Tweet ID') or '') or f"local-{processed + len(batch)}"
+                if key not in seen:
+                    seen.add(key)
+                    batch.append(tweet)
+            idle = time.monotonic() - last_arrival >= batch_wait
+            if batch and (finished or len(batch) >= batch_size or idle):
+                if should_stop is not None:
+                    should_stop()
+                process_batch(batch, processed)
+                processed += len(batch)
+                batch = []
+            if finished:
+                break
+    finally:
+        stopped.set()
+        producer.join(timeout=5)
+    if failure:
+        if not processed:
+            raise failure[0]
+        logger.warning(f"Scrape failed after {processed} tweets; keeping the partial result: {failure[0]}")
+    return processed
@@ -0,0 +1,122 @@
+import os
+from preprocess import token_cache
+from dedup import near_duplicate_groups, dedupe_key
+
+# Input budget per chunk (distilbart accepts 1024 tokens) and pipeline batch size per forward pass
+SUMMARY_CHUNK_TOKENS = int(os.environ.get('SUMMARY_CHUNK_TOKENS', 800))
+SUMMARY_BATCH_SIZE = int(os.environ.get('SUMMARY_BATCH_SIZE', 8))
+# Levels of the reduction tree before the remaining summaries are merged in one final pass
+SUMMARY_MAX_DEPTH = int(os.environ.get('SUMMARY_MAX_DEPTH', 3))
+SUMMARY_KWARGS = {'max_length': 150, 'min_length': 20, 'do_sample': False, 'truncation': True}
+
+
+def dedupe_texts(texts):
+    """
+    Keep one text per group of near-identical texts (see dedup.near_duplicate_groups), dropping
+    texts with nothing left once mentions and links are stripped. A non-empty input always keeps
+    at least its first text, so a group of only mentions or links is still summarized.
+    """
+    groups = near_duplicate_groups(texts)
+    kept = [text for i, text in enumerate(texts) if groups[i] == i and dedupe_key(text)]
+    return kept or list(texts[:1])
+
+
+def _token_counts(texts, tokenizer):
+    if tokenizer is None:
+        # Rough estimate of tokens (words + some extra for special tokens)
+        return [len(text.split()) + 10 for text in texts]
+    encodings = token_cache.encode(tokenizer, list(texts), None, add_special_tokens=False)
+    return [len(encoding['input_ids']) + 1 for encoding in encodings]
+
+
+def chunk_text(texts, max_tokens=SUMMARY_CHUNK_TOKENS, tokenizer=None, max_items=None):
+    """
+    Split list of texts into chunks that won't exceed token limit.
+
+    Token counts come from the tokenizer when given, else from a word-count estimate.
+    max_items optionally caps the number of texts per chunk.
+    """
+    chunks = []
+    current_chunk = []
+    current_length = 0
+
+    for text, tokens in zip(texts, _token_counts(texts, tokenizer)):
+        full = current_length + tokens > max_tokens or (max_items and len(current_chunk) >= max_items)
+        if full:
+            if current_chunk:  # Save current chunk if not empty
+                chunks.append(" ".join(current_chunk))
+            current_chunk = [text]
+            current_length = tokens
+        else:
+            current_chunk.append(text)
+            current_length += tokens
+
+    if current_chunk:  # Add the last chunk
+        chunks.append(" ".join(current_chunk))
+
+    return chunks
+
+
+def _summarize_chunks(chunks, summarizer):
+    """Summarize many chunks with batched pipeline calls; failed chunks fall back to their opening text."""
+    if not chunks:
+        return []
+    try:
+        outputs = summarizer(chunks, batch_size=SUMMARY_BATCH_SIZE, **SUMMARY_KWARGS)
+        return [output['summary_text'] if isinstance(output, dict) else output[0]['summary_text'] for output in outputs]
+    except Exception as e:
+        print(f"Error summarizing batch of {len(chunks)} chunks: {e}")
+    summaries = []
+    for chunk in chunks:
+        try:
+            summaries.append(summarizer(chunk, **SUMMARY_KWARGS)[0]['summary_text'])
+        except Exception as e:
+            print(f"Error summarizing chunk: {e}")
+            # If error occurs, keep the start of the chunk as a sample
+            summaries.append(" ".join(chunk.split()[:60]) + "...")
+    return summaries
+
+
+def summarize_groups(groups, summarizer, max_depth=SUMMARY_MAX_DEPTH, max_tokens=SUMMARY_CHUNK_TOKENS,
+                     max_batch_size=None, dedupe=True):
+    """
+    Hierarchically summarize several groups of texts (e.g. one per leaning) together.
+
+    At every level of the reduction tree, each unfinished group is split into token-sized chunks
+    and the chunks of all groups are sent to the pipeline in shared batches, so the groups
+    progress concurrently. A group is finished once it is reduced to a single summary. At
+    max_depth, the remaining summaries are joined and summarized once more, which truncates them
+    to the model's input size.
+
+    Returns:
+        dict: group name -> summary (groups with no texts are omitted)
+    """
+    tokenizer = getattr(summarizer, 'tokenizer', None)
+    current = {name: dedupe_texts(texts) if dedupe else list(texts) for name, texts in groups.items()}
+    current = {name: texts for name, texts in current.items() if texts}
+    depth = 0
+    while any(len(texts) > 1 for texts in current.values()):
+        depth += 1
+        final_level = depth >= max_depth
+        pending = {}
+        for name, texts in current.items():
+            if len(texts) <= 1:
+                continue
+            if final_level:
+                pending[name] = [" ".join(texts)]
+            else:
+                pending[name] = chunk_text(texts, max_tokens=max_tokens, tokenizer=tokenizer, max_items=max_batch_size)
+        flat = [chunk for chunks in pending.values() for chunk in chunks]
+        summaries = iter(_summarize_chunks(flat, summarizer))
+        for name, chunks in pending.items():
+            current[name] = [next(summaries) for _ in chunks]
+    return {name: texts[0] for name, texts in current.items()}
+
+
+def batch_summarize_tweets(tweets, summarizer, max_batch_size=None, max_depth=SUMMARY_MAX_DEPTH):
+    """
+    Hierarchically summarize tweets by processing them in token-sized batches and recursively summarizing
+    until reaching a single summary.
+    """
+    summaries = summarize_groups({'all': tweets}, summarizer, max_depth=max_depth, max_batch_size=max_batch_size)
+    return summaries.get('all', "No summary generated.")
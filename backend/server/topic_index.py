@@ -0,0 +1,339 @@
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+from contextlib import contextmanager
+import numpy as np
+from model_registry import registry
+
+try:
+    import faiss
+except ImportError:
+    faiss = None
+
+try:
+    import fcntl
+except ImportError:
+    # Windows: no lock between processes, so run a single server process there
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+TOPIC_EMBEDDER = 'topic_embedder'
+# Sentence embedding model for topics; 'hashing' selects the dependency-free hashed n-gram embedder
+TOPIC_EMBEDDING_MODEL = os.environ.get('TOPIC_EMBEDDING_MODEL', 'sentence-transformers/all-MiniLM-L6-v2')
+TOPIC_INDEX_DIR = os.environ.get('TOPIC_INDEX_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'cache', 'topic_index'))
+# Tweets embedded per topic, and the weight of the query text against their mean
+TOPIC_INDEX_SAMPLE = int(os.environ.get('TOPIC_INDEX_SAMPLE', 20))
+QUERY_WEIGHT = 0.6
+HASHING_DIM = 512
+
+_TOKEN = re.compile(r'[a-z0-9]+')
+
+
+def _normalize_rows(vectors):
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.where(norms == 0, 1, norms)
+
+
+class HashingEmbedder:
+    """Hashed word unigram/bigram and character trigram features; no model download, ~0.1 ms per text."""
+
+    name = f'hashing-{HASHING_DIM}'
+
+    @staticmethod
+    def _features(text):
+        words = _TOKEN.findall(text.lower().replace('_', ' '))
+        features = list(words)
+        features += [f'{a} {b}' for a, b in zip(words, words[1:])]
+        for word in words:
+            padded = f'#{word}#'
+            features += [padded[i:i + 3] for i in range(len(padded) - 2)]
+        return features
+
+    def encode(self, texts):
+        vectors = np.zeros((len(texts), HASHING_DIM), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for feature in self._features(text):
+                digest = int.from_bytes(hashlib.blake2b(feature.encode('utf-8'), digest_size=8).digest(), 'big')
+                vectors[row, digest % HASHING_DIM] += 1.0 if (digest >> 63) else -1.0
+        return _normalize_rows(vectors)
+
+
+class TransformerEmbedder:
+    """Mean-pooled sentence embeddings from a Hugging Face encoder."""
+
+    def __init__(self, model_name):
+        import torch
+        from transformers import AutoModel, AutoTokenizer
+        self.torch = torch
+        self.name = model_name
+        self.tokenizer = AutoTokenizer.from_pretrained(model_name)
+        self.model = AutoModel.from_pretrained(model_name)
+        self.model.eval()
+
+    def encode(self, texts, batch_size=64):
+        outputs = []
+        for start in range(0, len(texts), batch_size):
+            batch = [text.replace('_', ' ') for text in texts[start:start + batch_size]]
+            encoded = self.tokenizer(batch, padding=True, truncation=True, max_length=128, return_tensors='pt')
+            with self.torch.no_grad():
+                hidden = self.model(**encoded).last_hidden_state
+            mask = encoded['attention_mask'].unsqueeze(-1).float()
+            outputs.append(((hidden * mask).sum(1) / mask.sum(1).clamp(min=1)).numpy())
+        if not outputs:
+            return np.zeros((0, 0), dtype=np.float32)
+        return _normalize_rows(np.concatenate(outputs).astype(np.float32))
+
+
+def load_topic_embedder():
+    if TOPIC_EMBEDDING_MODEL == 'hashing':
+        return HashingEmbedder()
+    try:
+        return TransformerEmbedder(TOPIC_EMBEDDING_MODEL)
+    except (ImportError, OSError) as e:
+        logger.warning(f"Topic embedding model {TOPIC_EMBEDDING_MODEL} unavailable ({e}); using hashed n-gram embeddings")
+        return HashingEmbedder()
+
+registry.register(TOPIC_EMBEDDER, load_topic_embedder)
+
+
+class TopicIndex:
+    """
+    Embedding index of topics, persisted as one file (index.npz) under TOPIC_INDEX_DIR and shared
+    by every server worker process.
+
+    Each topic is embedded from its query and a sample of its tweets. Vectors are L2-normalized,
+    so the score is cosine similarity. Search runs on FAISS (inner product) when it is installed
+    and on a NumPy matrix product otherwise. The stored index is discarded when the embedder
+    changes (see its `embedder` field).
+
+    Writers take an exclusive file lock, reload the file if another process replaced it, apply
+    their change and atomically replace the file; readers reload it whenever it was replaced, so
+    a topic indexed by one worker is found by the others on their next search.
+    """
+
+    def __init__(self, path=TOPIC_INDEX_DIR):
+        self.path = path
+        self.ids = []
+        self.vectors = None
+        self.embedder_name = None
+        self._positions = {}
+        self._faiss = None
+        self._loaded = False
+        # (inode, mtime, size) of the index file as last read or written by this process
+        self._stamp = None
+        self._lock = threading.RLock()
+
+    def _file(self):
+        return os.path.join(self.path, 'index.npz')
+
+    def _stat(self):
+        try:
+            stat = os.stat(self._file())
+        except OSError:
+            return None
+        return stat.st_ino, stat.st_mtime_ns, stat.st_size
+
+    @contextmanager
+    def _file_lock(self):
+        """Serializes read-modify-write of the index file between threads and worker processes."""
+        with self._lock:
+            if fcntl is None:
+                yield
+                return
+            os.makedirs(self.path, exist_ok=True)
+            with open(os.path.join(self.path, 'index.lock'), 'a') as lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _sync(self, embedder):
+        """(Re)load the index file unless it is unchanged since this process last read or wrote it."""
+        self.embedder_name = embedder.name
+        stamp = self._stat()
+        if self._loaded and stamp == self._stamp:
+            return
+        self._loaded = True
+        self._stamp = stamp
+        self.ids, self._positions, self.vectors, self._faiss = [], {}, None, None
+        if stamp is None:
+            return
+        try:
+            with np.load(self._file(), allow_pickle=False) as data:
+                if str(data['embedder']) != embedder.name:
+                    logger.info(f"Topic index was built with {data['embedder']}; it will be rebuilt")
+                    return
+                self.vectors = data['vectors']
+                self.ids = [str(topic_id) for topic_id in data['ids']]
+        except (OSError, ValueError, KeyError):
+            return
+        self._positions = {topic_id: i for i, topic_id in enumerate(self.ids)}
+
+    def _save(self):
+        os.makedirs(self.path, exist_ok=True)
+        tmp_path = f'{self._file()}.{os.getpid()}.tmp'
+        with open(tmp_path, 'wb') as index_file:
+            np.savez(
+                index_file,
+                vectors=self.vectors if self.vectors is not None else np.zeros((0, 0), dtype=np.float32),
+                ids=np.array(self.ids, dtype=str),
+                embedder=np.array(self.embedder_name or '')
+            )
+        os.replace(tmp_path, self._file())
+        self._stamp = self._stat()
+        self._faiss = None
+
+    def _search_backend(self):
+        if faiss is None:
+            return None
+        if self._faiss is None:
+            index = faiss.IndexFlatIP(self.vectors.shape[1])
+            index.add(np.ascontiguousarray(self.vectors, dtype=np.float32))
+            self._faiss = index
+        return self._faiss
+
+    @staticmethod
+    def _embed_topics(embedder, topics):
+        """One vector per (query, texts) pair: the weighted query embedding plus the mean tweet embedding."""
+        queries = embedder.encode([query for query, _ in topics])
+        samples = [list(texts)[:TOPIC_INDEX_SAMPLE] for _, texts in topics]
+        flat = [text for sample in samples for text in sample]
+        tweet_vectors = embedder.encode(flat) if flat else None
+        vectors = []
+        start = 0
+        for query_vector, sample in zip(queries, samples):
+            if sample:
+                mean = tweet_vectors[start:start + len(sample)].mean(axis=0)
+                start += len(sample)
+                vectors.append(QUERY_WEIGHT * query_vector + (1 - QUERY_WEIGHT) * mean)
+            else:
+                vectors.append(query_vector)
+        return _normalize_rows(np.array(vectors, dtype=np.float32))
+
+    @staticmethod
+    def _clean(topics):
+        return [(str(topic_id), query, [str(t) for t in texts if t]) for topic_id, query, texts in topics]
+
+    def _replace(self, embedder, topics):
+        """Replace the whole index with the given cleaned topics and write it (file lock held)."""
+        self.embedder_name = embedder.name
+        self.ids = [topic_id for topic_id, _, _ in topics]
+        self._positions = {topic_id: i for i, topic_id in enumerate(self.ids)}
+        self.vectors = self._embed_topics(embedder, [(query, texts) for _, query, texts in topics]) if topics else None
+        self._loaded = True
+        self._save()
+
+    def upsert(self, topic_id, query, texts=()):
+        """Add or re-embed one topic and persist the index."""
+        self.upsert_many([(topic_id, query, texts)])
+
+    def upsert_many(self, topics):
+        topics = self._clean(topics)
+        if not topics:
+            return
+        with registry.use(TOPIC_EMBEDDER) as embedder:
+            vectors = self._embed_topics(embedder, [(query, texts) for _, query, texts in topics])
+            with self._file_lock():
+                # Merge into the latest stored index, which other workers may have changed
+                self._sync(embedder)
+                for (topic_id, _, _), vector in zip(topics, vectors):
+                    position = self._positions.get(topic_id)
+                    if self.vectors is None or self.vectors.shape[1] != vector.shape[0]:
+                        self.ids, self._positions = [], {}
+                        self.vectors = np.zeros((0, vector.shape[0]), dtype=np.float32)
+                        position = None
+                    if position is None:
+                        self._positions[topic_id] = len(self.ids)
+                        self.ids.append(topic_id)
+                        self.vectors = np.vstack([self.vectors, vector[None, :]])
+                    else:
+                        self.vectors[position] = vector
+                self._save()
+
+    def rebuild(self, topics):
+        """Replace the index with the given (topic_id, query, texts) topics."""
+        topics = self._clean(topics)
+        with registry.use(TOPIC_EMBEDDER) as embedder:
+            with self._file_lock():
+                self._replace(embedder, topics)
+
+    def refresh(self, topic_ids, load_topics):
+        """
+        Bring the stored index in line with the given set of stored topic ids: topics no longer
+        stored are dropped and missing ones are embedded from load_topics(missing_ids) (an iterable
+        of (topic_id, query, texts)). Runs under the file lock, so workers starting together sync
+        it once.
+
+        Returns:
+            Optional[Tuple[int, int]]: (topics added, topics removed), None if the index was in sync
+        """
+        topic_ids = {str(topic_id) for topic_id in topic_ids}
+        with registry.use(TOPIC_EMBEDDER) as embedder:
+            with self._file_lock():
+                self._sync(embedder)
+                stale = [topic_id for topic_id in self.ids if topic_id not in topic_ids]
+                missing = topic_ids.difference(self.ids)
+                if not stale and not missing:
+                    return None
+                keep = [position for position, topic_id in enumerate(self.ids) if topic_id in topic_ids]
+                added = self._clean(load_topics(missing)) if missing else []
+                vectors = [self.vectors[keep]] if keep else []
+                if added:
+                    vectors.append(self._embed_topics(embedder, [(query, texts) for _, query, texts in added]))
+                if any(v.shape[1] != vectors[0].shape[1] for v in vectors):
+                    # Stored vectors of another dimension: re-embed everything
+                    self._replace(embedder, self._clean(load_topics(topic_ids)))
+                    return len(topic_ids), len(stale)
+                self.ids = [self.ids[position] for position in keep] + [topic_id for topic_id, _, _ in added]
+                self._positions = {topic_id: i for i, topic_id in enumerate(self.ids)}
+                self.vectors = np.vstack(vectors) if vectors else None
+                self._save()
+                return len(added), len(stale)
+
+    def remove(self, topic_id):
+        with registry.use(TOPIC_EMBEDDER) as embedder:
+            with self._file_lock():
+                self._sync(embedder)
+                position = self._positions.pop(str(topic_id), None)
+                if position is None:
+                    return
+                del self.ids[position]
+                self.vectors = np.delete(self.vectors, position, axis=0)
+                self._positions = {topic_id: i for i, topic_id in enumerate(self.ids)}
+                self._save()
+
+    def search(self, query, k=5):
+        """Top-k topics for a free-text query as [(topic_id, cosine score)], best first."""
+        with registry.use(TOPIC_EMBEDDER) as embedder:
+            vector = embedder.encode([query])
+            with self._lock:
+                self._sync(embedder)
+                if self.vectors is None or not len(self.ids) or self.vectors.shape[1] != vector.shape[1]:
+                    return []
+                k = min(k, len(self.ids))
+                backend = self._search_backend()
+                if backend is not None:
+                    scores, positions = backend.search(vector, k)
+                    return [(self.ids[p], float(s)) for s, p in zip(scores[0], positions[0]) if p >= 0]
+                scores = self.vectors @ vector[0]
+                best = np.argsort(-scores)[:k]
+                return [(self.ids[p], float(scores[p])) for p in best]
+
+    def size(self):
+        with self._lock:
+            return len(self.ids)
+
+    def load(self):
+        """Load the persisted index (and the embedder) ahead of the first search."""
+        with registry.use(TOPIC_EMBEDDER) as embedder:
+            with self._lock:
+                self._sync(embedder)
+        return self.size()
+
+
+topic_index = TopicIndex()
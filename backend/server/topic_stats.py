@@ -0,0 +1,166 @@
+import logging
+import os
+from datetime import datetime
+from db import topics_collection, tweets_collection, _to_object_id, LEANINGS
+
+logger = logging.getLogger(__name__)
+
+# Hashtags and mentions kept per leaning
+TOP_TERMS = int(os.environ.get('TOPIC_STATS_TOP_TERMS', 10))
+UNASSIGNED = 'unassigned'
+# Sign of each leaning in the bias score: -1 is all left, +1 all right
+LEANING_SIGN = {'left': -1, 'centre': 0, 'right': 1}
+# Timestamp prefix lengths of the ISO strings the scraper stores ('2025-05-07T02:53:39.000Z')
+BUCKET_PREFIX = {'hourly': 13, 'daily': 10}
+
+
+def _leaning(value):
+    value = str(value or '').lower()
+    return value if value in LEANINGS else UNASSIGNED
+
+
+def _empty_counts():
+    return {leaning: 0 for leaning in LEANINGS + (UNASSIGNED,)}
+
+
+def _is_verified(value):
+    if isinstance(value, str):
+        return value.strip().lower() == 'true'
+    return bool(value)
+
+
+def _bias(weights):
+    """Mean leaning sign (-1 left .. +1 right) over the assigned tweets, weighted as given."""
+    total = sum(weights.get(leaning, 0) for leaning in LEANINGS)
+    if not total:
+        return None
+    return round(sum(LEANING_SIGN[leaning] * weights.get(leaning, 0) for leaning in LEANINGS) / total, 4)
+
+
+def _bucket_stage(length):
+    return [
+        {'$match': {'Timestamp': {'$type': 'string'}}},
+        {'$group': {
+            # Timestamps are ASCII, so the byte-based $substr is exact
+            '_id': {'bucket': {'$substr': ['$Timestamp', 0, length]}, 'leaning': '$leaning'},
+            'count': {'$sum': 1}
+        }}
+    ]
+
+
+def _terms_stage(field):
+    return [
+        {'$unwind': f'${field}'},
+        {'$match': {field: {'$type': 'string', '$ne': ''}}},
+        {'$group': {'_id': {'term': {'$toLower': f'${field}'}, 'leaning': '$leaning'}, 'count': {'$sum': 1}}},
+        {'$sort': {'count': -1, '_id.term': 1}}
+    ]
+
+
+def _stats_pipeline(oid):
+    return [
+        {'$match': {'query_id': oid}},
+        {'$facet': {
+            'leanings': [{'$group': {
+                '_id': '$leaning',
+                'count': {'$sum': 1},
+                'likes': {'$sum': '$Likes'},
+                'retweets': {'$sum': '$Retweets'},
+                'comments': {'$sum': '$Comments'}
+            }}],
+            'verified': [{'$group': {'_id': {'verified': '$Verified', 'leaning': '$leaning'}, 'count': {'$sum': 1}}}],
+            'hourly': _bucket_stage(BUCKET_PREFIX['hourly']),
+            'daily': _bucket_stage(BUCKET_PREFIX['daily']),
+            'hashtags': _terms_stage('Tags'),
+            'mentions': _terms_stage('Mentions')
+        }}
+    ]
+
+
+def _series(groups, suffix):
+    buckets = {}
+    for group in groups:
+        key = group['_id']
+        counts = buckets.setdefault(key['bucket'] + suffix, _empty_counts())
+        counts[_leaning(key.get('leaning'))] += group['count']
+    return [dict(bucket=bucket, **counts) for bucket, counts in sorted(buckets.items())]
+
+
+def _top_terms(groups):
+    top = {leaning: {} for leaning in LEANINGS + (UNASSIGNED,)}
+    for group in groups:
+        terms = top[_leaning(group['_id'].get('leaning'))]
+        term = group['_id']['term']
+        terms[term] = terms.get(term, 0) + group['count']
+    return {
+        leaning: [{'term': term, 'count': count}
+                  for term, count in sorted(terms.items(), key=lambda item: (-item[1], item[0]))[:TOP_TERMS]]
+        for leaning, terms in top.items()
+    }
+
+
+def compute_topic_stats(query_id):
+    """
+    Analytics rollups of a topic, computed server-side in one aggregation over its tweet documents.
+
+    Returns a dict with leaning counts, engagement totals and the engagement-weighted bias
+    (each tweet weighted by 1 + Likes + Retweets), hourly and daily leaning time series,
+    top hashtags and mentions per leaning, and leaning counts of verified vs. unverified authors.
+    """
+    oid = _to_object_id(query_id)
+    facets = next(tweets_collection.aggregate(_stats_pipeline(oid)), {})
+
+    counts = _empty_counts()
+    engagement = {leaning: {'likes': 0, 'retweets': 0, 'comments': 0} for leaning in counts}
+    for group in facets.get('leanings', []):
+        leaning = _leaning(group['_id'])
+        counts[leaning] += group['count']
+        for field in ('likes', 'retweets', 'comments'):
+            engagement[leaning][field] += group[field] or 0
+    weights = {leaning: counts[leaning] + engagement[leaning]['likes'] + engagement[leaning]['retweets']
+               for leaning in counts}
+    weight_total = sum(weights[leaning] for leaning in LEANINGS)
+
+    verified = {'verified': _empty_counts(), 'unverified': _empty_counts()}
+    for group in facets.get('verified', []):
+        split = 'verified' if _is_verified(group['_id'].get('verified')) else 'unverified'
+        verified[split][_leaning(group['_id'].get('leaning'))] += group['count']
+
+    return {
+        'tweet_count': sum(counts.values()),
+        'leaning_counts': counts,
+        'engagement': engagement,
+        'engagement_weighted_distribution': {
+            leaning: round(weights[leaning] / weight_total, 4) if weight_total else 0.0 for leaning in LEANINGS
+        },
+        'bias': _bias(counts),
+        'engagement_weighted_bias': _bias(weights),
+        'time_series': {
+            'hourly': _series(facets.get('hourly', []), ':00Z'),
+            'daily': _series(facets.get('daily', []), '')
+        },
+        'top_hashtags': _top_terms(facets.get('hashtags', [])),
+        'top_mentions': _top_terms(facets.get('mentions', [])),
+        'verified': verified
+    }
+
+
+def refresh_topic_stats(query_id):
+    """Recompute a topic's analytics after its predictions changed and store them on the topic as `stats`."""
+    oid = _to_object_id(query_id)
+    stats = compute_topic_stats(oid)
+    stats['computed_at'] = datetime.utcnow()
+    topics_collection.update_one({'_id': oid}, {'$set': {'stats': stats}, '$inc': {'version': 1}})
+    logger.info(f"Stored analytics for topic {query_id} ({stats['tweet_count']} tweets)")
+    return stats
+
+
+def get_topic_stats(query_id):
+    """Stored analytics of a topic; computed and stored on first request for topics analysed before they existed."""
+    oid = _to_object_id(query_id)
+    if oid is None:
+        return None
+    topic = topics_collection.find_one({'_id': oid}, {'stats': 1})
+    if topic is None:
+        return None
+    return topic.get('stats') or refresh_topic_stats(oid)
@@ -0,0 +1,42 @@
+"""
+Production entry point: `gunicorn -c gunicorn.conf.py wsgi:app` (from backend/server).
+
+With preload_app (see gunicorn.conf.py) this module is imported once in the gunicorn master.
+Models are loaded here, before the workers are forked, so every worker shares their weights
+copy-on-write instead of loading its own copy; gc.freeze() then moves everything allocated so far
+out of the collector's reach, so garbage collection in the workers does not write to (and copy)
+those pages.
+
+PRELOAD_MODELS selects what is loaded: 'all' (default), '0' for nothing, or a comma-separated
+list of registry names (relevance, ideology, summarizer, topic_embedder). Unless READY_MODELS is
+set, /readyz reports ready once the preloaded models are loaded.
+"""
+import gc
+import logging
+import os
+from server import app, registry, READY_MODELS
+
+logger = logging.getLogger(__name__)
+
+
+def preload_models():
+    setting = os.environ.get('PRELOAD_MODELS', 'all')
+    if setting == '0':
+        return []
+    names = registry.names() if setting in ('1', 'all') else [name.strip() for name in setting.split(',') if name.strip()]
+    for name in names:
+        try:
+            registry.get(name)
+        except Exception as e:
+            # Keep serving; /readyz reports the model as not loaded
+            logger.error(f"Could not preload model '{name}': {e}", exc_info=True)
+    return names
+
+
+preloaded = preload_models()
+if not READY_MODELS:
+    READY_MODELS.extend(preloaded)
+gc.collect()
+gc.freeze()
+
+application = app
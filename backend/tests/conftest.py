@@ -0,0 +1,5 @@
+import os
+import sys
+
+SERVER_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'server'))
+sys.path.append(SERVER_DIR)
@@ -0,0 +1,115 @@
+"""
+Tweet extraction on a saved timeline snapshot (tests/fixtures/timeline.html), whose expected rows
+are stored in tests/fixtures/timeline.expected.json.
+
+- test_tweet_class_matches_expected_rows runs the per-card Tweet class (the XPath path) on the
+  snapshot parsed with lxml, so it needs no browser and runs with the rest of the suite.
+- test_extract_tweets_matches_tweet_class is an integration test: it loads the snapshot in a local
+  headless Chrome and compares Twitter_Scraper.extract_tweets (EXTRACT_TWEETS_JS) with the Tweet
+  class field by field. It is skipped when no Chrome WebDriver can be started.
+
+Run from backend:
+    python -m pytest tests                   # everything; the integration test skips without Chrome
+    python -m pytest tests -m integration    # only the browser parity check (needs Chrome)
+"""
+import json
+import os
+from urllib.parse import urljoin
+import pytest
+
+scraper_file = pytest.importorskip('scraper_file')
+
+FIXTURES_DIR = os.path.join(os.path.dirname(__file__), 'fixtures')
+FIXTURE = os.path.join(FIXTURES_DIR, 'timeline.html')
+EXPECTED = os.path.join(FIXTURES_DIR, 'timeline.expected.json')
+FIELDS = ['Name', 'Handle', 'Timestamp', 'Verified', 'Content', 'Comments', 'Retweets', 'Likes',
+          'Analytics', 'Tags', 'Mentions', 'Emojis', 'Profile Image', 'Tweet Link', 'Tweet ID']
+CARDS_XPATH = '//article[@data-testid="tweet" and not(@disabled)]'
+
+
+def as_rows(tweets):
+    return [dict(zip(FIELDS, tweet)) for tweet in tweets]
+
+
+def expected_rows():
+    with open(EXPECTED, encoding='utf-8') as expected_file:
+        return json.load(expected_file)
+
+
+class LxmlElement:
+    """The part of Selenium's WebElement API the Tweet class uses, over an lxml element."""
+
+    def __init__(self, element, base_url):
+        self.element = element
+        self.base_url = base_url
+
+    def find_elements(self, by, xpath):
+        assert by == 'xpath'
+        return [LxmlElement(element, self.base_url) for element in self.element.xpath(xpath)]
+
+    def find_element(self, by, xpath):
+        elements = self.find_elements(by, xpath)
+        if not elements:
+            raise scraper_file.NoSuchElementException(xpath)
+        return elements[0]
+
+    @property
+    def text(self):
+        # Rendered text as WebDriver reports it: whitespace collapsed and trimmed
+        return ' '.join(self.element.text_content().split())
+
+    def get_attribute(self, name):
+        value = self.element.get(name)
+        # WebDriver returns the resolved URL property for links and images
+        if value is not None and name in ('href', 'src'):
+            return urljoin(self.base_url, value)
+        return value
+
+
+def lxml_tweets(path):
+    """Tweet.tweet tuples of the visible, non-promoted cards of a saved page, like per_card_tweets."""
+    html = pytest.importorskip('lxml.html')
+    document = html.parse(path).getroot()
+    base = document.find('.//base')
+    base_url = base.get('href') if base is not None else f"file://{path}"
+    tweets = []
+    for card in document.xpath(CARDS_XPATH):
+        tweet = scraper_file.Tweet(card=LxmlElement(card, base_url), driver=None, actions=None)
+        if not tweet.error and tweet.tweet is not None and not tweet.is_ad:
+            tweets.append(tweet.tweet)
+    return tweets
+
+
+def per_card_tweets(scraper):
+    scraper.get_tweet_cards()
+    tweets = []
+    for card in scraper.tweet_cards:
+        tweet = scraper_file.Tweet(card=card, driver=scraper.driver, actions=scraper.actions)
+        if not tweet.error and tweet.tweet is not None and not tweet.is_ad:
+            tweets.append(tweet.tweet)
+    return tweets
+
+
+def test_tweet_class_matches_expected_rows():
+    assert as_rows(lxml_tweets(FIXTURE)) == expected_rows()
+
+
+@pytest.fixture(scope='module')
+def scraper():
+    try:
+        driver = scraper_file.create_driver()
+    except Exception as e:
+        pytest.skip(f"No Chrome WebDriver available: {e}")
+    try:
+        driver.get(f"file://{FIXTURE}")
+        yield scraper_file.Twitter_Scraper('', '', driver=driver)
+    finally:
+        driver.quit()
+
+
+@pytest.mark.integration
+def test_extract_tweets_matches_tweet_class(scraper):
+    reference = as_rows(per_card_tweets(scraper))
+    bulk = as_rows(scraper.extract_tweets())
+    assert reference == expected_rows()
+    assert bulk == reference
@@ -18,6 +18,7 @@ export default function Content() {
   const [error, setError] = useState("");
   const [showDecision, setShowDecision] = useState(false);
   const [decisionData, setDecisionData] = useState({ exact: null, similar: [] });
+  const [jobProgress, setJobProgress] = useState(null);
 
   useEffect(() => {
     const fetchTopics = async () => {
@@ -110,6 +111,20 @@ export default function Content() {
     }
   };
 
+  // Poll a queued analysis until the backend reports it finished
+  const waitForJob = async (jobId) => {
+    while (true) {
+      await new Promise(resolve => setTimeout(resolve, 3000));
+      const response = await fetch(`/api/jobs/${jobId}`);
+      const job = await response.json();
+      if (job.error && !job.status) throw new Error(job.error);
+      if (job.stage) setJobProgress({ stage: job.stage, ...job.progress });
+      if (job.status === 'succeeded') return job.query_id;
+      if (job.status === 'failed') throw new Error(job.error || 'Failed to process query');
+      if (job.status === 'cancelled') throw new Error('Analysis was cancelled');
+    }
+  };
+
   const createNewTopic = async () => {
     try {
       setLoading(true);
@@ -123,7 +138,8 @@ export default function Content() {
       const data = await response.json();
       if (data.error) throw new Error(data.error);
 
-      const topicData = await fetchTopicById(data.query_id);
+      const queryId = data.query_id || await waitForJob(data.job_id);
+      const topicData = await fetchTopicById(queryId);
       if (topicData) setTopics(prevTopics => [topicData, ...prevTopics]);
       setQuery("");
       setSimilarTopics([]);
@@ -132,6 +148,7 @@ export default function Content() {
     } catch (err) {
       setError(err.message || "Failed to analyze query. Please try again.");
     } finally {
+      setJobProgress(null);
       setLoading(false);
     }
   };
@@ -190,6 +207,13 @@ export default function Content() {
           </div>
         </div>
 
+        {loading && jobProgress && (
+          <div className="text-[#3F72AF] mb-4">
+            {`Stage: ${jobProgress.stage}`}
+            {jobProgress.total ? ` (${jobProgress.done} / ${jobProgress.total})` : ''}
+          </div>
+        )}
+
         {error && (
           <div className="text-red-500 mb-4">
             {error}
@@ -0,0 +1,18 @@
+import { NextResponse } from 'next/server';
+
+export async function GET(request, { params }) {
+    const backendUrl = process.env.NEXT_PUBLIC_BACKEND_URL || 'http://localhost:5500';
+
+    try {
+        // Forward the status poll to the backend job queue
+        const response = await fetch(`${backendUrl}/api/jobs/${params.id}`, { cache: 'no-store' });
+        const result = await response.json();
+        return NextResponse.json(result, { status: response.status });
+    } catch (error) {
+        console.error('Job Status API Error:', error);
+        return NextResponse.json(
+            { error: error.message || 'Failed to fetch job status' },
+            { status: 500 }
+        );
+    }
+}